@@ -0,0 +1,281 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Inventory config, e.g. HOTEL_ROOM_INVENTORY="paris=120,london=80"
+DEFAULT_ROOMS = int(os.getenv("DEFAULT_ROOMS_PER_DESTINATION", "50"))
+GUESTS_PER_ROOM = int(os.getenv("GUESTS_PER_ROOM", "2"))
+HORIZON_DAYS = int(os.getenv("AVAILABILITY_HORIZON_DAYS", "730"))
+# Keyed holds remembered for dedup; older keys keep their rooms but lose dedup
+MAX_KEYED_RESERVATIONS = int(os.getenv("MAX_KEYED_RESERVATIONS", "4096"))
+
+DateLike = Union[str, date]
+
+
+def _parse_inventory(spec: str) -> Dict[str, int]:
+    rooms = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, count = item.partition("=")
+        try:
+            rooms[name.strip().lower()] = int(count)
+        except ValueError:
+            logger.warning(f"Ignoring malformed HOTEL_ROOM_INVENTORY entry: {item}")
+    return rooms
+
+
+def rooms_for(guests: int, guests_per_room: int = GUESTS_PER_ROOM) -> int:
+    return -(-int(guests) // max(1, guests_per_room))
+
+
+def _to_date(value: DateLike) -> date:
+    return value if isinstance(value, date) else datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class _RangeMaxTree:
+    """Segment tree over per-night room counts: range add and range max in O(log n)."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._max = [0] * (4 * size)
+        self._pending = [0] * (4 * size)  # Adds applied to a whole subtree, not pushed down
+
+    def add(self, lo: int, hi: int, delta: int):
+        self._add(1, 0, self.size - 1, lo, hi, delta)
+
+    def max(self, lo: int, hi: int) -> int:
+        return self._max_in(1, 0, self.size - 1, lo, hi)
+
+    def _add(self, node, left, right, lo, hi, delta):
+        if hi < left or right < lo:
+            return
+        if lo <= left and right <= hi:
+            self._max[node] += delta
+            self._pending[node] += delta
+            return
+        mid = (left + right) // 2
+        self._add(2 * node, left, mid, lo, hi, delta)
+        self._add(2 * node + 1, mid + 1, right, lo, hi, delta)
+        self._max[node] = max(self._max[2 * node], self._max[2 * node + 1]) + self._pending[node]
+
+    def _max_in(self, node, left, right, lo, hi):
+        if hi < left or right < lo:
+            return float("-inf")
+        if lo <= left and right <= hi:
+            return self._max[node]
+        mid = (left + right) // 2
+        return max(self._max_in(2 * node, left, mid, lo, hi),
+                   self._max_in(2 * node + 1, mid + 1, right, lo, hi)) + self._pending[node]
+
+
+class _NightLedger:
+    """Rooms booked per night for one destination, over a window that slides with the date.
+
+    Nights are absolute day numbers (date.toordinal()) stored in a ring of `size`
+    slots, so the window moves forward without reindexing: when a day passes, its
+    slot is cleared and reused for the day `size` days later.
+    """
+
+    def __init__(self, size: int, start: int):
+        self.size = size
+        self.start = start  # Oldest night kept
+        self._tree = _RangeMaxTree(size)
+
+    def roll(self, today: int):
+        """Drops the nights before `today`."""
+        if today <= self.start:
+            return
+        for day in range(self.start, min(today, self.start + self.size)):
+            slot = day % self.size
+            self._tree.add(slot, slot, -self._tree.max(slot, slot))
+        self.start = today
+
+    def _spans(self, first: int, last: int):
+        lo, hi = first % self.size, last % self.size
+        return ((lo, hi),) if lo <= hi else ((lo, self.size - 1), (0, hi))
+
+    def max(self, first: int, last: int) -> int:
+        first = max(first, self.start)
+        if first > last:
+            return 0
+        return max(self._tree.max(lo, hi) for lo, hi in self._spans(first, last))
+
+    def add(self, first: int, last: int, delta: int):
+        first = max(first, self.start)  # Nights already dropped by roll() hold nothing
+        if first > last:
+            return
+        for lo, hi in self._spans(first, last):
+            self._tree.add(lo, hi, delta)
+
+
+@dataclass(frozen=True)
+class Reservation:
+    destination: str
+    first_night: int  # Day numbers (date.toordinal())
+    last_night: int
+    rooms: int
+    capacity: int  # Rooms at the destination, for the database to check the hold against
+    key: Optional[str] = None
+
+    @property
+    def nights(self) -> List[date]:
+        return [date.fromordinal(day) for day in range(self.first_night, self.last_night + 1)]
+
+
+class RoomInventory:
+    """Per-destination room inventory with atomic reserve/release, within this process.
+
+    Bookings open from today to `horizon_days` ahead; the window follows the date.
+    A stay from check_in to check_out occupies nights [check_in, check_out), as day
+    numbers. Capacity checks and reservations touch one segment tree per destination,
+    so each costs O(log horizon) however many stays overlap.
+
+    Other workers' bookings only show up here after a restart, so this view can only
+    undercount: it turns away stays that are certainly full without a database round
+    trip, and the database re-checks every hold it grants when the booking is written
+    (booking_info.save_booking, RoomsUnavailable).
+    """
+
+    def __init__(self, rooms_by_destination: Optional[Dict[str, int]] = None,
+                 default_rooms: int = DEFAULT_ROOMS, guests_per_room: int = GUESTS_PER_ROOM,
+                 horizon_days: int = HORIZON_DAYS, today: Optional[Callable[[], date]] = None):
+        self.rooms_by_destination = {k.strip().lower(): v for k, v in (rooms_by_destination or {}).items()}
+        self.default_rooms = default_rooms
+        self.guests_per_room = max(1, guests_per_room)
+        self.horizon_days = horizon_days
+        self._clock = today or (lambda: datetime.now().date())
+        self._today = self._clock().toordinal()
+        self._trees: Dict[str, _NightLedger] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._reservations: "OrderedDict[str, Reservation]" = OrderedDict()
+        self._registry_lock = threading.Lock()
+
+    @staticmethod
+    def normalize(destination: str) -> str:
+        return destination.strip().lower()
+
+    def capacity(self, destination: str) -> int:
+        return self.rooms_by_destination.get(self.normalize(destination), self.default_rooms)
+
+    def rooms_needed(self, guests: int) -> int:
+        return rooms_for(guests, self.guests_per_room)
+
+    def today(self) -> int:
+        """Today's day number; never moves backwards, even if the clock does."""
+        self._today = max(self._today, self._clock().toordinal())
+        return self._today
+
+    def nights(self, check_in: DateLike, check_out: DateLike) -> Tuple[int, int]:
+        """Day numbers [first, last] of a stay's nights. Raises ValueError outside the booking horizon."""
+        today = self.today()
+        first = _to_date(check_in).toordinal()
+        last = _to_date(check_out).toordinal() - 1
+        if first < today or last < first:
+            raise ValueError("Stay must start today or later and last at least one night")
+        if last >= today + self.horizon_days:
+            raise ValueError(f"Bookings are only open {self.horizon_days} days ahead")
+        return first, last
+
+    def _slot(self, destination: str) -> Tuple[_NightLedger, threading.Lock]:
+        # Callers roll the ledger to today() while holding its lock
+        with self._registry_lock:
+            tree = self._trees.get(destination)
+            if tree is None:
+                tree = self._trees[destination] = _NightLedger(self.horizon_days, self.today())
+                self._locks[destination] = threading.Lock()
+            return tree, self._locks[destination]
+
+    def rooms_booked(self, destination: str, check_in: DateLike, check_out: DateLike) -> int:
+        """Peak number of rooms already booked on any night of the stay."""
+        first, last = self.nights(check_in, check_out)
+        tree, lock = self._slot(self.normalize(destination))
+        with lock:
+            tree.roll(self.today())
+            return tree.max(first, last)
+
+    def has_capacity(self, destination: str, check_in: DateLike, check_out: DateLike, guests: int) -> bool:
+        booked = self.rooms_booked(destination, check_in, check_out)
+        return booked + self.rooms_needed(guests) <= self.capacity(destination)
+
+    def reserve(self, destination: str, check_in: DateLike, check_out: DateLike, guests: int,
+                key: Optional[str] = None) -> Optional[Reservation]:
+        """Atomically checks capacity and holds the rooms here. Returns None if the stay doesn't fit.
+
+        Reserving again with the same key returns the existing hold instead of counting twice.
+        """
+        name = self.normalize(destination)
+        first, last = self.nights(check_in, check_out)
+        rooms = self.rooms_needed(guests)
+        tree, lock = self._slot(name)
+        with lock:
+            tree.roll(self.today())
+            existing = self._reservations.get(key) if key is not None else None
+            if existing is not None:
+                return existing
+            if tree.max(first, last) + rooms > self.capacity(name):
+                return None
+            tree.add(first, last, rooms)
+            reservation = Reservation(name, first, last, rooms, self.capacity(name), key)
+            if key is not None:
+                with self._registry_lock:
+                    self._reservations[key] = reservation
+                    while len(self._reservations) > MAX_KEYED_RESERVATIONS:
+                        self._reservations.popitem(last=False)
+        return reservation
+
+    def release(self, reservation: Reservation):
+        """Gives the rooms of a failed or cancelled booking back."""
+        tree, lock = self._slot(reservation.destination)
+        with lock:
+            tree.roll(self.today())
+            if reservation.key is not None:
+                with self._registry_lock:
+                    if self._reservations.get(reservation.key) is not reservation:
+                        return  # Already released
+                    del self._reservations[reservation.key]
+            tree.add(reservation.first_night, reservation.last_night, -reservation.rooms)
+
+    def seed(self, stays: Iterable[Tuple[str, DateLike, DateLike, int]]) -> int:
+        """Counts already-stored stays against the inventory. Returns how many were applied."""
+        applied = 0
+        for destination, check_in, check_out, guests in stays:
+            try:
+                first, last = self.nights(max(_to_date(check_in), date.fromordinal(self.today())), check_out)
+            except ValueError:
+                continue  # Finished, or beyond the horizon
+            tree, lock = self._slot(self.normalize(destination))
+            with lock:
+                tree.roll(self.today())
+                tree.add(first, last, self.rooms_needed(guests or 1))
+            applied += 1
+        return applied
+
+
+_inventory: Optional[RoomInventory] = None
+_inventory_lock = threading.Lock()
+
+
+def get_inventory(loader: Optional[Callable[[], Iterable[Tuple[str, DateLike, DateLike, int]]]] = None) -> RoomInventory:
+    """Process-wide inventory; on creation it is seeded from `loader` (e.g. stored bookings).
+
+    Each worker has its own; pass its reservations to the booking write so the database
+    enforces capacity across workers.
+    """
+    global _inventory
+    if _inventory is None:
+        with _inventory_lock:
+            if _inventory is None:
+                inventory = RoomInventory(_parse_inventory(os.getenv("HOTEL_ROOM_INVENTORY", "")))
+                if loader is not None:
+                    try:
+                        applied = inventory.seed(loader())
+                        logger.info(f"Seeded room inventory with {applied} upcoming stays")
+                    except Exception as e:
+                        logger.error(f"Could not seed room inventory: {e}")
+                _inventory = inventory
+    return _inventory
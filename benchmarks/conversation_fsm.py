@@ -0,0 +1,103 @@
+"""Conversation state machine in isolation: routing cost per turn and a random-input fuzz.
+
+The handlers are stubs that return random reply kinds, so no LLM, database or chatbot
+is involved. The fuzz checks that every (state, event) pair it reaches has a route,
+that states and reply kinds stay in their declared sets, and that the classifier never
+raises on arbitrary text.
+
+Run from the repository root:
+    python benchmarks/conversation_fsm.py [--turns 200000] [--fuzz 100000] [--seed 0]
+"""
+import argparse
+import asyncio
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_fsm import (CONVERSATION_FSM, EVENTS, REPLY_KINDS, ROUTES, STATES,  # noqa: E402
+                              ConversationFSM)
+
+WORDS = [
+    "hi", "hello", "thanks", "bye", "how are you", "what's up", "yes", "ok", "sure", "no", "change",
+    "wait", "actually", "Paris", "London", "tomorrow", "2026-11-02", "3 nights", "2 guests", "for",
+    "please", "the", "dates", "hotel", "cancel", "different", "correct", "yo", "cheers", "hmm", "?",
+]
+
+
+def random_message(rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.05:
+        return ""
+    if roll < 0.15:  # Arbitrary text, including punctuation and non-ASCII
+        alphabet = string.printable + "éü🙂日本"
+        return "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 40)))
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+
+
+class StubHandlers:
+    """Answers every route with a random reply kind and records which handler ran."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.called = None
+        for name in set(ROUTES.values()):
+            setattr(self, name, self._make(name))
+
+    def _make(self, name):
+        async def handler(turn):
+            self.called = name
+            return ["stub"], self.rng.choice(REPLY_KINDS)
+        return handler
+
+
+async def bench(fsm: ConversationFSM, messages, rng) -> float:
+    handlers = StubHandlers(rng)
+    state = STATES[0]
+    started = time.perf_counter()
+    for text in messages:
+        state = (await fsm.dispatch(handlers, state, text)).next_state
+    return (time.perf_counter() - started) / len(messages)
+
+
+async def fuzz(fsm: ConversationFSM, turns: int, rng: random.Random) -> dict:
+    handlers = StubHandlers(rng)
+    seen = {}
+    state = rng.choice(STATES)
+    for _ in range(turns):
+        text = random_message(rng)
+        turn = await fsm.dispatch(handlers, state, text)
+        assert turn.event in EVENTS, turn.event
+        assert handlers.called == ROUTES[(state, turn.event)], (state, turn.event, handlers.called)
+        assert turn.reply_kind in REPLY_KINDS and turn.next_state in STATES, turn
+        seen[(state, turn.event)] = seen.get((state, turn.event), 0) + 1
+        state = turn.next_state
+    return seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200000, help="turns for the routing benchmark")
+    parser.add_argument("--fuzz", type=int, default=100000, help="random turns for the fuzz")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = [random_message(rng) for _ in range(args.turns)]
+    per_turn = asyncio.run(bench(CONVERSATION_FSM, messages, rng))
+    print(f"classify + route + transition: {per_turn * 1e6:.2f} us/turn over {args.turns} turns")
+
+    seen = asyncio.run(fuzz(CONVERSATION_FSM, args.fuzz, rng))
+    print(f"fuzz: {args.fuzz} turns, all invariants held; (state, event) pairs reached:")
+    for (state, event), count in sorted(seen.items()):
+        print(f"  {state:22} {event:11} {count:8}")
+    unreached = set(ROUTES) - set(seen)
+    if unreached:
+        print(f"  routes never reached: {sorted(unreached)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Memory per live session: old dict + list-of-strings state vs the compact conversation state.
+
+Builds N sessions with the same scripted conversation in each representation and
+reports the traced allocation per session, plus the serialized snapshot size. The
+layout comparison keeps the same entries on both sides (the last `capacity`, as the
+ring does); what the ring saves by dropping older entries is reported separately.
+
+Run from the repository root:
+    python benchmarks/session_memory.py [--sessions 20000] [--turns 12]
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conversation_state import ASSISTANT, USER, BookingInfo, History  # noqa: E402
+
+USER_LINES = [
+    "Hi, I need a hotel", "Paris please", "from next friday", "for 3 nights",
+    "2 people", "actually make it 3 guests", "yes that's right",
+]
+ASSISTANT_LINES = [
+    "Hello! 😊 Where would you like to book a hotel? 🌍",
+    "Great choice (Paris)! When will you be checking in? (Today is 2026-10-19) 🗓️",
+    "Okay, checking in on 2026-10-23. When will you be checking out? 📅",
+    "Almost done! How many guests will be staying? 👨‍👩‍👧‍👦",
+    "Okay, great! Let's confirm: You're booking a hotel in **Paris** from **2026-10-23** to **2026-10-26** for **2 guest(s)**. Does this look correct? (yes/no) 👍",
+]
+
+
+def script(i, turns):
+    """Unique text per session, so string sharing doesn't flatter either side."""
+    for t in range(turns):
+        yield f"{USER_LINES[t % len(USER_LINES)]} #{i}", f"{ASSISTANT_LINES[t % len(ASSISTANT_LINES)]} #{i}"
+
+
+def old_session(i, turns, keep=None):
+    booking = {"destination": None, "check_in": None, "check_out": None, "guests": None}
+    history = []
+    for user, assistant in script(i, turns):
+        history.append(f"User: {user}")
+        history.append(f"Assistant: {assistant}")
+    if keep is not None:
+        history = history[-keep:]
+    check_in = date(2026, 10, 23) + timedelta(days=i % 30)
+    booking.update(destination=f"Paris{i % 100}", check_in=check_in.strftime("%Y-%m-%d"),
+                   check_out=(check_in + timedelta(days=3)).strftime("%Y-%m-%d"), guests=2)
+    return {"booking_info": booking, "history": history, "state": "collecting_info"}
+
+
+def new_session(i, turns):
+    booking = BookingInfo()
+    history = History()
+    for user, assistant in script(i, turns):
+        history.add(USER, user)
+        history.add(ASSISTANT, assistant)
+    check_in = date(2026, 10, 23) + timedelta(days=i % 30)
+    booking.update({"destination": f"Paris{i % 100}", "check_in": check_in,
+                    "check_out": check_in + timedelta(days=3), "guests": 2})
+    return booking, history, "collecting_info"
+
+
+def measure(build, sessions, turns, **kwargs):
+    gc.collect()
+    tracemalloc.start()
+    kept = [build(i, turns, **kwargs) for i in range(sessions)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--turns", type=int, default=12, help="user+assistant exchanges per session")
+    args = parser.parse_args()
+
+    capacity = History().capacity
+    kept = min(2 * args.turns, capacity)
+    unbounded = measure(old_session, args.sessions, args.turns) if 2 * args.turns > kept else None
+    old = measure(old_session, args.sessions, args.turns, keep=capacity)
+    new = measure(new_session, args.sessions, args.turns)
+    print(f"{args.sessions} sessions x {args.turns} exchanges ({2 * args.turns} entries, ring keeps {kept})")
+    print(f"  layout, same {kept} entries on both sides:")
+    print(f"    dict + list of strings : {old:8.0f} B/session")
+    print(f"    compact state          : {new:8.0f} B/session  ({(1 - new / old) * 100:.0f}% less)")
+    if 2 * args.turns > kept:
+        print(f"  ring truncation, {2 * args.turns - kept} older entries dropped:")
+        print(f"    unbounded list         : {unbounded:8.0f} B/session")
+        print(f"    last {capacity} entries        : {old:8.0f} B/session  ({(1 - old / unbounded) * 100:.0f}% less)")
+
+    try:
+        import orjson
+    except ImportError:
+        return
+    legacy = old_session(0, args.turns, keep=capacity)
+    booking, history, state = new_session(0, args.turns)
+    compact = {"b": booking.to_list(), "h": history.to_list(), "s": state}
+    print(f"  snapshot bytes, same entries: {len(orjson.dumps(legacy))} -> {len(orjson.dumps(compact)) + 1}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Cold-start benchmark: import time and time-to-first-request, each in a fresh interpreter.
+
+Run from the repository root:
+    python benchmarks/startup.py [--runs 5] [--warm-up] [--top 10]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import chatbot
+print(time.perf_counter() - t0)
+"""
+
+FIRST_REQUEST_SNIPPET = """
+import time
+t0 = time.perf_counter()
+import test
+t_import = time.perf_counter()
+warm = 0.0
+if {warm_up}:
+    import chatbot
+    chatbot.warm_up()
+    warm = time.perf_counter() - t_import
+client = test.app.test_client()
+response = client.get("/")
+assert response.status_code == 200, response.status_code
+print(t_import - t0, warm, time.perf_counter() - t0)
+"""
+
+
+def run_snippet(code, extra_args=()):
+    # Background warm-up is disabled so runs measure the same work; --warm-up runs it inline
+    env = {**os.environ, "WARMUP_ON_START": "0"}
+    result = subprocess.run(
+        [sys.executable, *extra_args, "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return result
+
+
+def top_imports(limit):
+    """Slowest modules by cumulative import time (python -X importtime)."""
+    stderr = run_snippet("import chatbot", ("-X", "importtime")).stderr
+    rows = []
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)", line)
+        if match:
+            rows.append((int(match.group(2)), match.group(4).strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warm-up", action="store_true", help="Run chatbot.warm_up() before the first request")
+    parser.add_argument("--top", type=int, default=10, help="Show the N slowest imports")
+    args = parser.parse_args()
+
+    import_times = [float(run_snippet(IMPORT_SNIPPET).stdout.split()[-1]) for _ in range(args.runs)]
+    first_requests = []
+    for _ in range(args.runs):
+        app_import, warm, total = map(float, run_snippet(FIRST_REQUEST_SNIPPET.format(warm_up=args.warm_up)).stdout.split()[-3:])
+        first_requests.append((app_import, warm, total))
+
+    print(f"import chatbot           median {statistics.median(import_times) * 1000:8.1f} ms  (runs={args.runs})")
+    print(f"import app (test.py)     median {statistics.median(r[0] for r in first_requests) * 1000:8.1f} ms")
+    if args.warm_up:
+        print(f"warm-up                  median {statistics.median(r[1] for r in first_requests) * 1000:8.1f} ms")
+    print(f"time to first request    median {statistics.median(r[2] for r in first_requests) * 1000:8.1f} ms")
+    if args.top:
+        print(f"\nSlowest imports (cumulative, us) for `import chatbot`:")
+        for cumulative, module in top_imports(args.top):
+            print(f"  {cumulative:>10}  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+# UUIDv7 layout (RFC 9562): 48-bit unix ms | ver 7 | 12-bit seq | variant | 62 random bits.
+# IDs sort by creation time, so stored as BINARY(16) they append to the end of the index.
+
+_lock = threading.Lock()
+_last_ms = 0
+_seq = 0
+
+def new_booking_id() -> uuid.UUID:
+    """Returns a new time-ordered (UUIDv7) booking ID, monotonic within this process."""
+    global _last_ms, _seq
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            # Random start leaves room for the counter inside the same millisecond
+            _seq = int.from_bytes(os.urandom(2), "big") & 0x3FF
+        else:
+            _seq += 1
+            if _seq > 0xFFF:
+                # Counter exhausted: borrow the next millisecond
+                _last_ms += 1
+                _seq = 0
+        ms, seq = _last_ms, _seq
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (seq << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=value)
+
+def parse_booking_id(booking_id: str) -> bytes:
+    """Converts the customer-facing ID string to its BINARY(16) key. Raises ValueError if malformed."""
+    return uuid.UUID(booking_id).bytes
+
+def format_booking_id(raw: bytes) -> str:
+    """Converts a BINARY(16) key back to the customer-facing ID string."""
+    return str(uuid.UUID(bytes=bytes(raw)))
+
+def booking_id_timestamp(booking_id: uuid.UUID) -> datetime:
+    """Creation time embedded in a UUIDv7 booking ID."""
+    return datetime.fromtimestamp((booking_id.int >> 80) / 1000, tz=timezone.utc)
+
+def booking_id_bounds(start: datetime, end: datetime):
+    """BINARY(16) range [low, high) covering IDs created in [start, end); a range scan on the ID index."""
+    low = uuid.UUID(int=int(start.timestamp() * 1000) << 80).bytes
+    high = uuid.UUID(int=int(end.timestamp() * 1000) << 80).bytes
+    return low, high
@@ -1,43 +1,467 @@
 import os
+import hashlib
+import uuid
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Sequence, Tuple
 from dotenv import load_dotenv
-import mysql.connector
+from lazy_imports import lazy_import
+from availability import Reservation, rooms_for
+from booking_ids import new_booking_id, format_booking_id, booking_id_bounds, booking_id_timestamp
 load_dotenv()
+
+# The driver loads on first DB use (or warm-up), keeping cold start cheap
+mysql_connector = lazy_import("mysql.connector")
+ER_DUP_ENTRY = 1062  # mysql.connector.errorcode.ER_DUP_ENTRY
+
+# Connections are pooled (and pre-opened by warm_up_db) instead of dialled per booking
+DB_POOL_NAME = "booking_info"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+
+# How many recent confirmations to remember in-process
+RECENT_BOOKING_KEYS_MAX = int(os.getenv("RECENT_BOOKING_KEYS_MAX", "4096"))
+
+_recent_booking_keys: "OrderedDict[str, str]" = OrderedDict()
+_recent_booking_keys_lock = threading.Lock()
+_schema_ready = False
+
+
+class RoomsUnavailable(Exception):
+    """A night of the stay is already full in the database (booked through another worker)."""
+
+
 def create_connection(host_name, user_name, user_password, db_name):
     connection = None
     try:
-        connection = mysql.connector.connect(
+        connection = mysql_connector.connect(
             host=host_name,
             user=user_name,
             passwd=user_password,
             database=db_name
         )
         print("Connection to MySQL DB successful")
-    except mysql.connector.Error as e:
+    except mysql_connector.Error as e:
         print(f"The error '{e}' occurred")
     return connection
 
-def add_to_db(city, check_in, check_out, guests):
-    connection = create_connection(
+def _get_connection():
+    """Pooled connection; close() hands it back to the pool. Falls back to a fresh one if the pool is busy."""
+    try:
+        return mysql_connector.connect(
+            host="localhost",
+            user=os.getenv("DB_USER", "mehdi"),
+            passwd=os.getenv("DB_PASSWORD", "mehdi_password"),
+            database="HotelCheckInSystem",
+            pool_name=DB_POOL_NAME,
+            pool_size=DB_POOL_SIZE
+        )
+    except mysql_connector.PoolError as e:
+        print(f"Connection pool unavailable ({e}), opening a direct connection")
+    except mysql_connector.Error as e:
+        print(f"The error '{e}' occurred")
+        return None
+    return create_connection(
         "localhost",
         os.getenv("DB_USER", "mehdi"),
         os.getenv("DB_PASSWORD", "mehdi_password"),
         "HotelCheckInSystem"
     )
+
+def warm_up_db():
+    """Opens the connection pool and checks the schema ahead of the first booking."""
+    connection = _get_connection()
+    if not connection:
+        raise RuntimeError("No database connection available")
+    try:
+        ensure_schema(connection)
+    finally:
+        connection.close()
+
+def _column_exists(cursor, table, column):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column)
+    )
+    return cursor.fetchone() is not None
+
+def _index_exists(cursor, table, index):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index)
+    )
+    return cursor.fetchone() is not None
+
+def ensure_schema(connection):
+    """Creates booking_infos and brings older tables up to date (runs once per process)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    cursor = connection.cursor(buffered=True)
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS booking_infos (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                city VARCHAR(255),
+                check_in DATE,
+                check_out DATE,
+                guests INT,
+                idempotency_key CHAR(64) NULL,
+                booking_id BINARY(16) NULL,
+                UNIQUE KEY uq_booking_infos_idempotency_key (idempotency_key),
+                UNIQUE KEY uq_booking_infos_booking_id (booking_id)
+            )
+        """)
+        if not _column_exists(cursor, "booking_infos", "idempotency_key"):
+            cursor.execute("ALTER TABLE booking_infos ADD COLUMN idempotency_key CHAR(64) NULL")
+        if not _index_exists(cursor, "booking_infos", "uq_booking_infos_idempotency_key"):
+            cursor.execute("ALTER TABLE booking_infos ADD UNIQUE KEY uq_booking_infos_idempotency_key (idempotency_key)")
+        if not _column_exists(cursor, "booking_infos", "booking_id"):
+            # Rows saved before booking IDs were persisted keep NULL here
+            cursor.execute("ALTER TABLE booking_infos ADD COLUMN booking_id BINARY(16) NULL")
+        if not _index_exists(cursor, "booking_infos", "uq_booking_infos_booking_id"):
+            cursor.execute("ALTER TABLE booking_infos ADD UNIQUE KEY uq_booking_infos_booking_id (booking_id)")
+        # Per-destination, per-day totals maintained on every insert (see _add_to_rollups)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS booking_daily_rollups (
+                day DATE NOT NULL,
+                city VARCHAR(255) NOT NULL,
+                bookings INT NOT NULL DEFAULT 0,
+                guests INT NOT NULL DEFAULT 0,
+                nights INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, city)
+            )
+        """)
+        # Rooms held per destination and night, across all workers (see _hold_rooms)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS room_nights (
+                city VARCHAR(255) NOT NULL,
+                night DATE NOT NULL,
+                rooms INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (city, night)
+            )
+        """)
+        cursor.execute("CREATE TABLE IF NOT EXISTS schema_migrations (name VARCHAR(64) PRIMARY KEY)")
+        connection.commit()
+        # Whichever worker records the migration first counts the stays saved before
+        # room_nights existed; the others wait on that row's lock and skip it
+        cursor.execute("INSERT IGNORE INTO schema_migrations (name) VALUES ('room_nights_backfill')")
+        if cursor.rowcount == 1:
+            _backfill_room_nights(cursor)
+        connection.commit()
+        _schema_ready = True
+    finally:
+        cursor.close()
+
+def _backfill_room_nights(cursor):
+    cursor.execute("SELECT city, check_in, check_out, guests FROM booking_infos WHERE check_out > CURDATE()")
+    rooms = {}
+    today = datetime.now().date()
+    for city, check_in, check_out, guests in cursor.fetchall():
+        night = max(check_in, today)
+        while night < check_out:
+            key = (city.strip().lower(), night)
+            rooms[key] = rooms.get(key, 0) + rooms_for(guests or 1)
+            night += timedelta(days=1)
+    if rooms:
+        cursor.executemany(
+            "INSERT INTO room_nights (city, night, rooms) VALUES (%s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE rooms = rooms + VALUES(rooms)",
+            [(city, night, count) for (city, night), count in rooms.items()]
+        )
+
+def _hold_rooms(cursor, reservation: Reservation):
+    """Adds the reservation's rooms to every night of its stay, inside the caller's transaction.
+
+    The conditional UPDATE locks the nights' rows, so concurrent holds from any worker
+    are checked one after the other. Raises RoomsUnavailable if a night would go over
+    capacity; some nights may already be counted then, so the caller must roll back.
+    """
+    nights = reservation.nights
+    cursor.executemany(
+        "INSERT IGNORE INTO room_nights (city, night, rooms) VALUES (%s, %s, 0)",
+        [(reservation.destination, night) for night in nights]
+    )
+    cursor.execute(
+        "UPDATE room_nights SET rooms = rooms + %s WHERE city = %s AND night BETWEEN %s AND %s AND rooms + %s <= %s",
+        (reservation.rooms, reservation.destination, nights[0], nights[-1], reservation.rooms, reservation.capacity)
+    )
+    if cursor.rowcount != len(nights):
+        raise RoomsUnavailable(f"No rooms left in {reservation.destination} for some of those nights")
+
+def make_idempotency_key(session_id, city, check_in, check_out, guests):
+    """Stable key for one confirmation: same session + same booking contents -> same key."""
+    raw = "|".join([
+        str(session_id),
+        str(city).strip().lower(),
+        str(check_in),
+        str(check_out),
+        str(int(guests)),
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _remember_booking_key(idempotency_key, booking_id):
+    with _recent_booking_keys_lock:
+        _recent_booking_keys[idempotency_key] = booking_id
+        _recent_booking_keys.move_to_end(idempotency_key)
+        while len(_recent_booking_keys) > RECENT_BOOKING_KEYS_MAX:
+            _recent_booking_keys.popitem(last=False)
+
+def _recall_booking_key(idempotency_key):
+    with _recent_booking_keys_lock:
+        booking_id = _recent_booking_keys.get(idempotency_key)
+        if booking_id is not None:
+            _recent_booking_keys.move_to_end(idempotency_key)
+        return booking_id
+
+def _rollup_key(booking_id, city):
+    # Bookings are counted on the (UTC) day they were made, read from the UUIDv7 ID;
+    # cities are normalized like the idempotency key, so "Paris" and "paris" share a row
+    return booking_id_timestamp(booking_id).date(), city.strip().lower()
+
+def _nights(check_in, check_out):
+    return (datetime.strptime(str(check_out), "%Y-%m-%d") - datetime.strptime(str(check_in), "%Y-%m-%d")).days
+
+def _add_to_rollups(cursor, totals):
+    """Adds {(day, city): (bookings, guests, nights)} to the rollups, inside the caller's transaction."""
+    cursor.executemany(
+        "INSERT INTO booking_daily_rollups (day, city, bookings, guests, nights) VALUES (%s, %s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE bookings = bookings + VALUES(bookings), guests = guests + VALUES(guests), "
+        "nights = nights + VALUES(nights)",
+        [(day, city, bookings, guests, nights) for (day, city), (bookings, guests, nights) in totals.items()]
+    )
+
+def _find_booking_id(connection, idempotency_key):
+    cursor = connection.cursor(buffered=True)
+    try:
+        cursor.execute("SELECT booking_id FROM booking_infos WHERE idempotency_key = %s", (idempotency_key,))
+        row = cursor.fetchone()
+        return format_booking_id(row[0]) if row and row[0] is not None else None
+    finally:
+        cursor.close()
+
+def save_booking(city, check_in, check_out, guests, idempotency_key=None,
+                 reservation: Optional[Reservation] = None) -> Optional[str]:
+    """Inserts a booking under a new time-ordered ID and returns that ID (None on failure).
+
+    If idempotency_key was already used, returns the ID stored by the first attempt.
+    With a `reservation` (from the room inventory) its rooms are held in room_nights in
+    the same transaction; if they no longer fit, nothing is saved and RoomsUnavailable
+    is raised.
+    """
+    connection = _get_connection()
     if connection:
+        cursor = None
         try:
-            query = "INSERT INTO booking_infos (city, check_in, check_out, guests) VALUES (%s, %s, %s, %s)"
-            values = (city, check_in, check_out, guests)
+            ensure_schema(connection)
+            booking_id = new_booking_id()
+            query = "INSERT INTO booking_infos (city, check_in, check_out, guests, idempotency_key, booking_id) VALUES (%s, %s, %s, %s, %s, %s)"
+            values = (city, check_in, check_out, guests, idempotency_key, booking_id.bytes)
             cursor = connection.cursor()
+            # Inserted before the hold, so a duplicate confirmation fails before touching room_nights
             cursor.execute(query, values)
+            if reservation is not None:
+                _hold_rooms(cursor, reservation)
+            _add_to_rollups(cursor, {_rollup_key(booking_id, city): (1, int(guests), _nights(check_in, check_out))})
             connection.commit()
             print("Booking information added successfully")
-            return True  # Explicitly return True on success
-        except mysql.connector.Error as e:
+            return str(booking_id)
+        except RoomsUnavailable:
+            connection.rollback()
+            raise
+        except mysql_connector.IntegrityError as e:
+            connection.rollback()
+            if idempotency_key and e.errno == ER_DUP_ENTRY:
+                # A previous attempt with the same key already stored this booking
+                print("Duplicate booking confirmation ignored")
+                return _find_booking_id(connection, idempotency_key)
+            print(f"Failed to add booking: {e}")
+            return None
+        except mysql_connector.Error as e:
             print(f"Failed to add booking: {e}")
-            return False  # Return False on failure
+            connection.rollback()
+            return None
         finally:
-            cursor.close()
+            if cursor is not None:
+                cursor.close()
             connection.close()
     else:
         print("No database connection available. Booking not saved.")
-        return False
\ No newline at end of file
+        return None
+
+def add_to_db(city, check_in, check_out, guests, idempotency_key=None):
+    return save_booking(city, check_in, check_out, guests, idempotency_key) is not None
+
+def add_booking_once(session_id, city, check_in, check_out, guests, idempotency_key=None,
+                     reservation: Optional[Reservation] = None) -> Optional[str]:
+    """Saves a confirmed booking at most once per idempotency key.
+
+    Returns the booking ID, or None if the booking could not be saved. Raises
+    RoomsUnavailable if the reservation's rooms were taken by another worker.
+    """
+    if idempotency_key is None:
+        idempotency_key = make_idempotency_key(session_id, city, check_in, check_out, guests)
+    booking_id = _recall_booking_key(idempotency_key)
+    if booking_id is not None:
+        print("Booking already confirmed, returning original booking ID")
+        return booking_id
+    booking_id = save_booking(city, check_in, check_out, guests, idempotency_key=idempotency_key,
+                              reservation=reservation)
+    if booking_id is None:
+        return None
+    _remember_booking_key(idempotency_key, booking_id)
+    return booking_id
+
+def fetch_upcoming_stays():
+    """Stored stays that have not ended yet, used to seed the room inventory."""
+    connection = _get_connection()
+    if not connection:
+        return []
+    cursor = None
+    try:
+        ensure_schema(connection)
+        cursor = connection.cursor()
+        cursor.execute("SELECT city, check_in, check_out, guests FROM booking_infos WHERE check_out > CURDATE()")
+        return cursor.fetchall()
+    except mysql_connector.Error as e:
+        print(f"Failed to load upcoming stays: {e}")
+        return []
+    finally:
+        if cursor is not None:
+            cursor.close()
+        connection.close()
+
+# --- Bulk import / export ---
+def insert_bookings(rows: Sequence[Tuple[str, str, str, int]],
+                    reservations: Optional[Sequence[Reservation]] = None) -> Optional[List[Optional[str]]]:
+    """Inserts many bookings in one transaction (one multi-row INSERT).
+
+    With `reservations` (one per row) each row's rooms are held in room_nights first;
+    rows whose rooms no longer fit are skipped. Returns the new booking IDs in row
+    order, None for a skipped row, or None if nothing was saved.
+    """
+    if not rows:
+        return []
+    connection = _get_connection()
+    if not connection:
+        print("No database connection available. Bookings not saved.")
+        return None
+    cursor = None
+    try:
+        ensure_schema(connection)
+        cursor = connection.cursor()
+        booking_ids: List[Optional[uuid.UUID]] = [new_booking_id() for _ in rows]
+        for i, reservation in enumerate(reservations or ()):
+            # A savepoint per row undoes a partial hold without losing the rest of the chunk
+            cursor.execute("SAVEPOINT row_hold")
+            try:
+                _hold_rooms(cursor, reservation)
+            except RoomsUnavailable:
+                cursor.execute("ROLLBACK TO SAVEPOINT row_hold")
+                booking_ids[i] = None
+        kept = [(row, booking_id) for row, booking_id in zip(rows, booking_ids) if booking_id is not None]
+        if not kept:
+            connection.rollback()
+            return [None] * len(rows)
+        values = [(city, check_in, check_out, guests, booking_id.bytes)
+                  for (city, check_in, check_out, guests), booking_id in kept]
+        # mysql.connector rewrites an INSERT executemany into a single multi-row statement
+        cursor.executemany(
+            "INSERT INTO booking_infos (city, check_in, check_out, guests, booking_id) VALUES (%s, %s, %s, %s, %s)",
+            values
+        )
+        # One upsert per (day, destination) for the whole chunk
+        totals = {}
+        for (city, check_in, check_out, guests), booking_id in kept:
+            key = _rollup_key(booking_id, city)
+            bookings, guest_total, nights = totals.get(key, (0, 0, 0))
+            totals[key] = (bookings + 1, guest_total + int(guests), nights + _nights(check_in, check_out))
+        _add_to_rollups(cursor, totals)
+        connection.commit()
+        return [str(booking_id) if booking_id is not None else None for booking_id in booking_ids]
+    except mysql_connector.Error as e:
+        print(f"Failed to add bookings: {e}")
+        connection.rollback()
+        return None
+    finally:
+        if cursor is not None:
+            cursor.close()
+        connection.close()
+
+def iter_bookings(day: Optional[str] = None, fetch_size: int = 1000) -> Iterator[Tuple[str, str, str, str, int]]:
+    """Streams stored bookings as (booking_id, city, check_in, check_out, guests).
+
+    Uses an unbuffered (server-side) cursor read in fetch_size batches, so memory stays
+    flat however many rows match. With `day` (YYYY-MM-DD, UTC) only bookings created that
+    day are returned, found by a range scan on the time-ordered booking_id index.
+    """
+    connection = _get_connection()
+    if not connection:
+        raise RuntimeError("No database connection available")
+    cursor = None
+    try:
+        ensure_schema(connection)
+        query = "SELECT booking_id, city, check_in, check_out, guests FROM booking_infos"
+        params: tuple = ()
+        if day:
+            start = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+            query += " WHERE booking_id >= %s AND booking_id < %s ORDER BY booking_id"
+            params = booking_id_bounds(start, start + timedelta(days=1))
+        else:
+            query += " ORDER BY id"
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(query, params)
+        while True:
+            batch = cursor.fetchmany(fetch_size)
+            if not batch:
+                break
+            for booking_id, city, check_in, check_out, guests in batch:
+                yield (
+                    format_booking_id(booking_id) if booking_id is not None else None,
+                    city,
+                    check_in.isoformat() if check_in else None,
+                    check_out.isoformat() if check_out else None,
+                    guests,
+                )
+    finally:
+        if cursor is not None:
+            try:
+                cursor.close()
+            except mysql_connector.Error:
+                pass  # Unread rows left behind if the client stopped reading early
+        connection.close()
+
+# --- Analytics ---
+def fetch_rollups(date_from: str, date_to: str, city: Optional[str] = None) -> List[dict]:
+    """Reads per-day, per-destination totals from booking_daily_rollups only.
+
+    Cost depends on days x destinations in the range, not on how many bookings exist.
+    """
+    connection = _get_connection()
+    if not connection:
+        raise RuntimeError("No database connection available")
+    cursor = None
+    try:
+        ensure_schema(connection)
+        query = "SELECT day, city, bookings, guests, nights FROM booking_daily_rollups WHERE day BETWEEN %s AND %s"
+        params = [date_from, date_to]
+        if city:
+            query += " AND city = %s"
+            params.append(city.strip().lower())
+        query += " ORDER BY day, city"
+        cursor = connection.cursor()
+        cursor.execute(query, params)
+        return [
+            {
+                "date": day.isoformat(),
+                "destination": name,
+                "bookings": bookings,
+                "guests": guests,
+                "avg_stay_nights": round(nights / bookings, 2) if bookings else None,
+            }
+            for day, name, bookings, guests, nights in cursor.fetchall()
+        ]
+    finally:
+        if cursor is not None:
+            cursor.close()
+        connection.close()
@@ -0,0 +1,160 @@
+import csv
+import io
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import orjson
+
+from availability import get_inventory
+from booking_info import insert_bookings, iter_bookings, fetch_upcoming_stays
+from chatbot import get_booking_details_model
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+EXPORT_FIELDS = ["booking_id", "destination", "check_in", "check_out", "guests"]
+
+
+# --- Parsing ---
+def iter_csv_rows(lines: Iterable[str]) -> Iterator[Dict]:
+    """Yields one dict per CSV record; the header row names the fields."""
+    yield from csv.DictReader(lines)
+
+
+def iter_ndjson_rows(lines: Iterable[str]) -> Iterator[Dict]:
+    """Yields one dict per non-blank NDJSON line; malformed lines come through as {"_error": ...}."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            row = {"_error": f"Invalid JSON: {e}"}
+        yield row if isinstance(row, dict) else {"_error": "Expected a JSON object"}
+
+
+def validate_row(row: Dict) -> Tuple[Optional[Tuple[str, str, str, int]], Optional[str]]:
+    """Validates one partner row with BookingDetails. Returns (booking, None) or (None, error)."""
+    if "_error" in row:
+        return None, row["_error"]
+    data = {
+        "destination": row.get("destination") or row.get("city"),
+        "check_in": row.get("check_in"),
+        "check_out": row.get("check_out"),
+        "guests": row.get("guests"),
+    }
+    from pydantic import ValidationError
+    try:
+        details = get_booking_details_model()(**data)
+    except ValidationError as e:
+        return None, str(e)
+    # BookingDetails maps unusable values to None rather than raising
+    missing = [field for field, value in details.model_dump().items() if value in (None, "")]
+    if missing:
+        return None, f"Missing or invalid: {', '.join(missing)}"
+    check_in = datetime.strptime(details.check_in, "%Y-%m-%d").date()
+    check_out = datetime.strptime(details.check_out, "%Y-%m-%d").date()
+    if check_out <= check_in:
+        return None, "check_out must be after check_in"
+    return (details.destination.strip(), details.check_in, details.check_out, details.guests), None
+
+
+# --- Import ---
+def import_bookings(rows: Iterable[Dict], chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    """Validates and stores partner bookings chunk by chunk.
+
+    Rows are consumed lazily and written as multi-row INSERTs of `chunk_size`, so memory
+    is bounded by one chunk. Each row must fit the room inventory; rejected rows are
+    reported by data row number and do not stop the import.
+    """
+    inventory = get_inventory(loader=fetch_upcoming_stays)
+    report = {"imported": 0, "rejected": 0, "errors": []}
+    chunk: List[Tuple[str, str, str, int]] = []
+    holds = []
+    row_nos: List[int] = []
+
+    def report_error(row_no: Optional[int], error: str):
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_no, "error": error})
+
+    def reject(row_no: int, error: str):
+        report["rejected"] += 1
+        report_error(row_no, error)
+
+    def flush():
+        if not chunk:
+            return
+        booking_ids = insert_bookings(chunk, holds)
+        if booking_ids is None:
+            for reservation in holds:
+                inventory.release(reservation)
+            report["rejected"] += len(chunk)
+            report_error(None, f"Database write failed for a chunk of {len(chunk)} rows")
+        else:
+            for row_no, reservation, booking_id in zip(row_nos, holds, booking_ids):
+                if booking_id is None:  # Rooms taken through another worker since this one loaded them
+                    inventory.release(reservation)
+                    reject(row_no, "No rooms available for these dates")
+                else:
+                    report["imported"] += 1
+        chunk.clear()
+        holds.clear()
+        row_nos.clear()
+
+    for row_no, row in enumerate(rows, start=1):
+        booking, error = validate_row(row)
+        if error:
+            reject(row_no, error)
+            continue
+        try:
+            reservation = inventory.reserve(*booking)
+        except ValueError as e:
+            reject(row_no, str(e))
+            continue
+        if reservation is None:
+            reject(row_no, "No rooms available for these dates")
+            continue
+        chunk.append(booking)
+        holds.append(reservation)
+        row_nos.append(row_no)
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    logger.info(f"Bulk import finished: {report['imported']} imported, {report['rejected']} rejected")
+    return report
+
+
+# --- Export ---
+EXPORT_ROWS_PER_CHUNK = 500
+
+
+def export_csv(day: Optional[str] = None) -> Iterator[str]:
+    """Streams stored bookings as CSV text, EXPORT_ROWS_PER_CHUNK rows per yielded chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    pending = 0
+    for row in iter_bookings(day):
+        writer.writerow(row)
+        pending += 1
+        if pending >= EXPORT_ROWS_PER_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def export_ndjson(day: Optional[str] = None) -> Iterator[bytes]:
+    """Streams stored bookings as NDJSON, EXPORT_ROWS_PER_CHUNK lines per yielded chunk."""
+    lines = []
+    for row in iter_bookings(day):
+        lines.append(orjson.dumps(dict(zip(EXPORT_FIELDS, row))))
+        if len(lines) >= EXPORT_ROWS_PER_CHUNK:
+            yield b"\n".join(lines) + b"\n"
+            lines.clear()
+    if lines:
+        yield b"\n".join(lines) + b"\n"
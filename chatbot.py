@@ -2,24 +2,29 @@ import os
 import re
 import logging
 from dotenv import load_dotenv
-from aiomysql import Error  # Import Error for exception handling
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Union # Added Optional, Union
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 import asyncio
 import random
-from functools import partial # Needed for log_async if using getattr approach
-import json # Added for fallback JSON parsing
 import uuid
-import aiohttp
-from typing import Tuple
 from weather_utils import get_weather_tip
 
-from booking_info import add_to_db , create_connection
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.runnables import RunnableSequence
-from pydantic import BaseModel, Field, field_validator, validator # validator is deprecated, use field_validator
+from booking_info import RoomsUnavailable, add_booking_once, make_idempotency_key, fetch_upcoming_stays
+from availability import get_inventory
+from llm_clients import get_chat_model, get_chat_prompt, get_json_model, parse_json_content, shared, call_llm
+from rule_extractor import extract_booking_details, detect_change_field
+from retry_policy import resilient_llm_call
+from model_router import first_model, routed_call
+from extraction_batcher import extract_with_batching
+from semantic_cache import cached_extraction, get_extraction_cache
+from deadlines import DeadlineExceeded, turn_deadline, within_deadline
+from conversation_state import ASSISTANT, USER, BookingInfo, History
+from conversation_fsm import (AWAITING_CONFIRMATION, BOOKED, COLLECTING, CONFIRM_PROMPT, CONVERSATION_FSM,
+                              ERROR, QUESTION, STATEMENT, Turn)
+from summarizer import RollingSummary
+from prompt_builder import PromptLayout
+# langchain and pydantic are imported on first use (see _build_booking_details_model and
+# warm_up), so importing this module is cheap and the server can start serving quickly.
 
 
 
@@ -35,43 +40,76 @@ load_dotenv()
 # FLASK_API_URL = os.getenv("FLASK_API_URL", "http://localhost:5000") # Not used in this snippet
 
 # --- Pydantic Model ---
-class BookingDetails(BaseModel):
-    destination: Optional[str] = Field(None, description="The city where the hotel is to be booked")
-    check_in: Optional[str] = Field(None, description="Check-in date in YYYY-MM-DD format")
-    check_out: Optional[str] = Field(None, description="Check-out date in YYYY-MM-DD format")
-    guests: Optional[int] = Field(None, description="Number of guests staying")
-
-    @field_validator('check_in', 'check_out', mode='before')
-    def validate_date_format(cls, value):
-        if value is None:
-            return value
-        try:
-            # Basic format check - detailed validation happens later
-            if isinstance(value, str):
-                 datetime.strptime(value, "%Y-%m-%d")
-                 return value
-            return None # Treat non-strings as invalid here
-        except (ValueError, TypeError):
-            # Let the LLM attempt extraction, validation happens later
-            logger.warning(f"Extractor returned potentially invalid date format: {value}. Will validate later.")
-            return None # Treat as not extracted if format is wrong initially
-
-    @field_validator('guests', mode='before')
-    def validate_guests(cls, value):
-        if value is None:
-            return value
-        try:
-            num_guests = int(value)
-            if num_guests > 0:
-                return num_guests
-            else:
-                logger.warning(f"Extractor returned invalid guest count: {value}")
+def _build_booking_details_model():
+    from pydantic import BaseModel, Field, field_validator
+
+    class BookingDetails(BaseModel):
+        destination: Optional[str] = Field(None, description="The city where the hotel is to be booked")
+        check_in: Optional[str] = Field(None, description="Check-in date in YYYY-MM-DD format")
+        check_out: Optional[str] = Field(None, description="Check-out date in YYYY-MM-DD format")
+        guests: Optional[int] = Field(None, description="Number of guests staying")
+
+        @field_validator('check_in', 'check_out', mode='before')
+        def validate_date_format(cls, value):
+            if value is None:
+                return value
+            try:
+                # Basic format check - detailed validation happens later
+                if isinstance(value, str):
+                     datetime.strptime(value, "%Y-%m-%d")
+                     return value
+                return None # Treat non-strings as invalid here
+            except (ValueError, TypeError):
+                # Let the LLM attempt extraction, validation happens later
+                logger.warning(f"Extractor returned potentially invalid date format: {value}. Will validate later.")
+                return None # Treat as not extracted if format is wrong initially
+
+        @field_validator('guests', mode='before')
+        def validate_guests(cls, value):
+            if value is None:
+                return value
+            try:
+                num_guests = int(value)
+                if num_guests > 0:
+                    return num_guests
+                else:
+                    logger.warning(f"Extractor returned invalid guest count: {value}")
+                    return None
+            except (ValueError, TypeError):
+                logger.warning(f"Extractor returned non-integer guest count: {value}")
                 return None
-        except (ValueError, TypeError):
-            logger.warning(f"Extractor returned non-integer guest count: {value}")
-            return None
 
-parser = JsonOutputParser(pydantic_object=BookingDetails)
+    return BookingDetails
+
+def get_booking_details_model():
+    """The BookingDetails model, defined once on first use."""
+    return shared("BookingDetails", _build_booking_details_model)
+
+def get_booking_details_adapter():
+    """TypeAdapter for BookingDetails; its validator is compiled once per process."""
+    def build():
+        from pydantic import TypeAdapter
+        return TypeAdapter(get_booking_details_model())
+    return shared("booking_details_adapter", build)
+
+def get_booking_prompt():
+    """The reply prompt as a ChatPromptTemplate, parsed once per process."""
+    return get_chat_prompt("booking_reply", BOOKING_PROMPT.as_template())
+
+def get_extract_parser():
+    """JSON output parser for extraction, built once on first use."""
+    def build():
+        from langchain_core.output_parsers import JsonOutputParser
+        return JsonOutputParser(pydantic_object=get_booking_details_model())
+    return shared("booking_extract_parser", build)
+
+def __getattr__(name):
+    # `from chatbot import BookingDetails` / `chatbot.parser` keep working, lazily
+    if name == "BookingDetails":
+        return get_booking_details_model()
+    if name == "parser":
+        return get_extract_parser()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- Async Logging Helper ---
 async def log_async(level: str, message: str, **kwargs):
@@ -87,15 +125,112 @@ async def log_async(level: str, message: str, **kwargs):
         # Catch any other unexpected errors during logging
         print(f"Error during async logging: {e}") # Use print as logger might be the issue
 
+# --- Prompt Templates (shared by all sessions) ---
+GREETINGS = [
+    "Hi there! I'm your friendly booking assistant. Ready to find you the perfect stay? 🌆",
+    "Hello! I'm here to help with your hotel booking. Let's get started! 🏨",
+    "Welcome! Where should we book your next adventure? 🌍"
+]
+
+# Instruction prefix, then the per-turn sections: see prompt_builder.PromptLayout
+BOOKING_PROMPT = PromptLayout("booking_reply", """
+        You are a friendly and enthusiastic hotel booking assistant. Your goal is to have natural conversations while collecting:
+        1. Destination city
+        2. Check-in date
+        3. Check-out date
+        4. Number of guests
+
+        Guidelines:
+        - Start with a friendly greeting if there's no history.
+        - Use natural language, be conversational, and vary your responses. Use 1-2 short sentences.
+        - Acknowledge user inputs positively (e.g., "Great!", "Sounds good!").
+        - For date handling: today's date is given below. Convert relative dates (e.g., "tomorrow", "next Tuesday", "weekend after next") to YYYY-MM-DD format. Ensure check-in is not in the past. Ensure check-out is after check-in. If only duration is given (e.g., "3 nights"), calculate check-out based on check-in.
+        - If multiple dates or destinations are mentioned ambiguously, ask for clarification.
+        - For ambiguous destinations (e.g., "Springfield"), ask for the state or country.
+        - Use occasional emojis to maintain a friendly tone. ☀️🏖️🌴
+        - Handle simple small talk (greetings, thanks, how are you) gracefully before returning to the booking task.
+        - If all information is collected, provide a clear summary with emojis and ask for confirmation.
+        - If the user wants to change something after confirmation is requested, identify the field and ask for the new value.
+        - Use the current booking info only if it was provided by the user; otherwise ask for it.
+
+        Response Examples:
+        - "Paris sounds wonderful! 🗼 When are you planning to check in? 🗓️"
+        - "Got it, 2 guests! And what's your check-in date? 📅"
+        - "Okay, checking in tomorrow, 2025-03-05. How many nights will you stay, or what's your check-out date? 🏨"
+        - "Let me confirm: A stay in Paris from 2025-03-05 to 2025-03-08 for 2 person(s). Does this look right? 👍"
+        - "Sure, we can change the dates. What new check-in date were you thinking of? 🤔"
+
+        Focus on the next piece of missing information based on the current booking info and history.
+        Respond conversationally.
+        """, [
+    ("Today's date", "current_date"),
+    ("Summary of earlier conversation", "conversation_summary"),
+    ("Recent conversation", "history"),
+    ("Destination", "destination"),
+    ("Check-in", "check_in"),
+    ("Check-out", "check_out"),
+    ("Guests", "guests"),
+    ("Current state", "state"),
+])
+
+EXTRACT_PROMPT = PromptLayout("booking_extract", """
+        Analyze the latest user message in the context of the conversation history to extract booking details.
+        Today's date is given below. Convert relative dates (like "tomorrow", "next Friday", "August 15th") to absolute YYYY-MM-DD format.
+        If a duration is mentioned (e.g., "3 nights", "a week"), calculate the check-out date based on the check-in date if available.
+
+        Return ONLY JSON with the extracted values for these keys. Use null if a value isn't mentioned or is unclear in the *latest user message*.
+        {
+            "destination": "city name or null",
+            "check_in": "YYYY-MM-DD or null",
+            "check_out": "YYYY-MM-DD or null",
+            "guests": "integer or null"
+        }
+
+        Examples:
+        - User says "I want to go to London next week for 5 nights": Infer check-in based on "next week" and calculate check-out.
+        - User says "tomorrow": Extract check_in as the day after today's date.
+        - User says "check in March 5th, check out March 8th": Extract both dates.
+        - User says "2 people": Extract guests: 2.
+        """, [
+    # Slowest changing first (see prompt_builder.PromptLayout)
+    ("Today's date", "current_date"),
+    ("Summary of earlier conversation", "conversation_summary"),
+    ("Recent conversation", "history"),
+    ("Booking details collected so far", "booking_info"),
+    ("Current User Message", "user_message"),
+])
+
+CHANGE_PROMPT = PromptLayout("change_field", """
+        The user wants to change the booking details based on their last message.
+        Analyze the user message and identify which field they most likely want to change.
+        Respond with ONLY ONE word: 'destination', 'check_in', 'check_out', 'dates' (if both or unclear which date), 'guests', or 'unknown' if it's unclear.
+        """, [("User message", "user_message")])
+
+CHANGE_FIELDS = {"destination", "check_in", "check_out", "dates", "guests", "unknown"}
+
+
+def _parse_change_field(message) -> str:
+    """First word of the change-analysis reply; anything outside CHANGE_FIELDS is rejected (and escalated)."""
+    change_field = re.split(r'\s|\n', message.content.strip().lower())[0].strip(".,'\"")
+    if change_field not in CHANGE_FIELDS:
+        raise ValueError(f"Unexpected change field {change_field!r}")
+    return change_field
+
+
 # --- Chatbot Class ---
 class HotelBookingChatbot:
+    # Per-session state only (no __dict__); prompts and templates are shared class attributes
+    __slots__ = ("session_id", "current_date", "current_date_str", "booking_info", "history", "summary", "state", "last_reply")
+    greetings = GREETINGS
+    template = BOOKING_PROMPT
+    extract_template = EXTRACT_PROMPT
           
-    async def _confirm_booking(self) -> list[str]:
-        """Finalizes the booking and saves to database, returning a list of messages"""
+    async def _confirm_booking(self) -> Tuple[List[str], str]:
+        """Finalizes the booking and saves to database, returning the messages and their reply kind"""
         await log_async("info", f"Attempting to confirm booking: {self.booking_info}")
         
         if None in self.booking_info.values():
-            return ["Missing some booking information. Please complete all fields."]
+            return ["Missing some booking information. Please complete all fields."], ERROR
 
         try:
             # Prepare booking data
@@ -106,18 +241,65 @@ class HotelBookingChatbot:
                 'guests': self.booking_info['guests']
             }
 
-            # Call add_to_db synchronously with unpacked arguments
-            db_result = add_to_db(
+            idempotency_key = make_idempotency_key(
+                self.session_id,
                 booking_data['destination'],
                 booking_data['check_in'],
                 booking_data['check_out'],
                 booking_data['guests']
             )
-            
-            if db_result:  # Check for True (successful insertion)
-                import uuid  # Ensure uuid is imported at the top of chatbot.py
-                booking_id = str(uuid.uuid4())  # Generate booking ID locally
-                
+
+            # Hold the rooms before writing so concurrent confirmations can't oversell
+            inventory = get_inventory(loader=fetch_upcoming_stays)
+            try:
+                reservation = inventory.reserve(
+                    booking_data['destination'],
+                    booking_data['check_in'],
+                    booking_data['check_out'],
+                    booking_data['guests'],
+                    key=idempotency_key
+                )
+            except ValueError as e:
+                # In the past or beyond the booking horizon: the dates are wrong, not sold out
+                await log_async("warning", f"Stay outside bookable range: {e}")
+                return self._ask_for_other_dates(f"Sorry, I can't book those dates. {e}. Which dates would work for you? 🗓️")
+            if reservation is None:
+                await log_async("info", f"No availability for {booking_data}")
+                return self._ask_for_other_dates(self._no_rooms_left(booking_data['destination']))
+
+            # Saved at most once per session + booking contents, so retried or
+            # double-clicked confirmations get the original booking ID back. The
+            # database re-checks the hold, since other workers book the same rooms.
+            def save_or_release():
+                booking_id = None
+                try:
+                    booking_id = add_booking_once(
+                        self.session_id,
+                        booking_data['destination'],
+                        booking_data['check_in'],
+                        booking_data['check_out'],
+                        booking_data['guests'],
+                        idempotency_key=idempotency_key,
+                        reservation=reservation
+                    )
+                finally:
+                    if not booking_id:
+                        inventory.release(reservation)
+                return booking_id
+
+            # A started write can't be cancelled: if the turn runs out of time it finishes
+            # in the background, and confirming again returns the same booking ID
+            save = asyncio.ensure_future(asyncio.to_thread(save_or_release))
+            try:
+                booking_id = await within_deadline(asyncio.shield(save))
+            except DeadlineExceeded:
+                await log_async("warning", f"Booking write still running at turn deadline: {booking_data}")
+                return ["Your booking is still being saved ⏳ Reply 'yes' again in a moment to get your booking ID."], ERROR
+            except RoomsUnavailable:
+                await log_async("info", f"Rooms taken by another worker for {booking_data}")
+                return self._ask_for_other_dates(self._no_rooms_left(booking_data['destination']))
+
+            if booking_id:  # None means the insert failed
                 # Build confirmation message with the desired structure
                 confirmation_message = (
                     f"Booking confirmed! 🎉\n"
@@ -128,359 +310,307 @@ class HotelBookingChatbot:
                     f"Wishing you a wonderful journey! ✈️"
                 )
                 
-                # Get weather tip using the standalone function
-                weather_tip = await get_weather_tip(self.booking_info['destination'], log_async)
+                # Get weather tip using the standalone function; skipped if the turn is out of time
+                try:
+                    weather_tip = await within_deadline(get_weather_tip(self.booking_info['destination'], log_async))
+                except DeadlineExceeded:
+                    await log_async("warning", "Weather tip skipped: turn deadline reached")
+                    weather_tip = None
                 
-                self.reset()
+                await self.reset()
                 
                 # Return a list of messages
                 messages = [confirmation_message]
                 if weather_tip:
                     messages.append(weather_tip)
-                return messages
+                return messages, BOOKED
             else:
                 await log_async("error", "Database insertion failed")
-                return ["Booking failed ❌: Could not save to database. Please try again."]
+                return ["Booking failed ❌: Could not save to database. Please try again."], ERROR
 
         except Exception as e:
             await log_async("error", f"Confirmation error: {str(e)}", exc_info=True)
-            return ["There was an error processing your booking. Please try again."]        
+            return ["There was an error processing your booking. Please try again."], ERROR
+
+    @staticmethod
+    def _no_rooms_left(destination: str) -> str:
+        return f"Sorry, {destination} has no rooms left for those dates 😔 Which other check-in date would work for you? 🗓️"
+
+    def _ask_for_other_dates(self, reply: str) -> Tuple[List[str], str]:
+        """Clears the dates only; destination and guests are kept for the next attempt."""
+        self.booking_info["check_in"] = None
+        self.booking_info["check_out"] = None
+        # A QUESTION reply takes the conversation back to collecting_info
+        return [reply], QUESTION
 
     async def reset(self):
         """Resets the booking information and conversation history."""
-        self.booking_info = {"destination": None, "check_in": None, "check_out": None, "guests": None}
-        self.history = []
-        self.state = "collecting_info"
+        self.booking_info.clear()
+        self.history.clear()
+        self.summary.clear()
+        self.state = COLLECTING
+        self.last_reply = STATEMENT
         # Log reset action explicitly
         # await log_async("info", "Chatbot state has been reset.") # Can't await in non-async
         logger.info("Chatbot state has been reset.") # Use synchronous logger here
         print("--- Chatbot Reset ---") # Use print for explicit reset signal in console
 
-    def __init__(self):
-        self.chat = ChatGroq(groq_api_key=GROQ_API_KEY, model_name="gemma2-9b-it", temperature=0.3)
-        self.current_date = datetime.now().date() # Store as date object
-        self.current_date_str = self.current_date.strftime("%Y-%m-%d") # String version for prompts
-        self.greetings = [
-            "Hi there! I'm your friendly booking assistant. Ready to find you the perfect stay? 🌆",
-            "Hello! I'm here to help with your hotel booking. Let's get started! 🏨",
-            "Welcome! Where should we book your next adventure? 🌍"
-        ]
-        self.template = """
-        You are a friendly and enthusiastic hotel booking assistant. Your goal is to have natural conversations while collecting:
-        1. Destination city
-        2. Check-in date (current date: {current_date})
-        3. Check-out date
-        4. Number of guests
+    # Shared LLM objects, resolved from the process-wide registry on first use
+    @property
+    def chat(self):
+        return get_chat_model(temperature=0.3)
 
-        Conversation history:
-        {history}
+    @property
+    def prompt(self):
+        return get_booking_prompt()
 
-        Current booking info (use only if provided by user, otherwise ask):
-        Destination: {destination}
-        Check-in: {check_in}
-        Check-out: {check_out}
-        Guests: {guests}
-
-        Current state: {state}
-
-        Guidelines:
-        - Start with a friendly greeting if there's no history.
-        - Use natural language, be conversational, and vary your responses. Use 1-2 short sentences.
-        - Acknowledge user inputs positively (e.g., "Great!", "Sounds good!").
-        - For date handling: Today is {current_date}. Convert relative dates (e.g., "tomorrow", "next Tuesday", "weekend after next") to YYYY-MM-DD format. Ensure check-in is not in the past. Ensure check-out is after check-in. If only duration is given (e.g., "3 nights"), calculate check-out based on check-in.
-        - If multiple dates or destinations are mentioned ambiguously, ask for clarification.
-        - For ambiguous destinations (e.g., "Springfield"), ask for the state or country.
-        - Use occasional emojis to maintain a friendly tone. ☀️🏖️🌴
-        - Handle simple small talk (greetings, thanks, how are you) gracefully before returning to the booking task.
-        - If all information is collected, provide a clear summary with emojis and ask for confirmation.
-        - If the user wants to change something after confirmation is requested, identify the field and ask for the new value.
-
-        Response Examples:
-        - "Paris sounds wonderful! 🗼 When are you planning to check in? 🗓️"
-        - "Got it, 2 guests! And what's your check-in date? 📅"
-        - "Okay, checking in tomorrow, {tomorrow_date}. How many nights will you stay, or what's your check-out date? 🏨"
-        - "Let me confirm: A stay in {destination} from {check_in} to {check_out} for {guests} person(s). Does this look right? 👍"
-        - "Sure, we can change the dates. What new check-in date were you thinking of? 🤔"
-
-        Focus on the next piece of missing information based on the current booking info and history.
-        Respond conversationally.
-        """
-        self.prompt = ChatPromptTemplate.from_template(self.template)
-        # Removed RunnableSequence here, will invoke prompt and chat directly for more control
-
-        self.extract_template = """
-        Analyze the latest user message in the context of the conversation history to extract booking details.
-        Today's date is {current_date}. Convert relative dates (like "tomorrow", "next Friday", "August 15th") to absolute YYYY-MM-DD format.
-        If a duration is mentioned (e.g., "3 nights", "a week"), calculate the check-out date based on the check-in date if available.
-
-        Conversation History:
-        {history}
-
-        Current User Message: {user_message}
-
-        Return ONLY JSON with the extracted values for these keys. Use null if a value isn't mentioned or is unclear in the *latest user message*.
-        {{
-            "destination": "city name or null",
-            "check_in": "YYYY-MM-DD or null",
-            "check_out": "YYYY-MM-DD or null",
-            "guests": "integer or null"
-        }}
-
-        Examples:
-        - User says "I want to go to London next week for 5 nights": Infer check-in based on "next week" and calculate check-out.
-        - User says "tomorrow": Extract check_in as {tomorrow_date}.
-        - User says "check in March 5th, check out March 8th": Extract both dates.
-        - User says "2 people": Extract guests: 2.
-        """
-        self.extract_prompt = ChatPromptTemplate.from_template(self.extract_template)
-        self.extract_chain = RunnableSequence(self.extract_prompt | self.chat | parser)
+    def __init__(self, session_id: Optional[str] = None):
+        self.session_id = session_id or uuid.uuid4().hex # Identifies this conversation for booking idempotency
+        self.current_date = datetime.now().date() # Store as date object
+        self.current_date_str = self.current_date.strftime("%Y-%m-%d") # String version for prompts
+        # Prompts, chains and the LLM client are process-wide (see properties above);
+        # a session only holds its own state
+
+        self.booking_info = BookingInfo()
+        self.history = History()
+        self.summary = RollingSummary() # Turns that have dropped out of the history ring
+        self.state: str = COLLECTING # See conversation_fsm for the states and transitions
+        self.last_reply: str = STATEMENT # Reply kind of the last assistant message
+
+    # --- Session snapshots ---
+    def to_snapshot(self) -> Dict:
+        """Conversation state as plain data, for the session store."""
+        return {
+            "id": self.session_id,
+            "b": self.booking_info.to_list(),
+            "h": self.history.to_list(),
+            "m": self.summary.to_list(),
+            "s": self.state,
+            "r": self.last_reply,
+        }
 
-        self.booking_info: Dict[str, Union[str, int, None]] = {"destination": None, "check_in": None, "check_out": None, "guests": None}
-        self.history: List[str] = []
-        self.state: str = "collecting_info" # states: collecting_info, awaiting_confirmation, changing_info
-        
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict) -> "HotelBookingChatbot":
+        """Rebuilds a conversation saved with to_snapshot (by any worker)."""
+        bot = cls(session_id=snapshot["id"])
+        bot.booking_info = BookingInfo.from_list(snapshot["b"])
+        bot.history = History.from_list(snapshot["h"])
+        bot.summary = RollingSummary.from_list(snapshot.get("m"))
+        bot.state = snapshot["s"]
+        bot.last_reply = snapshot.get("r", STATEMENT)
+        return bot
+
+    def _remember(self, role: str, text: str):
+        """Adds an entry to the history; the entry it pushes out is folded into the summary."""
+        evicted = self.history.add(role, text)
+        if evicted:
+            self.summary.fold(*evicted, today=self.current_date)
 
     async def get_initial_message(self) -> str:
         """Return a random friendly greeting if conversation hasn't started."""
         if not self.history:
             greeting = random.choice(self.greetings)
-            self.history.append(f"Assistant: {greeting}")
+            self._remember(ASSISTANT, greeting)
+            self.last_reply = QUESTION
             await log_async("info", "Started new conversation.")
             return greeting
         # If history exists, initial message is not needed, process_message will handle it.
         return ""
 
     async def process_message(self, user_message: str) -> list[str]:
-        """Processes the user's message and returns the chatbot's responses as a list."""
-        user_message = user_message.strip()
+        """Processes the user's message and returns the chatbot's responses as a list.
 
-        if not user_message:
-            response = random.choice([
-                "Just checking - are you still there? 😊 Let me know how I can help!",
-                "No message received. Need help with a booking? 🤔"
-            ])
-            self.history.append(f"Assistant: {response}")
-            await log_async("info", f"Assistant response (empty message): {response}")
-            return [response]
-
-        self.history.append(f"User: {user_message}")
-        await log_async("info", f"User message: {user_message}")
-
-        # 1. Handle Small Talk First
-        small_talk_response = await self._handle_small_talk(user_message)
-        if small_talk_response:
-            self.history.append(f"Assistant: {small_talk_response}")
-            await log_async("info", f"Assistant response (small talk): {small_talk_response}")
-            return [small_talk_response]
-
-        # 2. Handle Confirmation/Changes if applicable
-        if self.state == "awaiting_confirmation":
-            responses = await self._handle_confirmation(user_message)
-            for response in responses:
-                self.history.append(f"Assistant: {response}")
-                await log_async("info", f"Assistant response (confirmation): {response}")
-            return responses
-
-        # 3. Extract Information and Update State (Main booking flow)
-        update_status_message = await self._update_booking_info(user_message)
+        The turn runs under a deadline (TURN_BUDGET_SECONDS); if the LLM, DB or weather
+        calls use it up, a rule-based reply is sent instead.
+        """
+        with turn_deadline():
+            try:
+                return await self._process_turn(user_message)
+            except DeadlineExceeded:
+                response, kind = await self._degraded_reply()
+                self._remember(ASSISTANT, response)
+                self.last_reply = kind
+                self.state = CONVERSATION_FSM.next_state(self.state, kind)
+                await log_async("warning", f"Assistant response (turn deadline reached): {response}")
+                return [response]
+
+    async def _degraded_reply(self) -> Tuple[str, str]:
+        """Rule-based reply for a turn that ran out of time; asks for whatever is still missing."""
+        if self.state == AWAITING_CONFIRMATION:
+            return "Sorry, that took me a little longer than expected. Should I finalize the booking as summarized? (yes/no) 😊", CONFIRM_PROMPT
+        next_q = await self._get_next_question_prompt()
+        if next_q:
+            return f"Sorry, I'm a bit slow right now 🐢 {next_q}", QUESTION
+        return await self._generate_natural_response()
+
+    async def _process_turn(self, user_message: str) -> list[str]:
+        user_message = user_message.strip()
+        if user_message:
+            self._remember(USER, user_message)
+            await log_async("info", f"User message: {user_message}")
+
+        # Classify the message, run the handler for (state, event) and move to the next state
+        turn = await CONVERSATION_FSM.dispatch(self, self.state, user_message)
+        self.state = turn.next_state
+        self.last_reply = turn.reply_kind
+        for response in turn.replies:
+            self._remember(ASSISTANT, response)
+            await log_async("warning" if turn.reply_kind == ERROR else "info",
+                            f"Assistant response ({turn.event}): {response}")
+        return turn.replies
+
+    # --- Turn handlers (routed by conversation_fsm.ROUTES); each returns (replies, reply kind) ---
+    async def _on_empty(self, turn: Turn) -> Tuple[List[str], str]:
+        return [random.choice([
+            "Just checking - are you still there? 😊 Let me know how I can help!",
+            "No message received. Need help with a booking? 🤔"
+        ])], QUESTION
+
+    async def _on_small_talk(self, turn: Turn) -> Tuple[List[str], str]:
+        response, kind = await self._handle_small_talk(turn.topic)
+        return [response], kind
+
+    async def _on_booking_info(self, turn: Turn) -> Tuple[List[str], str]:
+        update_status_message = await self._update_booking_info(turn.text)
         if update_status_message:
             # _update_booking_info handled an error or needs specific clarification
-            self.history.append(f"Assistant: {update_status_message}")
-            await log_async("warning", f"Assistant response (update issue): {update_status_message}")
-            return [update_status_message]
-
-        # 4. Generate Next Conversational Response
-        response = await self._generate_natural_response()
-        self.history.append(f"Assistant: {response}")
-        await log_async("info", f"Assistant response (booking flow): {response}")
-        return [response]
-
-    async def _handle_small_talk(self, message: str) -> Optional[str]:
-        """Handles simple greetings, thanks, etc., and returns to the booking task."""
-        message_lower = message.lower()
-        responses = {
-            r"\b(hi|hello|hey|yo|wassup)\b": ["Hello! 😊", "Hi there!", "Hey! Ready to book a hotel?"],
-            r"\bhow are you\b": ["I'm doing great, ready to find you the perfect hotel!", "I'm operational and ready to assist with your booking!"],
-            r"\b(thank(s| you)|cheers)\b": ["You're very welcome! 😊", "My pleasure!", "Happy to help! What's next?"],
-            r"\b(bye|goodbye|see ya)\b": ["Goodbye! 👋 Feel free to return anytime!", "Have a great day! Let me know if you need booking help later."],
-            r"\b(what'?s up|how'?s it going)\b": ["Just here, ready to help you book a stay! 🏨", "All good! Thinking about a trip? 😊"]
-        }
+            return [update_status_message], ERROR
+        response, kind = await self._generate_natural_response()
+        return [response], kind
+
+    async def _on_affirm(self, turn: Turn) -> Tuple[List[str], str]:
+        return await self._confirm_booking()
+
+    async def _on_deny(self, turn: Turn) -> Tuple[List[str], str]:
+        return [await self._handle_change_request(turn.text)], QUESTION
+
+    async def _on_unclear_confirmation(self, turn: Turn) -> Tuple[List[str], str]:
+        return ["Sorry, I didn't quite catch that. Should I finalize the booking as summarized? Please reply with 'yes' or 'no'. 😊"], CONFIRM_PROMPT
+
+    SMALL_TALK_REPLIES = {
+        "greeting": ["Hello! 😊", "Hi there!", "Hey! Ready to book a hotel?"],
+        "how_are_you": ["I'm doing great, ready to find you the perfect hotel!", "I'm operational and ready to assist with your booking!"],
+        "thanks": ["You're very welcome! 😊", "My pleasure!", "Happy to help! What's next?"],
+        "bye": ["Goodbye! 👋 Feel free to return anytime!", "Have a great day! Let me know if you need booking help later."],
+        "whats_up": ["Just here, ready to help you book a stay! 🏨", "All good! Thinking about a trip? 😊"]
+    }
+
+    async def _handle_small_talk(self, topic: str) -> Tuple[str, str]:
+        """Answers greetings, thanks, etc. (topics from conversation_fsm) and returns to the booking task."""
+        base_reply = random.choice(self.SMALL_TALK_REPLIES[topic])
+        # If booking is in progress, gently nudge back
+        if any(self.booking_info.values()) and not all(self.booking_info.values()):
+            # Avoid asking again if the last reply already asked a question
+            next_q = await self._get_next_question_prompt() if self.last_reply != QUESTION else None
+            if next_q:
+                return f"{base_reply} {next_q}", QUESTION
+        elif self.state == COLLECTING and not any(self.booking_info.values()):
+            # If starting out, ask the first question
+            return f"{base_reply} Where would you like to book a hotel? 🌍", QUESTION
+        return base_reply, STATEMENT # Just reply if booking is complete, not started or already asked
 
-        for pattern, replies in responses.items():
-            if re.search(pattern, message_lower):
-                base_reply = random.choice(replies)
-                # If booking is in progress, gently nudge back
-                if any(self.booking_info.values()) and not all(self.booking_info.values()):
-                     next_q = await self._get_next_question_prompt()
-                     if next_q:
-                         # Avoid asking question if last message was already a question
-                         last_assistant_msg = self.history[-1] if self.history and "Assistant:" in self.history[-1] else ""
-                         if "?" not in last_assistant_msg:
-                              return f"{base_reply} {next_q}"
-                         else:
-                              return base_reply # Just reply if already asked question
-                elif self.state == "collecting_info" and not any(self.booking_info.values()):
-                     # If starting out, ask the first question
-                     return f"{base_reply} Where would you like to book a hotel? 🌍"
-                return base_reply # Just reply if booking is complete or not started
-
-        return None # Not small talk
-
-    # --- THIS METHOD IS UPDATED ---
     async def _update_booking_info(self, user_message: str) -> Optional[str]:
         """Extracts info, validates, updates self.booking_info. Returns error/clarification message or None."""
         input_data = {
-            "history": "\n".join(self.history),
+            "history": self.history.render(),
+            "conversation_summary": self.summary.render(),
+            "booking_info": ", ".join(f"{field}: {value}" for field, value in self.booking_info.items()),
             "user_message": user_message, # Pass separately for clarity in prompt
             "current_date": self.current_date_str,
-            "tomorrow_date": (self.current_date + timedelta(days=1)).strftime("%Y-%m-%d")
         }
+        prompt_text = EXTRACT_PROMPT.render(**input_data)
 
         try:
-            # Update type hint to reflect the actual runtime type based on the error
-            extracted_data: dict = await self.extract_chain.ainvoke(input_data)
-
-            # Log the received data and its type for debugging
-            await log_async("info", f"Extractor chain returned type: {type(extracted_data)}")
-            await log_async("info", f"Extractor chain returned value: {extracted_data}")
-
-            # Ensure it's actually a dictionary before proceeding
-            if not isinstance(extracted_data, dict):
-                 await log_async("error", f"Extractor did not return a dictionary as expected. Got type: {type(extracted_data)}, value: {extracted_data}")
-                 # Try to recover if it's a string containing JSON that the parser missed
-                 if isinstance(extracted_data, str):
-                     try:
-                         # import json # Already imported at top
-                         extracted_data = json.loads(extracted_data)
-                         if not isinstance(extracted_data, dict): raise ValueError("Parsed JSON is not a dict")
-                         await log_async("info", "Successfully parsed string output into dict.")
-                     except Exception as parse_err:
-                         await log_async("error", f"Failed to parse string output from extractor: {parse_err}")
-                         return "Sorry, I had trouble reading the details. Could you please try rephrasing?"
-                 else:
-                    return "Sorry, I encountered an unexpected issue processing the details. Could you try again?"
-
-
-            # --- FIX: Use the dictionary directly ---
-            # No need for .model_dump() if extracted_data is already a dict.
-            extracted = extracted_data
-            # --------------------------------------
+            adapter = get_booking_details_adapter()
+            expecting = next((field for field, value in self.booking_info.items() if not value), None)
+
+            def accept(message) -> Dict:
+                # The one validation step: JSON, field types, YYYY-MM-DD dates and positive guest counts
+                return adapter.validate_python(parse_json_content(message)).model_dump()
+
+            async def llm_extract() -> Dict:
+                # Joins concurrent sessions' extractions into one request when batching is enabled;
+                # a single request starts on the fast model and escalates if its answer is invalid
+                return await extract_with_batching(
+                    lambda: prompt_text,
+                    # Provider JSON mode; the routed call's check parses and validates the reply in one step
+                    lambda: routed_call("extract", lambda model: resilient_llm_call(
+                        f"extract:{model}", lambda: get_json_model(model, temperature=0.3).ainvoke(prompt_text)
+                    ), text=user_message, accept=accept),
+                    accept=lambda part: adapter.validate_python(part).model_dump()
+                )
+
+            try:
+                # Paraphrases of an earlier message in the same context reuse its (already validated) result
+                # (SEMANTIC_CACHE_SIZE)
+                namespace = f"{self.current_date_str}|{expecting}|{self.booking_info['check_in']}"
+                extracted = await cached_extraction(user_message, namespace, llm_extract)
+            except Exception as llm_err:
+                # LLM circuit open, call failed, invalid output or out of time: rule-based extraction answers instantly
+                await log_async("warning", f"LLM extraction unavailable ({llm_err!r}); using rule-based extraction")
+                extracted = adapter.validate_python(extract_booking_details(
+                    user_message,
+                    self.current_date,
+                    check_in=self.booking_info["check_in"],
+                    expecting=expecting
+                )).model_dump()
+            await log_async("info", f"Extracted booking details: {extracted!r}")
 
             updated = False
             validation_message = None
 
-            # Update fields if newly extracted - Use .get() for safe access
-            new_destination = extracted.get("destination")
-            # Check type just in case LLM returns something odd
-            if new_destination and isinstance(new_destination, str) and self.booking_info["destination"] != new_destination:
-                self.booking_info["destination"] = new_destination.strip() # Add strip
+            new_destination = extracted["destination"].strip() if extracted["destination"] else None
+            if new_destination and self.booking_info["destination"] != new_destination:
+                self.booking_info["destination"] = new_destination
                 updated = True
                 await log_async("info", f"Updated destination to: {self.booking_info['destination']}")
 
-
-            new_guests = extracted.get("guests")
-             # Check type explicitly
-            if new_guests is not None: # Check for None explicitly
-                try:
-                    guest_count = int(new_guests) # Ensure it's an int
-                    if guest_count > 0:
-                        if self.booking_info["guests"] != guest_count:
-                           self.booking_info["guests"] = guest_count
-                           updated = True
-                           await log_async("info", f"Updated guests to: {self.booking_info['guests']}")
-                    else:
-                        await log_async("warning", f"Extractor dictionary contained invalid guest count: {new_guests}")
-                        validation_message = "The number of guests must be at least 1. How many people are travelling? 👨‍👩‍👧‍👦"
-                except (ValueError, TypeError):
-                     await log_async("warning", f"Extractor dictionary contained non-numeric guest count: {new_guests}")
-                     # Don't set validation message here, let _generate_natural_response ask again if needed
-
-
-            # Date validation and updating
-            new_check_in_str = extracted.get("check_in")
-            new_check_out_str = extracted.get("check_out")
-            current_check_in = self.booking_info.get("check_in")
-            current_check_out = self.booking_info.get("check_out")
-
-            # Validate and update check-in date (ensure it's a string before processing)
-            if new_check_in_str and isinstance(new_check_in_str, str) and new_check_in_str != current_check_in:
-                try:
-                    # Attempt to parse potential variations (e.g. "March 5") if direct parse fails - Robustness enhancement
-                    check_in_date = None
-                    try:
-                         check_in_date = datetime.strptime(new_check_in_str, "%Y-%m-%d").date()
-                    except ValueError:
-                         await log_async("warning", f"Could not parse check-in '{new_check_in_str}' as YYYY-MM-DD directly.")
-                         # Stick to strict YYYY-MM-DD based on prompt for now
-                         raise ValueError("Invalid date format")
-
-
-                    if check_in_date < self.current_date:
-                        await log_async("warning", f"User provided past check-in date: {new_check_in_str}")
-                        validation_message = f"Oops! It looks like the check-in date {new_check_in_str} is in the past. Please provide a date from {self.current_date_str} onwards. 🗓️"
-                        new_check_in_str = None # Mark as invalid for subsequent logic
-                        new_check_out_str = None # If check-in is bad, check-out likely needs re-eval anyway
-                    else:
-                        self.booking_info["check_in"] = new_check_in_str
-                        updated = True
-                        await log_async("info", f"Updated check-in to: {self.booking_info['check_in']}")
-                        # If check-in changes, clear check-out unless it was provided *simultaneously* and is valid relative to NEW check-in
-                        check_out_date_valid_relative = False
-                        if new_check_out_str and isinstance(new_check_out_str, str):
-                             try:
-                                 check_out_dt_temp = datetime.strptime(new_check_out_str, "%Y-%m-%d").date()
-                                 if check_out_dt_temp > check_in_date:
-                                     check_out_date_valid_relative = True
-                                     if self.booking_info["check_out"] != new_check_out_str:
-                                        self.booking_info["check_out"] = new_check_out_str
-                                        updated = True # Mark updated=True also if check_out is updated here
-                                        await log_async("info", f"Updated check-out simultaneously to: {self.booking_info['check_out']}")
-                             except ValueError:
-                                 pass # Invalid format for check-out, will be handled below or asked again
-
-                        if not check_out_date_valid_relative and self.booking_info["check_out"] is not None:
-                             self.booking_info["check_out"] = None # Require new check-out confirmation/input if not provided validly with new check-in
-                             await log_async("info", "Check-in date updated, cleared potentially invalid/old check-out date.")
-
-                except ValueError:
-                    await log_async("error", f"Invalid check-in date format received or failed parsing: {new_check_in_str}")
-                    if not validation_message: # Don't overwrite past date message
-                        validation_message = "Hmm, I couldn't quite understand that check-in date format. Could you please use YYYY-MM-DD? 🤔"
-                    new_check_in_str = None # Mark as invalid
-
-            # Validate and update check-out date (only if check-in is valid and check-out is new/different)
-            # Check self.booking_info['check_out'] again in case it was updated simultaneously above
-            if new_check_out_str and isinstance(new_check_out_str, str) and self.booking_info.get("check_in") and new_check_out_str != self.booking_info.get("check_out"):
-                 if validation_message is None: # Don't process if check-in had issues
-                    try:
-                        check_out_date = datetime.strptime(new_check_out_str, "%Y-%m-%d").date()
-                        # Ensure check_in date string is valid before parsing for comparison
-                        check_in_date = datetime.strptime(self.booking_info["check_in"], "%Y-%m-%d").date()
-
-                        if check_out_date <= check_in_date:
-                            await log_async("warning", f"Check-out date {new_check_out_str} is not after check-in date {self.booking_info['check_in']}.")
-                            validation_message = f"Got {new_check_out_str} for check-out, but it needs to be after your check-in date ({self.booking_info['check_in']}). What should the check-out date be? 📅"
-                            # No need to mark new_check_out_str as None, just return the message
-                        else:
-                            # Check if check_out was already updated simultaneously with check_in above
-                            # This condition check is slightly redundant now but safe
-                            if self.booking_info["check_out"] != new_check_out_str:
-                                self.booking_info["check_out"] = new_check_out_str
-                                updated = True
-                                await log_async("info", f"Updated check-out to: {self.booking_info['check_out']}")
-
-                    except ValueError:
-                        await log_async("error", f"Invalid check-out date format received: {new_check_out_str} or check-in was invalid: {self.booking_info.get('check_in')}")
-                        if not validation_message: # Don't overwrite other messages
-                            validation_message = "Hmm, I couldn't quite understand that check-out date format. Could you please use YYYY-MM-DD? 🤔"
-                        # No need to mark new_check_out_str as None
+            # The validator already dropped non-numeric and non-positive counts
+            if extracted["guests"] is not None and self.booking_info["guests"] != extracted["guests"]:
+                self.booking_info["guests"] = extracted["guests"]
+                updated = True
+                await log_async("info", f"Updated guests to: {self.booking_info['guests']}")
+
+            # Date validation and updating (formats are already checked; only the calendar rules remain)
+            new_check_in_str = extracted["check_in"]
+            new_check_out_str = extracted["check_out"]
+            new_check_out_date = datetime.strptime(new_check_out_str, "%Y-%m-%d").date() if new_check_out_str else None
+
+            if new_check_in_str and new_check_in_str != self.booking_info.get("check_in"):
+                check_in_date = datetime.strptime(new_check_in_str, "%Y-%m-%d").date()
+                if check_in_date < self.current_date:
+                    await log_async("warning", f"User provided past check-in date: {new_check_in_str}")
+                    validation_message = f"Oops! It looks like the check-in date {new_check_in_str} is in the past. Please provide a date from {self.current_date_str} onwards. 🗓️"
+                    new_check_out_str = None # If check-in is bad, check-out needs re-eval anyway
+                else:
+                    self.booking_info["check_in"] = new_check_in_str
+                    updated = True
+                    await log_async("info", f"Updated check-in to: {self.booking_info['check_in']}")
+                    # A new check-in keeps the check-out only if one was given with it and comes after it
+                    if new_check_out_date and new_check_out_date > check_in_date:
+                        if self.booking_info["check_out"] != new_check_out_str:
+                            self.booking_info["check_out"] = new_check_out_str
+                            await log_async("info", f"Updated check-out simultaneously to: {self.booking_info['check_out']}")
+                    elif self.booking_info["check_out"] is not None:
+                        self.booking_info["check_out"] = None
+                        await log_async("info", "Check-in date updated, cleared potentially invalid/old check-out date.")
+
+            if new_check_out_str and self.booking_info.get("check_in") and new_check_out_str != self.booking_info.get("check_out") and validation_message is None:
+                check_in_date = datetime.strptime(self.booking_info["check_in"], "%Y-%m-%d").date()
+                if new_check_out_date <= check_in_date:
+                    await log_async("warning", f"Check-out date {new_check_out_str} is not after check-in date {self.booking_info['check_in']}.")
+                    validation_message = f"Got {new_check_out_str} for check-out, but it needs to be after your check-in date ({self.booking_info['check_in']}). What should the check-out date be? 📅"
+                else:
+                    self.booking_info["check_out"] = new_check_out_str
+                    updated = True
+                    await log_async("info", f"Updated check-out to: {self.booking_info['check_out']}")
 
             if not updated and not validation_message and any(extracted.values()):
                 # If some info was extracted but didn't update anything (e.g., repeated info)
                 await log_async("info", "Extracted info matched existing info or was invalid/already handled.")
                 # Let _generate_natural_response ask the next logical question
 
-            elif not updated and not validation_message and not any(val for key, val in extracted.items() if val is not None): # Check specifically for None values
+            elif not updated and not validation_message:
                  # Nothing useful extracted, no errors - likely just small talk missed earlier or irrelevant input
                  await log_async("info", "No new booking information extracted from the message.")
                  # Let _generate_natural_response ask the next logical question
@@ -489,16 +619,17 @@ class HotelBookingChatbot:
             await log_async("info", f"Current booking info after update attempt: {self.booking_info}")
             return validation_message # Return message if validation failed, otherwise None
 
+        except DeadlineExceeded:
+            raise  # process_message answers with a rule-based reply
         except Exception as e:
             # Catch broader exceptions during the whole process
             await log_async("error", f"Exception in _update_booking_info: {str(e)}", exc_info=True) # Add traceback
             # Fallback message
             return "I encountered an unexpected issue while processing that. Could you please try again or rephrase? 🙏"
-    # --- END OF UPDATED METHOD ---
 
 
-    async def _generate_natural_response(self) -> str:
-        """Generates the next response based on the current state and missing info."""
+    async def _generate_natural_response(self) -> Tuple[str, str]:
+        """Generates the next response and its reply kind from the missing info."""
 
         # Check if all information is collected
         # Ensure guests is treated properly (can be int)
@@ -516,32 +647,22 @@ class HotelBookingChatbot:
                 f"Perfect! So that's {summary}. Ready to finalize this booking? (yes/no) 🎉",
                 f"Got it all! Just to double-check: {summary}. Shall I proceed? (yes/no) 😊"
             ]
-            self.state = "awaiting_confirmation"
-            await log_async("info", "All info collected. Moving to awaiting_confirmation state.")
-            return random.choice(responses)
+            await log_async("info", "All info collected. Asking for confirmation.")
+            return random.choice(responses), CONFIRM_PROMPT
 
         # If info is missing, determine the next question
         next_q = await self._get_next_question_prompt()
         if next_q:
-            # Acknowledge last input if something was just updated (check history - look for user message then successful update log?)
-            # Simplified acknowledgement logic:
+            # Acknowledge the input, unless the last reply was a question or an error (no redundant ack)
             ack = ""
-            # Check if the last assistant message wasn't already asking a question or showing an error
-            last_assistant_msg = ""
-            if len(self.history) >= 2 and "Assistant:" in self.history[-2]:
-                 last_assistant_msg = self.history[-2]
-
-            # Avoid redundant ack if last message was error or already a question
-            if "Assistant:" in last_assistant_msg and "?" not in last_assistant_msg and "Sorry" not in last_assistant_msg and "Oops" not in last_assistant_msg and "Hmm" not in last_assistant_msg:
-                # Check if something was actually updated based on logs (more complex) or just assume update if no error
-                 if "update issue" not in last_assistant_msg : # Basic check based on log message text
-                    ack = random.choice(["Got it. ", "Okay. ", "Alright. ", "Sounds good. "])
-
-            return f"{ack}{next_q}"
+            if self.last_reply == STATEMENT:
+                ack = random.choice(["Got it. ", "Okay. ", "Alright. ", "Sounds good. "])
+
+            return f"{ack}{next_q}", QUESTION
         else:
             # Should not happen if not all info is collected, but have a fallback.
             await log_async("warning", "In _generate_natural_response but couldn't determine next question. Booking info: {self.booking_info}")
-            return "Is there anything else I can help you with regarding the booking? 🤔"
+            return "Is there anything else I can help you with regarding the booking? 🤔", QUESTION
 
 
     async def _get_next_question_prompt(self) -> Optional[str]:
@@ -576,61 +697,60 @@ class HotelBookingChatbot:
             ])
         return None # All info present
 
-    async def _handle_confirmation(self, user_message: str) -> str:
-        """Handles user response (yes/no) during the confirmation state."""
-        message_lower = user_message.lower()
-
-        if re.search(r"\b(okey|ok|yes|yeah|yep|confirm|correct|ok|okay|proceed|finalize|do it|sure|sounds good)\b", message_lower): # Added more positive affirmations
-            return await self._confirm_booking()
-        elif re.search(r"\b(no|nope|change|wrong|wait|hold on|cancel|actually|different)\b", message_lower): # Added more negative/change indicators
-            # Ask what needs changing
-            # self.state = "changing_info" # A specific state to handle changes - reverting to collecting_info immediately after asking
-            await log_async("info", "User wants to change details.")
-            # Use LLM to try and understand what to change, or ask generically
-            # Refined prompt for better field detection
-            change_prompt = f"""The user wants to change the booking details based on their last message: "{user_message}".
-            Analyze the user message and identify which field they most likely want to change.
-            Respond with ONLY ONE word: 'destination', 'check_in', 'check_out', 'dates' (if both or unclear which date), 'guests', or 'unknown' if it's unclear."""
-            try:
-                change_field_response = await self.chat.ainvoke(change_prompt)
-                change_field = change_field_response.content.strip().lower()
-                # Clean up potential extra text from LLM
-                change_field = re.split(r'\s|\n', change_field)[0] # Take first word
-                await log_async("info", f"LLM suggested change field: {change_field}")
-            except Exception as llm_err:
-                await log_async("error", f"LLM call failed during change analysis: {llm_err}")
-                change_field = "unknown"
-
-
-            prompts = {
-                "destination": "No problem! Which destination should it be instead? 🌍",
-                "check_in": "Got it. What's the new check-in date? (YYYY-MM-DD) 🗓️",
-                "check_out": "Okay. What new check-out date were you thinking of? (YYYY-MM-DD) 📅",
-                "dates": "Sure thing. Let's update the dates. What is the new check-in date? (YYYY-MM-DD) 🗓️", # Ask for check-in first if 'dates'
-                "guests": "Okay, how many guests should it be? 👨‍👩‍👧‍👦",
-                "unknown": "Okay, what part of the booking would you like to change? (e.g., 'change destination to Paris', 'change dates', 'set guests to 3') 🤔"
-            }
-            # Reset the specific field(s) if identified, otherwise ask generally
-            if change_field == "destination":
-                 self.booking_info["destination"] = None
-            elif change_field == "check_in":
-                 self.booking_info["check_in"] = None
-                 self.booking_info["check_out"] = None # Also clear check-out if check-in changes
-            elif change_field == "check_out":
-                 self.booking_info["check_out"] = None
-            elif change_field == "dates": # Handle combined 'dates'
-                 self.booking_info["check_in"] = None
-                 self.booking_info["check_out"] = None
-            elif change_field == "guests":
-                 self.booking_info["guests"] = None
-
-            # Fallback or if 'unknown'
-            response = prompts.get(change_field, prompts["unknown"])
-            self.state = "collecting_info" # Go back to collecting after asking change question
-            await log_async("info", f"Reset field(s) based on '{change_field}', moving to collecting_info state.")
-            return response
-
-        else:
-            # Unclear response
-            return "Sorry, I didn't quite catch that. Should I finalize the booking as summarized? Please reply with 'yes' or 'no'. 😊"
-
+    async def _handle_change_request(self, user_message: str) -> str:
+        """Clears the field(s) the user wants to change during confirmation and asks for the new value."""
+        await log_async("info", "User wants to change details.")
+        # Use LLM to try and understand what to change, or ask generically
+        # Refined prompt for better field detection
+        change_prompt = CHANGE_PROMPT.render(user_message=user_message)
+        try:
+            change_field = await routed_call(
+                "change_field",
+                lambda model: call_llm(within_deadline(get_chat_model(model, temperature=0.3).ainvoke(change_prompt))),
+                text=user_message, accept=_parse_change_field
+            )
+            await log_async("info", f"LLM suggested change field: {change_field}")
+        except Exception as llm_err:
+            await log_async("warning", f"LLM change analysis unavailable ({llm_err!r}); using keyword rules")
+            change_field = detect_change_field(user_message)
+
+
+        prompts = {
+            "destination": "No problem! Which destination should it be instead? 🌍",
+            "check_in": "Got it. What's the new check-in date? (YYYY-MM-DD) 🗓️",
+            "check_out": "Okay. What new check-out date were you thinking of? (YYYY-MM-DD) 📅",
+            "dates": "Sure thing. Let's update the dates. What is the new check-in date? (YYYY-MM-DD) 🗓️", # Ask for check-in first if 'dates'
+            "guests": "Okay, how many guests should it be? 👨‍👩‍👧‍👦",
+            "unknown": "Okay, what part of the booking would you like to change? (e.g., 'change destination to Paris', 'change dates', 'set guests to 3') 🤔"
+        }
+        # Reset the specific field(s) if identified, otherwise ask generally
+        if change_field == "destination":
+             self.booking_info["destination"] = None
+        elif change_field == "check_in":
+             self.booking_info["check_in"] = None
+             self.booking_info["check_out"] = None # Also clear check-out if check-in changes
+        elif change_field == "check_out":
+             self.booking_info["check_out"] = None
+        elif change_field == "dates": # Handle combined 'dates'
+             self.booking_info["check_in"] = None
+             self.booking_info["check_out"] = None
+        elif change_field == "guests":
+             self.booking_info["guests"] = None
+
+        # Fallback or if 'unknown'
+        response = prompts.get(change_field, prompts["unknown"])
+        await log_async("info", f"Reset field(s) based on '{change_field}', back to collecting info.")
+        return response
+
+
+# --- Warm-up ---
+def warm_up():
+    """Loads the heavy dependencies and builds the shared LLM objects ahead of the first request."""
+    import booking_info
+    import weather_utils
+    get_json_model(first_model("extract"), temperature=0.3)  # Builds the JSON-mode extraction client
+    get_booking_details_adapter()  # Builds BookingDetails and compiles its validator
+    get_extraction_cache()  # Imports numpy and allocates the cache matrix, when the cache is enabled
+    get_booking_prompt()  # Imports langchain_core and parses the reply template
+    getattr(booking_info.mysql_connector, "connect")  # Resolves the lazily imported modules
+    getattr(weather_utils.aiohttp, "ClientSession")
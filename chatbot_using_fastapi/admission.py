@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict
+
+logger = logging.getLogger(__name__)
+
+CHAT_MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", "32"))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "64"))
+CHAT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "5"))
+DISCONNECT_POLL_SECONDS = 0.1
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; carries the status and Retry-After to send back."""
+
+    def __init__(self, reason: str, retry_after: int, status_code: int = 503):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class ClientGone(Exception):
+    """The client disconnected while its request was still queued."""
+
+
+class AdmissionController:
+    """Bounded in-flight limit with a bounded FIFO queue in front of it.
+
+    Requests beyond max_in_flight wait in the queue. When the queue is full, or a
+    request waits longer than queue_timeout, it is rejected at once with a Retry-After
+    hint. Queued requests whose client has disconnected are dropped before they
+    start. Admitted requests therefore only ever wait behind a bounded amount of work.
+    """
+
+    def __init__(self, max_in_flight: int = CHAT_MAX_IN_FLIGHT, max_queue: int = CHAT_MAX_QUEUE,
+                 queue_timeout: float = CHAT_QUEUE_TIMEOUT_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._avg_service_seconds = 1.0  # EWMA of handler time, for Retry-After
+        self.counters: Dict[str, int] = {"admitted": 0, "queued_total": 0, "rejected_queue_full": 0,
+                                         "rejected_timeout": 0, "cancelled_disconnected": 0}
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog is expected to drain."""
+        backlog = len(self._waiters) + self.in_flight
+        return max(1, math.ceil(backlog * self._avg_service_seconds / max(1, self.max_in_flight)))
+
+    def stats(self) -> Dict:
+        return {"in_flight": self.in_flight, "queued": len(self._waiters), **self.counters}
+
+    async def _acquire(self, is_disconnected: Callable[[], Awaitable[bool]]):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.counters["rejected_queue_full"] += 1
+            raise Overloaded("Server is busy, please retry shortly", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.counters["queued_total"] += 1
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters["rejected_timeout"] += 1
+                    raise Overloaded("Timed out waiting for capacity", self.retry_after())
+                try:
+                    # shield: a poll timeout must not cancel the slot handed over by release()
+                    await asyncio.wait_for(asyncio.shield(waiter), min(remaining, DISCONNECT_POLL_SECONDS))
+                    return  # Slot handed over by release()
+                except asyncio.TimeoutError:
+                    pass
+                if await is_disconnected():
+                    self.counters["cancelled_disconnected"] += 1
+                    raise ClientGone()
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()  # Got a slot at the last moment; pass it on
+            else:
+                waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    def _release_slot(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # in_flight stays the same: the slot moves to the waiter
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, is_disconnected: Callable[[], Awaitable[bool]]):
+        """Holds one in-flight slot for the duration of the block."""
+        await self._acquire(is_disconnected)
+        self.counters["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._avg_service_seconds = 0.8 * self._avg_service_seconds + 0.2 * (time.monotonic() - started)
+            self._release_slot()
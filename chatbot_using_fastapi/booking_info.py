@@ -1,42 +1,230 @@
-import mysql.connector
+import asyncio
+import base64
 import os
+import sys
+from datetime import date
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
+# Shared helpers (booking_ids, ...) live in the repository root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from booking_ids import new_booking_id, parse_booking_id, format_booking_id
+from lazy_imports import lazy_import
+
+# DB drivers load on first use (or warm-up), keeping cold start cheap
+mysql_connector = lazy_import("mysql.connector")
+aiomysql = lazy_import("aiomysql")
+
 load_dotenv()
 
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_NAME = os.getenv("DB_NAME", "chatbot_db")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+MAX_PAGE_SIZE = 200
 
-async def add_to_db(destination: str, check_in: str, check_out: str, guests: int) -> bool:
+BOOKINGS_TABLE = """
+    CREATE TABLE IF NOT EXISTS bookings (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        booking_id BINARY(16) NOT NULL,
+        destination VARCHAR(255),
+        check_in DATE,
+        check_out DATE,
+        guests INT,
+        UNIQUE KEY uq_bookings_booking_id (booking_id),
+        KEY idx_bookings_destination_check_in (destination, check_in, id),
+        KEY idx_bookings_check_in (check_in, id)
+    )
+"""
+# Indexes backing the read endpoints: (filter column(s), sort key, tie-breaker)
+READ_INDEXES = {
+    "idx_bookings_destination_check_in": "(destination, check_in, id)",
+    "idx_bookings_check_in": "(check_in, id)",
+}
+BOOKING_COLUMNS = "id, booking_id, destination, check_in, check_out, guests"
+BOOKINGS_COLUMNS_QUERY = (
+    "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'bookings'"
+)
+BOOKINGS_INDEXES_QUERY = (
+    "SELECT INDEX_NAME FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'bookings'"
+)
+
+_pool = None
+_pool_lock = None
+_schema_ready = False
+
+def _booking_id_migrations(columns, indexes) -> List[str]:
+    """DDL bringing a bookings table created before booking IDs were persisted up to date."""
+    statements = []
+    if "booking_id" not in columns:
+        # Rows saved before booking IDs were persisted keep NULL here
+        statements.append("ALTER TABLE bookings ADD COLUMN booking_id BINARY(16) NULL")
+    if "uq_bookings_booking_id" not in indexes:
+        statements.append("ALTER TABLE bookings ADD UNIQUE KEY uq_bookings_booking_id (booking_id)")
+    return statements
+
+def _ensure_schema(cursor):
+    """Creates the bookings table or migrates an older one (runs once per process)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    cursor.execute(BOOKINGS_TABLE)
+    cursor.execute(BOOKINGS_COLUMNS_QUERY)
+    columns = {row[0] for row in cursor.fetchall()}
+    cursor.execute(BOOKINGS_INDEXES_QUERY)
+    indexes = {row[0] for row in cursor.fetchall()}
+    for statement in _booking_id_migrations(columns, indexes):
+        cursor.execute(statement)
+    _schema_ready = True
+
+async def save_booking(destination: str, check_in: str, check_out: str, guests: int) -> Optional[str]:
+    """Stores a booking under a new time-ordered ID and returns that ID (None on failure)."""
+    conn = None
+    cursor = None
     try:
-        conn = mysql.connector.connect(
+        conn = mysql_connector.connect(
             host=DB_HOST,
             user=DB_USER,
             password=DB_PASSWORD,
             database=DB_NAME
         )
         cursor = conn.cursor()
+        _ensure_schema(cursor)
+        booking_id = new_booking_id()
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bookings (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                destination VARCHAR(255),
-                check_in DATE,
-                check_out DATE,
-                guests INT
-            )
-        """)
-        cursor.execute("""
-            INSERT INTO bookings (destination, check_in, check_out, guests)
-            VALUES (%s, %s, %s, %s)
-        """, (destination, check_in, check_out, guests))
+            INSERT INTO bookings (booking_id, destination, check_in, check_out, guests)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (booking_id.bytes, destination, check_in, check_out, guests))
         conn.commit()
-        return True
-    except mysql.connector.Error as e:
+        return str(booking_id)
+    except mysql_connector.Error as e:
         print(f"Database error: {str(e)}")
-        return False
+        return None
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
\ No newline at end of file
+        if conn is not None and conn.is_connected():
+            if cursor is not None:
+                cursor.close()
+            conn.close()
+
+async def add_to_db(destination: str, check_in: str, check_out: str, guests: int) -> bool:
+    return await save_booking(destination, check_in, check_out, guests) is not None
+
+# --- Read side (async pool) ---
+async def get_pool():
+    """Returns the shared aiomysql pool, creating it and the read indexes on first use."""
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            pool = await aiomysql.create_pool(
+                host=DB_HOST,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                db=DB_NAME,
+                minsize=DB_POOL_MIN,
+                maxsize=DB_POOL_MAX,
+                autocommit=True
+            )
+            await _ensure_read_indexes(pool)
+            _pool = pool
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+async def _ensure_read_indexes(pool):
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(BOOKINGS_TABLE)
+            await cursor.execute(BOOKINGS_COLUMNS_QUERY)
+            existing_columns = {row[0] for row in await cursor.fetchall()}
+            await cursor.execute(BOOKINGS_INDEXES_QUERY)
+            existing = {row[0] for row in await cursor.fetchall()}
+            for statement in _booking_id_migrations(existing_columns, existing):
+                await cursor.execute(statement)
+            for name, columns in READ_INDEXES.items():
+                if name not in existing:
+                    await cursor.execute(f"ALTER TABLE bookings ADD INDEX {name} {columns}")
+
+def _row_to_booking(row) -> Dict:
+    return {
+        "booking_id": format_booking_id(row[1]) if row[1] is not None else None,  # NULL on pre-migration rows
+        "destination": row[2],
+        "check_in": row[3].isoformat() if row[3] else None,
+        "check_out": row[4].isoformat() if row[4] else None,
+        "guests": row[5],
+    }
+
+def encode_cursor(check_in: date, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{check_in.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """Inverse of encode_cursor. Raises ValueError if the cursor is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        check_in, row_id = raw.split("|")
+        return date.fromisoformat(check_in), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+async def get_booking(booking_id: str) -> Optional[Dict]:
+    """Looks a booking up by its customer-facing ID (unique index hit). Raises ValueError if malformed."""
+    key = parse_booking_id(booking_id)
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE booking_id = %s", (key,))
+            row = await cursor.fetchone()
+    return _row_to_booking(row) if row else None
+
+async def list_bookings(destination: Optional[str] = None, check_in_from: Optional[date] = None,
+                        check_in_to: Optional[date] = None, cursor: Optional[str] = None,
+                        limit: int = 50) -> Tuple[List[Dict], Optional[str]]:
+    """Lists bookings ordered by (check_in, id) with keyset pagination.
+
+    Returns (bookings, next_cursor); next_cursor is None on the last page. Each page is a
+    range scan on idx_bookings_destination_check_in or idx_bookings_check_in, so its cost
+    does not grow with the page number or the table size.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    clauses, params = ["check_in IS NOT NULL"], []
+    if destination:
+        clauses.append("destination = %s")
+        params.append(destination)
+    if check_in_from:
+        clauses.append("check_in >= %s")
+        params.append(check_in_from)
+    if check_in_to:
+        clauses.append("check_in <= %s")
+        params.append(check_in_to)
+    if cursor:
+        after_check_in, after_id = decode_cursor(cursor)
+        clauses.append("(check_in > %s OR (check_in = %s AND id > %s))")
+        params.extend([after_check_in, after_check_in, after_id])
+    query = f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE {' AND '.join(clauses)} ORDER BY check_in, id LIMIT %s"
+    params.append(limit + 1)
+
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, params)
+            rows = await cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[3], last[0])
+    return [_row_to_booking(row) for row in rows], next_cursor
@@ -1,16 +1,22 @@
 from datetime import datetime, timedelta
-from typing import Dict, List
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.runnables import RunnableSequence
+from typing import Dict, List, Tuple
 from pydantic import BaseModel, Field
 import os
-import re
-import httpx
 import logging
 from dotenv import load_dotenv
 from booking_info import add_to_db
+# booking_info puts the repository root on sys.path for the shared modules
+from llm_clients import get_chat_model, get_chat_prompt, shared, call_llm
+from rule_extractor import extract_booking_details, detect_change_field
+from retry_policy import resilient_llm_call
+from model_router import routed_call
+from extraction_batcher import extract_with_batching
+from semantic_cache import cached_extraction
+from deadlines import turn_deadline, within_deadline
+from conversation_state import ASSISTANT, USER, BookingInfo, History
+from summarizer import RollingSummary
+from prompt_builder import PromptLayout
+from conversation_fsm import BOOKED, COLLECTING, CONFIRM_PROMPT, CONVERSATION_FSM, QUESTION, STATEMENT, Turn
 import asyncio
 import random
 
@@ -28,128 +34,216 @@ class BookingDetails(BaseModel):
     check_out: str = Field(description="Check-out date in YYYY-MM-DD format")
     guests: int = Field(description="Number of guests staying")
 
-parser = JsonOutputParser(pydantic_object=BookingDetails)
+def get_extract_parser():
+    """JSON output parser for extraction; langchain is imported on first use."""
+    def build():
+        from langchain_core.output_parsers import JsonOutputParser
+        return JsonOutputParser(pydantic_object=BookingDetails)
+    return shared("fastapi_booking_extract_parser", build)
 
-class HotelBookingChatbot:
-    def __init__(self):
-        self.chat = ChatGroq(groq_api_key=GROQ_API_KEY, model_name="gemma2-9b-it", temperature=0.3)
-        self.current_date = datetime.now().strftime("%Y-%m-%d")
-        self.greetings = [
-            "Hi there! I'm your friendly booking assistant. Ready to find you the perfect stay? 🌆",
-            "Hello! I'm here to help with your hotel booking. Let's get started! 🏨",
-            "Welcome! Where should we book your next adventure? 🌍"
-        ]
-        self.template = """
+GREETINGS = [
+    "Hi there! I'm your friendly booking assistant. Ready to find you the perfect stay? 🌆",
+    "Hello! I'm here to help with your hotel booking. Let's get started! 🏨",
+    "Welcome! Where should we book your next adventure? 🌍"
+]
+
+# Instruction prefix, then the per-turn sections: see prompt_builder.PromptLayout
+BOOKING_PROMPT = PromptLayout("fastapi_booking_reply", """
         You are a friendly and enthusiastic hotel booking assistant. Your goal is to have natural conversations while collecting:
         1. Destination city
-        2. Check-in date (current date: {current_date})
+        2. Check-in date
         3. Check-out date
         4. Number of guests
-        
-        Conversation history:
-        {history}
-        
-        Current booking info:
-        {booking_info}
-        
-        Current state:
-        {state}
-        
+
         Guidelines:
         - Start with a friendly greeting if there's no history
         - Use natural language and vary your responses
         - Acknowledge user inputs positively
-        - For date handling: Today is {current_date}. Convert relative dates (e.g., "tomorrow") to YYYY-MM-DD
+        - For date handling: today's date is given below. Convert relative dates (e.g., "tomorrow") to YYYY-MM-DD
         - If multiple dates are mentioned, ask for clarification
         - For ambiguous destinations, ask follow-up questions
         - Add occasional emojis to keep it friendly
         - Handle small talk gracefully before returning to booking tasks
-        
+
         Response Examples:
         - "Paris sounds wonderful! When will you be checking in? 🗓️"
         - "Got it! How many guests will be joining you? 👨👩👧👦"
-        - "Let me confirm: {summary}. Does this look right? 😊"
-        
+        - "Let me confirm: a stay in Paris from 2025-03-05 to 2025-03-08 for 2 guests. Does this look right? 😊"
+
         If all information is collected:
         - Create a friendly summary with emojis
         - Ask for confirmation using positive language
-        
+
         Respond conversationally in 1-2 short sentences.
-        """
-        self.prompt = ChatPromptTemplate.from_template(self.template)
-        self.chain = RunnableSequence(self.prompt | self.chat)
-        
-        self.extract_template = """
-        Extract booking details from this conversation history: {history}. 
-        Today's date is {current_date}. Convert relative dates to absolute dates using YYYY-MM-DD format.
-        
+        """, [
+    ("Today's date", "current_date"),
+    ("Summary of earlier conversation", "conversation_summary"),
+    ("Recent conversation", "history"),
+    ("Current booking info", "booking_info"),
+    ("Current state", "state"),
+])
+
+EXTRACT_PROMPT = PromptLayout("fastapi_booking_extract", """
+        Extract booking details from the conversation below.
+        Today's date is given below. Convert relative dates to absolute dates using YYYY-MM-DD format.
+
         Return JSON with:
         - destination: city name or null
         - check_in: earliest mentioned date or null
         - check_out: latest mentioned date or null
         - guests: integer or null
-        
+
         Handle these cases:
-        - "next week" => calculate from {current_date}
-        - "tomorrow" => {current_date + 1 day}
+        - "next week" => calculate from today's date
+        - "tomorrow" => the day after today's date
         - Date ranges: "March 5th-8th" => check_in: 2024-03-05, check_out: 2024-03-08
         - Implicit check-out: "3 nights" => check_out = check_in + 3 days
-        """
-        self.extract_prompt = ChatPromptTemplate.from_template(self.extract_template)
-        self.extract_chain = RunnableSequence(self.extract_prompt | self.chat | parser)
+        """, [
+    # Slowest changing first (see prompt_builder.PromptLayout)
+    ("Today's date", "current_date"),
+    ("Summary of earlier conversation", "conversation_summary"),
+    ("Recent conversation", "history"),
+    ("Booking details collected so far", "booking_info"),
+    ("Current User Message", "user_message"),
+])
+
+CHANGE_ANALYSIS_PROMPT = PromptLayout("fastapi_change_analysis", """
+        Analyze the change request below.
+        Return JSON with:
+        - field: one of [destination, check_in, check_out, guests]
+        - reason: short explanation
+        """, [("Change request", "message")])
+
+
+CHANGE_FIELDS = {"destination", "check_in", "check_out", "guests"}
+
+
+def _parse_extraction(reply) -> Dict:
+    """Extraction reply as a dict; anything else is rejected (and escalated to the next model tier)."""
+    extracted = get_extract_parser().invoke(reply)
+    if not isinstance(extracted, dict):
+        raise ValueError(f"Extraction reply is not an object: {extracted!r}")
+    return extracted
+
+
+class HotelBookingChatbot:
+    # Per-session state only (no __dict__); prompts and templates are shared class attributes
+    __slots__ = ("current_date", "booking_info", "history", "summary", "state", "last_reply", "last_change_request")
+    greetings = GREETINGS
+    template = BOOKING_PROMPT
+    extract_template = EXTRACT_PROMPT
+    # Shared LLM objects, resolved from the process-wide registry on first use
+    @property
+    def chat(self):
+        return get_chat_model(temperature=0.3)
+
+    @property
+    def prompt(self):
+        return get_chat_prompt("fastapi_booking_reply", BOOKING_PROMPT.as_template())
+
+    @property
+    def chain(self):
+        def build():
+            from langchain_core.runnables import RunnableSequence
+            return RunnableSequence(self.prompt | self.chat)
+        return shared("fastapi_booking_reply_chain", build)
+
+    def __init__(self):
+        self.current_date = datetime.now().strftime("%Y-%m-%d")
+        # Prompts, chains and the LLM client are process-wide (see properties above);
+        # a session only holds its own state
         
-        self.booking_info: Dict[str, str] = {"destination": None, "check_in": None, "check_out": None, "guests": None}
-        self.history: List[str] = []
-        self.state: str = "collecting_info"
+        self.booking_info = BookingInfo()
+        self.history = History()
+        self.summary = RollingSummary()  # Turns that have dropped out of the history ring
+        self.state: str = COLLECTING  # See conversation_fsm for the states and transitions
+        self.last_reply: str = STATEMENT
         self.last_change_request: str = None
 
+    # --- Session snapshots ---
+    def to_snapshot(self) -> Dict:
+        """Conversation state as plain data, for the session store."""
+        return {"b": self.booking_info.to_list(), "h": self.history.to_list(),
+                "m": self.summary.to_list(), "s": self.state, "r": self.last_reply}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict) -> "HotelBookingChatbot":
+        """Rebuilds a conversation saved with to_snapshot (by any worker)."""
+        bot = cls()
+        bot.booking_info = BookingInfo.from_list(snapshot["b"])
+        bot.history = History.from_list(snapshot["h"])
+        bot.summary = RollingSummary.from_list(snapshot.get("m"))
+        bot.state = snapshot["s"]
+        bot.last_reply = snapshot.get("r", STATEMENT)
+        return bot
+
+    def _remember(self, role: str, text: str):
+        """Adds an entry to the history; the entry it pushes out is folded into the summary."""
+        evicted = self.history.add(role, text)
+        if evicted:
+            self.summary.fold(*evicted, today=datetime.now().date())
+
     async def get_initial_message(self) -> str:
         """Return a random friendly greeting"""
         if not self.history:
             greeting = random.choice(self.greetings)
-            self.history.append(f"Assistant: {greeting}")
+            self._remember(ASSISTANT, greeting)
+            self.last_reply = QUESTION
             return greeting
         return ""
 
     async def process_message(self, user_message: str) -> str:
+        # LLM calls share one per-turn budget (TURN_BUDGET_SECONDS); on timeout the
+        # reply falls back to the rule-based prompts
+        with turn_deadline():
+            return await self._process_turn(user_message)
+
+    async def _process_turn(self, user_message: str) -> str:
         user_message = user_message.strip()
-        
-        # Handle empty input
-        if not user_message:
-            return "Just checking - are you still there? 😊"
-            
-        # Add small talk handling
-        small_talk_response = await self._handle_small_talk(user_message)
-        if small_talk_response:
-            self.history.append(f"User: {user_message}")
-            self.history.append(f"Assistant: {small_talk_response}")
-            return small_talk_response
-
-        # Process booking-related messages
-        if self.state == "awaiting_confirmation":
-            return await self._handle_confirmation(user_message)
-            
-        await self._update_booking_info(user_message)
-        
-        response = await self._generate_natural_response()
-        
-        self.history.append(f"User: {user_message}")
-        self.history.append(f"Assistant: {response}")
-        return response
 
-    async def _handle_small_talk(self, message: str) -> str:
-        message_lower = message.lower()
-        responses = {
-            r"(hi|hello|hey)": ["Hello! 😊", "Hi there!", "Hey! Ready to book?"],
-            r"how are you": ["I'm great, thanks for asking! Ready to help with your booking.", "Doing well! Let's find you a great hotel."],
-            r"thank(s| you)": ["You're welcome! 😊", "My pleasure!", "Happy to help!"],
-            r"(bye|goodbye)": ["Have a great day! 🌟", "Goodbye! Let me know if you need anything else."]
-        }
-        
-        for pattern, replies in responses.items():
-            if re.search(pattern, message_lower):
-                return random.choice(replies) + " " + await self._get_next_question()
-        return ""
+        # Classify the message, run the handler for (state, event) and move to the next state
+        turn = await CONVERSATION_FSM.dispatch(self, self.state, user_message)
+        self.state = turn.next_state
+        self.last_reply = turn.reply_kind
+        # Recorded after the handlers ran: extraction sees the new message separately
+        if user_message:
+            self._remember(USER, user_message)
+        for response in turn.replies:
+            self._remember(ASSISTANT, response)
+        return "\n\n".join(turn.replies)
+
+    # --- Turn handlers (routed by conversation_fsm.ROUTES); each returns (replies, reply kind) ---
+    async def _on_empty(self, turn: Turn) -> Tuple[List[str], str]:
+        return ["Just checking - are you still there? 😊"], QUESTION
+
+    async def _on_small_talk(self, turn: Turn) -> Tuple[List[str], str]:
+        next_question = await self._get_next_question()
+        reply = random.choice(self.SMALL_TALK_REPLIES[turn.topic])
+        if next_question:
+            return [f"{reply} {next_question}"], QUESTION
+        return [reply], STATEMENT
+
+    async def _on_booking_info(self, turn: Turn) -> Tuple[List[str], str]:
+        await self._update_booking_info(turn.text)
+        response, kind = await self._generate_natural_response()
+        return [response], kind
+
+    async def _on_affirm(self, turn: Turn) -> Tuple[List[str], str]:
+        return [await self._confirm_booking()], BOOKED
+
+    async def _on_deny(self, turn: Turn) -> Tuple[List[str], str]:
+        return [await self._handle_changes(turn.text)], QUESTION
+
+    async def _on_unclear_confirmation(self, turn: Turn) -> Tuple[List[str], str]:
+        return ["Just to confirm: Should I finalize this booking? (yes/no) 😊"], CONFIRM_PROMPT
+
+    SMALL_TALK_REPLIES = {
+        "greeting": ["Hello! 😊", "Hi there!", "Hey! Ready to book?"],
+        "how_are_you": ["I'm great, thanks for asking! Ready to help with your booking.", "Doing well! Let's find you a great hotel."],
+        "thanks": ["You're welcome! 😊", "My pleasure!", "Happy to help!"],
+        "bye": ["Have a great day! 🌟", "Goodbye! Let me know if you need anything else."],
+        "whats_up": ["All good! Ready to help with your booking. 😊"]
+    }
 
     async def _get_next_question(self) -> str:
         questions = {
@@ -175,16 +269,6 @@ class HotelBookingChatbot:
             return ""
         return random.choice(questions.get(missing[0], ["Let's continue with your booking details."]))
 
-    async def _handle_confirmation(self, user_message: str) -> str:
-        message_lower = user_message.lower()
-        
-        if re.search(r"\b(yes|yeah|yep|confirm|correct)\b", message_lower):
-            return await self._confirm_booking()
-        elif re.search(r"\b(no|nope|change|wrong)\b", message_lower):
-            return await self._handle_changes(user_message)
-        else:
-            return "Just to confirm: Should I finalize this booking? (yes/no) 😊"
-
     async def _confirm_booking(self) -> str:
         # ... existing confirmation logic ...
         
@@ -201,7 +285,12 @@ class HotelBookingChatbot:
 
     async def _handle_changes(self, message: str) -> str:
         # Use LLM to detect what to change
-        analysis = await self._analyze_change_request(message)
+        try:
+            analysis = await self._analyze_change_request(message)
+        except Exception as e:
+            # LLM circuit open, call failed or out of time
+            logger.warning(f"Change analysis unavailable ({e!r}); using keyword rules")
+            analysis = {"field": detect_change_field(message)}
         field_to_change = analysis.get("field")
         
         change_prompts = {
@@ -211,31 +300,61 @@ class HotelBookingChatbot:
             "guests": "Okay! How many guests should we update to? 👨👩👧👦"
         }
         
+        # Both replies are questions, which take the conversation back to collecting_info
         if field_to_change in change_prompts:
-            self.state = "collecting_info"
             self.booking_info[field_to_change] = None
             return change_prompts[field_to_change]
         
         return "What would you like to adjust? You can say 'destination', 'dates', or 'guests'."
 
     async def _analyze_change_request(self, message: str) -> Dict:
-        prompt = f"""
-        Analyze this change request: "{message}"
-        Return JSON with:
-        - field: one of [destination, check_in, check_out, guests]
-        - reason: short explanation
-        """
-        chain = ChatPromptTemplate.from_template(prompt) | self.chat | JsonOutputParser()
-        return await chain.ainvoke({})
+        prompt_text = CHANGE_ANALYSIS_PROMPT.render(message=message)
+
+        def accept(reply) -> Dict:
+            from langchain_core.output_parsers import JsonOutputParser
+            analysis = JsonOutputParser().invoke(reply)
+            if not isinstance(analysis, dict) or analysis.get("field") not in CHANGE_FIELDS:
+                raise ValueError(f"Unexpected change analysis {analysis!r}")
+            return analysis
+
+        return await routed_call(
+            "change_field",
+            lambda model: call_llm(within_deadline(get_chat_model(model, temperature=0.3).ainvoke(prompt_text))),
+            text=message, accept=accept
+        )
 
     async def _update_booking_info(self, user_message: str):
         input_data = {
-            "history": "\n".join(self.history + [f"User: {user_message}"]),
+            "history": self.history.render(),
+            "conversation_summary": self.summary.render(),
+            "booking_info": ", ".join(f"{field}: {value}" for field, value in self.booking_info.items()),
+            "user_message": user_message,
             "current_date": self.current_date
         }
+        prompt_text = EXTRACT_PROMPT.render(**input_data)
         
+        missing = [field for field, value in self.booking_info.items() if not value]
+        expecting = missing[0] if missing else None
         try:
-            extracted = await self.extract_chain.ainvoke(input_data)
+            try:
+                # Paraphrases of an earlier message in the same context reuse its result (SEMANTIC_CACHE_SIZE);
+                # otherwise concurrent sessions' extractions are joined when batching is enabled
+                extracted = await cached_extraction(
+                    user_message, f"fastapi|{self.current_date}|{expecting}|{self.booking_info.get('check_in')}",
+                    lambda: extract_with_batching(
+                        lambda: prompt_text,
+                        # The routed call's check parses the reply (get_extract_parser)
+                        lambda: routed_call("extract", lambda model: resilient_llm_call(
+                            f"extract:{model}", lambda: get_chat_model(model, temperature=0.3).ainvoke(prompt_text)
+                        ), text=user_message, accept=_parse_extraction)
+                    )
+                )
+            except Exception as e:
+                logger.warning(f"LLM extraction unavailable ({e!r}); using rule-based extraction")
+                extracted = extract_booking_details(
+                    user_message, datetime.now().date(),
+                    check_in=self.booking_info.get("check_in"), expecting=expecting
+                )
             logger.info(f"Extracted data: {extracted}")
             
             # Date validation
@@ -263,7 +382,7 @@ class HotelBookingChatbot:
         except Exception as e:
             logger.error(f"Extraction error: {str(e)}")
 
-    async def _generate_natural_response(self) -> str:
+    async def _generate_natural_response(self) -> Tuple[str, str]:
         if all(self.booking_info.values()):
             summary = f"a hotel in {self.booking_info['destination']} from {self.booking_info['check_in']} to {self.booking_info['check_out']} for {self.booking_info['guests']} guests"
             responses = [
@@ -271,8 +390,7 @@ class HotelBookingChatbot:
                 f"Let me confirm: {summary}. Does this look right? 👍",
                 f"Ready to book! 🎉 Your details: {summary}. Confirm?"
             ]
-            self.state = "awaiting_confirmation"
-            return random.choice(responses)
+            return random.choice(responses), CONFIRM_PROMPT
             
         missing = [field for field, value in self.booking_info.items() if not value]
         prompt_fields = {
@@ -289,12 +407,14 @@ class HotelBookingChatbot:
         ]
         
         fields = ", ".join([prompt_fields[field] for field in missing])
-        return random.choice(prompts).format(fields=fields)
+        return random.choice(prompts).format(fields=fields), QUESTION
 
     def reset(self):
-        self.booking_info = {k: None for k in self.booking_info}
-        self.history = []
-        self.state = "collecting_info"
+        self.booking_info.clear()
+        self.history.clear()
+        self.summary.clear()
+        self.state = COLLECTING
+        self.last_reply = STATEMENT
         logger.info("System reset")
 
 # ... rest of the code remains similar ...
\ No newline at end of file
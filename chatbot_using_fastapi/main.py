@@ -1,18 +1,70 @@
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request, HTTPException, Query
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
 from chatbot import HotelBookingChatbot
+from booking_info import get_booking, list_bookings, get_pool, close_pool, DB_POOL_MIN
+# Shared modules from the repository root (booking_info puts it on sys.path)
+from weather_utils import open_http_session, close_http_session, prime_weather_connection
+from warmup import WarmupState, WARMUP_LLM, ping_llm
+from llm_clients import get_chat_model, get_llm_breaker
+from model_router import first_model
+from session_store import (SESSION_COOKIE, get_session_store, is_valid_session_id, new_session_id,
+                           load_session, save_session, delete_session)
+import metrics
+import token_accounting
+from loop_monitor import LoopMonitor
+from admission import AdmissionController, Overloaded, ClientGone
+from datetime import date
+from typing import Optional
+import asyncio
 import os
 
+# --- Warm-up ---
+warmup_state = WarmupState()
+loop_monitor = LoopMonitor()
+
+def _build_llm_objects():
+    bot = HotelBookingChatbot()
+    bot.chain
+    get_chat_model(first_model("extract"), temperature=0.3)  # Extraction client
+
+async def _open_db_pool():
+    pool = await get_pool()
+    # Check out minsize connections at once so each has finished auth before traffic
+    conns = [await pool.acquire() for _ in range(DB_POOL_MIN)]
+    for conn in conns:
+        pool.release(conn)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warms the LLM, DB and weather connections in the background; /ready reports when done."""
+    loop_monitor.start()  # First, so blocking calls made during warm-up are measured too
+    open_http_session()
+    store = get_session_store()
+    if hasattr(store, "open_connection"):
+        await store.open_connection()
+    steps = {
+        "imports": lambda: asyncio.to_thread(_build_llm_objects),
+        "database": _open_db_pool,
+        "weather": prime_weather_connection,
+    }
+    if WARMUP_LLM:
+        steps["llm"] = ping_llm
+    warmup_task = asyncio.create_task(warmup_state.run(steps))
+    yield
+    warmup_task.cancel()
+    await close_http_session()
+    await store.close()
+    await close_pool()
+    await loop_monitor.stop()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Mount static files directory (pointing to root-level static/)
 app.mount("/static", StaticFiles(directory="../static"), name="static")
 
-# Initialize chatbot instance
-chatbot = HotelBookingChatbot()
-
 # Load index.html content (from root-level templates/)
 with open("../templates/index.html", "r") as f:
     index_html = f.read()
@@ -22,29 +74,133 @@ async def get_root():
     """Serve the main HTML page."""
     return HTMLResponse(content=index_html)
 
+@app.get("/health", response_class=JSONResponse)
+async def health():
+    """Liveness: the process is up."""
+    # Still alive while the LLM circuit is open; replies are rule-based until it closes
+    return JSONResponse(content={"status": "alive", "llm_circuit": get_llm_breaker().snapshot()})
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/ready", response_class=JSONResponse)
+async def ready():
+    """Readiness: 200 only once warm-up has completed."""
+    report = warmup_state.report()
+    return JSONResponse(content=report, status_code=200 if report["ready"] else 503)
+
+# --- Admission control ---
+chat_admission = AdmissionController()
+
 @app.post("/chat", response_class=JSONResponse)
 async def chat(request: Request):
-    """Handle chat messages from the user."""
+    """Handle chat messages; sheds load with 503 + Retry-After when the queue is full."""
+    # Read the body before queueing: while queued, is_disconnected() takes ASGI messages
+    # off the connection, and Starlette discards a body message it takes
     try:
         data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body must be JSON")
+    try:
+        async with chat_admission.slot(request.is_disconnected):
+            return await _handle_chat(request, data)
+    except Overloaded as e:
+        return JSONResponse(
+            content={"detail": e.reason, "retry_after": e.retry_after},
+            status_code=e.status_code,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except ClientGone:
+        # Nobody is listening; 499 only shows up in access logs
+        return JSONResponse(content={"detail": "Client closed request"}, status_code=499)
+
+@app.get("/chat/admission", response_class=JSONResponse)
+async def chat_admission_stats():
+    """In-flight, queued and shed counts for /chat."""
+    return JSONResponse(content=chat_admission.stats())
+
+# --- Sessions ---
+# Conversations live in the session store, so any worker can serve any turn
+def _session_id(request: Request, data: Optional[dict] = None) -> str:
+    """Session from the JSON body or the cookie; a new one if neither is usable."""
+    session_id = (data or {}).get("session_id") or request.cookies.get(SESSION_COOKIE)
+    return session_id if is_valid_session_id(session_id) else new_session_id()
+
+async def _load_chatbot(session_id: str) -> HotelBookingChatbot:
+    snapshot = await load_session(session_id)
+    return HotelBookingChatbot.from_snapshot(snapshot) if snapshot else HotelBookingChatbot()
+
+def _with_session_cookie(response: JSONResponse, session_id: str) -> JSONResponse:
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+    return response
+
+async def _handle_chat(request: Request, data: dict):
+    try:
         user_message = data.get("message")
         if not user_message:
             raise HTTPException(status_code=400, detail="Message is required")
         
         print(f"Received user message: {user_message}")
-        response = await chatbot.process_message(user_message)
+        session_id = _session_id(request, data)
+        chatbot = await _load_chatbot(session_id)
+        with token_accounting.turn(session_id):
+            response = await chatbot.process_message(user_message)
+        await save_session(session_id, chatbot.to_snapshot())
         print(f"Chat response (raw): {response}")
         
-        return JSONResponse(content={"response": response})
+        return _with_session_cookie(JSONResponse(content={"response": response, "session_id": session_id}), session_id)
     except Exception as e:
         print(f"Error processing chat message: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/debug/usage/{session_id}", response_class=JSONResponse)
+async def session_usage(session_id: str):
+    """LLM token usage and cost of one conversation, by call site and recent turn."""
+    usage = token_accounting.session_usage(session_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail="No LLM usage recorded for this session")
+    return JSONResponse(content=usage)
+
+@app.get("/debug/loop", response_class=JSONResponse)
+async def loop_report():
+    """Event-loop monitor settings and, in debug mode, the stacks of recent blocking calls."""
+    return JSONResponse(content=loop_monitor.report())
+
 @app.post("/reset", response_class=JSONResponse)
-async def reset_chat():
+async def reset_chat(request: Request):
     """Reset the chatbot conversation."""
-    reset_message = chatbot.reset()
-    return JSONResponse(content={"response": reset_message})
+    session_id = _session_id(request)
+    await delete_session(session_id)
+    reset_message = HotelBookingChatbot().reset()
+    return _with_session_cookie(JSONResponse(content={"response": reset_message}), session_id)
+
+@app.get("/bookings/{booking_id}", response_class=JSONResponse)
+async def read_booking(booking_id: str):
+    """Look up a single booking by the ID given to the customer."""
+    try:
+        booking = await get_booking(booking_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid booking ID")
+    if booking is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return JSONResponse(content=booking)
+
+@app.get("/bookings", response_class=JSONResponse)
+async def read_bookings(
+    destination: Optional[str] = None,
+    check_in_from: Optional[date] = Query(None, alias="from"),
+    check_in_to: Optional[date] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+):
+    """List bookings by destination and/or check-in date range, one keyset page at a time."""
+    try:
+        bookings, next_cursor = await list_bookings(destination, check_in_from, check_in_to, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(content={"bookings": bookings, "next_cursor": next_cursor})
 
 if __name__ == "__main__":
     import uvicorn
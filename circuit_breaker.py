@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "6"))
+BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "15"))
+BREAKER_MAX_OPEN_SECONDS = 120.0
+
+
+class CircuitOpen(Exception):
+    """The dependency is considered down; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker over the last `window` calls.
+
+    Errors and calls slower than `slow_call_seconds` both count as failures. Once at
+    least `min_calls` are recorded and the failure rate reaches `failure_rate`, the
+    circuit opens: calls fail at once with CircuitOpen. User traffic never probes an open
+    circuit. A daemon thread runs `probe` after `open_seconds` (doubling up to
+    BREAKER_MAX_OPEN_SECONDS while probes fail); while it runs the circuit is half-open,
+    still refusing calls, and it closes when a probe succeeds.
+    The thread has its own event loop, so this works for both the Flask and FastAPI apps;
+    `probe` must therefore not use clients bound to another loop (see llm_clients.ping_with_own_client).
+    """
+
+    def __init__(self, name: str, probe: Optional[Callable[[], Awaitable[object]]] = None,
+                 window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 failure_rate: float = BREAKER_FAILURE_RATE, slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS,
+                 open_seconds: float = BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.probe = probe
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True = failure
+        self._lock = threading.Lock()
+        self._prober: Optional[threading.Thread] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            failures = sum(self._outcomes)
+            return {"state": self.state, "recent_calls": len(self._outcomes), "recent_failures": failures,
+                    "open_for_s": round(time.monotonic() - self.opened_at, 1) if self.opened_at else None}
+
+    def record(self, failed: bool):
+        with self._lock:
+            if self.state != CLOSED:
+                return
+            self._outcomes.append(failed)
+            calls = len(self._outcomes)
+            if failed and calls >= self.min_calls and sum(self._outcomes) / calls >= self.failure_rate:
+                self._open()
+
+    def _open(self):
+        # Caller holds self._lock
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._outcomes.clear()
+        logger.warning(f"Circuit '{self.name}' opened; serving degraded responses")
+        if self.probe is not None and (self._prober is None or not self._prober.is_alive()):
+            self._prober = threading.Thread(target=self._probe_until_closed, name=f"{self.name}-probe", daemon=True)
+            self._prober.start()
+
+    def close(self):
+        with self._lock:
+            self.state = CLOSED
+            self.opened_at = None
+            self._outcomes.clear()
+        logger.info(f"Circuit '{self.name}' closed")
+
+    def _probe_until_closed(self):
+        delay = self.open_seconds
+        while True:
+            time.sleep(delay)
+            with self._lock:
+                self.state = HALF_OPEN
+            try:
+                asyncio.run(asyncio.wait_for(self.probe(), self.slow_call_seconds))
+            except Exception as e:
+                logger.info(f"Circuit '{self.name}' probe failed: {e}")
+                with self._lock:
+                    self.state = OPEN
+                delay = min(delay * 2, BREAKER_MAX_OPEN_SECONDS)
+                continue
+            self.close()
+            return
+
+    async def call(self, awaitable: Awaitable[T]) -> T:
+        """Awaits `awaitable` through the breaker; raises CircuitOpen without starting it when open."""
+        if self.state != CLOSED:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise CircuitOpen(f"{self.name} is unavailable")
+        started = time.perf_counter()
+        try:
+            result = await awaitable
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.record(failed=True)
+            raise
+        self.record(failed=time.perf_counter() - started > self.slow_call_seconds)
+        return result
@@ -0,0 +1,142 @@
+import re
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Table-driven conversation flow shared by both chatbots.
+#
+# Each turn is classified once into an event (from the user's message and the current
+# state only), routed through ROUTES to a handler, and the handler reports what kind of
+# reply it sent. NEXT_STATE then picks the next state from (state, reply kind). The reply
+# kind is kept with the session, so "was the last reply a question?" never needs to
+# re-read the history text.
+
+# --- States (persisted in session snapshots, so the values keep their old strings) ---
+COLLECTING = "collecting_info"
+AWAITING_CONFIRMATION = "awaiting_confirmation"
+STATES = (COLLECTING, AWAITING_CONFIRMATION)
+
+# --- Events: what the user's message is ---
+EMPTY = "empty"
+SMALL_TALK = "small_talk"
+AFFIRM = "affirm"
+DENY = "deny"
+INFO = "info"  # Anything else: booking details, or an unclear answer to the confirmation
+EVENTS = (EMPTY, SMALL_TALK, AFFIRM, DENY, INFO)
+
+# --- Reply kinds: what the assistant's reply did ---
+QUESTION = "question"          # Asked for a booking detail (or what to change)
+CONFIRM_PROMPT = "confirm"     # Summarized the booking and asked yes/no
+ERROR = "error"                # Rejected the input or reported a failure
+STATEMENT = "statement"        # Anything that doesn't expect a specific answer
+BOOKED = "booked"              # Booking saved; the conversation starts over
+REPLY_KINDS = (QUESTION, CONFIRM_PROMPT, ERROR, STATEMENT, BOOKED)
+
+# (state, event) -> handler method name on the chatbot
+ROUTES: Dict[Tuple[str, str], str] = {
+    (COLLECTING, EMPTY): "_on_empty",
+    (COLLECTING, SMALL_TALK): "_on_small_talk",
+    (COLLECTING, INFO): "_on_booking_info",
+    (AWAITING_CONFIRMATION, EMPTY): "_on_empty",
+    (AWAITING_CONFIRMATION, SMALL_TALK): "_on_small_talk",
+    (AWAITING_CONFIRMATION, AFFIRM): "_on_affirm",
+    (AWAITING_CONFIRMATION, DENY): "_on_deny",
+    (AWAITING_CONFIRMATION, INFO): "_on_unclear_confirmation",
+}
+
+# (state, reply kind) -> next state; pairs not listed keep the current state
+NEXT_STATE: Dict[Tuple[str, str], str] = {
+    (COLLECTING, CONFIRM_PROMPT): AWAITING_CONFIRMATION,
+    (COLLECTING, BOOKED): COLLECTING,
+    (AWAITING_CONFIRMATION, QUESTION): COLLECTING,  # A change request or "no rooms, pick another date"
+    (AWAITING_CONFIRMATION, BOOKED): COLLECTING,
+}
+
+SMALL_TALK_PATTERNS = {
+    "greeting": r"\b(hi|hello|hey|yo|wassup)\b",
+    "how_are_you": r"\bhow are you\b",
+    "thanks": r"\b(thank(s| you)|cheers)\b",
+    "bye": r"\b(bye|goodbye|see ya)\b",
+    "whats_up": r"\b(what'?s up|how'?s it going)\b",
+}
+# Words that can surround small talk without adding anything to answer ("thanks so much
+# for the help", "hi there"); any other word left over makes the message booking info
+SMALL_TALK_FILLER = {"a", "afternoon", "again", "all", "and", "bot", "buddy", "doing", "evening", "everything", "for",
+                     "friend", "good", "great", "guys", "help", "lot", "mate", "morning", "much", "nice", "really",
+                     "so", "the", "there", "today", "too", "very", "you", "your"}
+# One pass over the message for all topics; the named group that matched is the topic
+_SMALL_TALK = re.compile("|".join(f"(?P<{topic}>{pattern})" for topic, pattern in SMALL_TALK_PATTERNS.items()))
+_WORD = re.compile(r"[\w']+")
+_AFFIRM = re.compile(r"\b(okey|ok|yes|yeah|yep|confirm|correct|okay|proceed|finalize|do it|sure|sounds good)\b")
+_DENY = re.compile(r"\b(no|nope|change|wrong|wait|hold on|cancel|actually|different)\b")
+
+
+@dataclass(slots=True)
+class Turn:
+    """One user turn: its classification, then what the handler replied."""
+    event: str
+    text: str
+    topic: Optional[str] = None  # Small-talk topic (a SMALL_TALK_PATTERNS key)
+    replies: List[str] = field(default_factory=list)
+    reply_kind: str = STATEMENT
+    next_state: Optional[str] = None
+
+
+Handler = Callable[[Turn], Awaitable[Tuple[List[str], str]]]
+
+
+class ConversationFSM:
+    """Routes turns through the transition tables; handlers live on the chatbot.
+
+    A handler takes the Turn and returns (replies, reply kind). Classification looks at
+    the current message only and routing is two dict lookups, so a turn costs the same
+    however long the conversation is.
+    """
+
+    def __init__(self, routes: Dict[Tuple[str, str], str] = ROUTES,
+                 next_state: Dict[Tuple[str, str], str] = NEXT_STATE):
+        for state in STATES:
+            for event in (EMPTY, SMALL_TALK, INFO):  # Events every state can see
+                if (state, event) not in routes:
+                    raise ValueError(f"No route for {event!r} in state {state!r}")
+        for (state, _), target in next_state.items():
+            if state not in STATES or target not in STATES:
+                raise ValueError(f"Unknown state in transition {state!r} -> {target!r}")
+        self.routes = routes
+        self.next_state_table = next_state
+        # Yes/no matching only where the state has a route for it
+        self._expects_answer = {state for state in STATES if (state, AFFIRM) in routes}
+
+    def classify(self, state: str, text: str) -> Turn:
+        """The answer the state expects comes first: "yes thanks" at the confirmation is a yes.
+
+        Otherwise a message is small talk only if nothing but SMALL_TALK_FILLER is left
+        around the small-talk phrases, so "Hi, Paris for 2" keeps its booking details.
+        """
+        if not text:
+            return Turn(EMPTY, text)
+        lowered = text.lower()
+        if state in self._expects_answer:
+            if _AFFIRM.search(lowered):
+                return Turn(AFFIRM, text)
+            if _DENY.search(lowered):
+                return Turn(DENY, text)
+        match = _SMALL_TALK.search(lowered)
+        if match and all(word in SMALL_TALK_FILLER for word in _WORD.findall(_SMALL_TALK.sub(" ", lowered))):
+            return Turn(SMALL_TALK, text, topic=match.lastgroup)
+        return Turn(INFO, text)
+
+    def next_state(self, state: str, reply_kind: str) -> str:
+        return self.next_state_table.get((state, reply_kind), state)
+
+    async def dispatch(self, handlers: object, state: str, text: str) -> Turn:
+        """Classifies `text`, runs the routed handler on `handlers` and fills in the turn's outcome."""
+        if state not in STATES:
+            state = COLLECTING  # Snapshot from an older flow
+        turn = self.classify(state, text)
+        handler: Handler = getattr(handlers, self.routes[(state, turn.event)])
+        turn.replies, turn.reply_kind = await handler(turn)
+        turn.next_state = self.next_state(state, turn.reply_kind)
+        return turn
+
+
+CONVERSATION_FSM = ConversationFSM()
@@ -0,0 +1,166 @@
+import os
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Iterator, List, Optional, Tuple, Union
+
+# Compact per-session conversation state. With tens of thousands of live sessions the
+# per-object overhead matters: these classes have no __dict__, dates are stored as
+# `date` objects and every history entry shares one interned role string.
+
+USER = sys.intern("User")
+ASSISTANT = sys.intern("Assistant")
+ROLES = (USER, ASSISTANT)  # Index = role code in snapshots
+
+# Entries kept per conversation (a user message and a reply are two entries)
+HISTORY_CAPACITY = int(os.getenv("HISTORY_CAPACITY", "20"))
+
+FIELDS = ("destination", "check_in", "check_out", "guests")
+
+DateLike = Union[str, date, None]
+
+
+def _to_date(value: DateLike) -> Optional[date]:
+    if value is None or isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()  # Same format rule as BookingDetails
+
+
+@dataclass(slots=True)
+class BookingInfo:
+    """Booking fields collected so far, with a dict-style view for the chatbot code.
+
+    Item access keeps the old dict contract: dates read as YYYY-MM-DD strings and
+    writes accept strings or dates.
+    """
+    destination: Optional[str] = None
+    check_in: Optional[date] = None
+    check_out: Optional[date] = None
+    guests: Optional[int] = None
+
+    def __getitem__(self, field: str):
+        if field not in FIELDS:
+            raise KeyError(field)
+        value = getattr(self, field)
+        return value.isoformat() if isinstance(value, date) else value
+
+    def __setitem__(self, field: str, value):
+        if field in ("check_in", "check_out"):
+            value = _to_date(value)
+        elif field == "guests":
+            value = None if value is None else int(value)
+        elif field != "destination":
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def get(self, field: str, default=None):
+        value = self[field] if field in FIELDS else None
+        return default if value is None else value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __contains__(self, field) -> bool:
+        return field in FIELDS
+
+    def keys(self) -> Tuple[str, ...]:
+        return FIELDS
+
+    def values(self) -> List:
+        return [self[field] for field in FIELDS]
+
+    def items(self) -> List[Tuple[str, object]]:
+        return [(field, self[field]) for field in FIELDS]
+
+    def update(self, values):
+        for field, value in dict(values).items():
+            self[field] = value
+
+    def clear(self):
+        self.destination = self.check_in = self.check_out = self.guests = None
+
+    def to_list(self) -> list:
+        """Positional form for snapshots: [destination, check_in, check_out, guests]."""
+        return [self.destination, self["check_in"], self["check_out"], self.guests]
+
+    @classmethod
+    def from_list(cls, values: list) -> "BookingInfo":
+        destination, check_in, check_out, guests = values
+        return cls(destination, _to_date(check_in), _to_date(check_out), guests)
+
+
+class History:
+    """Fixed-capacity ring of (role, text) entries; the oldest entry is dropped when full.
+
+    Indexing and iteration yield "Role: text" lines (what the prompts and the old
+    list-of-strings code expect); entries() gives the raw pairs.
+    """
+    __slots__ = ("_roles", "_texts", "_start", "capacity")
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY):
+        self.capacity = capacity
+        # Parallel lists (no tuple per entry) that grow up to capacity, then wrap around
+        self._roles: List[str] = []
+        self._texts: List[str] = []
+        self._start = 0
+
+    def add(self, role: str, text: str) -> Optional[Tuple[str, str]]:
+        """Appends an entry; returns the (role, text) it pushed out, if the ring was full."""
+        role = sys.intern(role)
+        if len(self._texts) < self.capacity:
+            self._roles.append(role)
+            self._texts.append(text)
+            return None
+        i = self._start
+        evicted = (self._roles[i], self._texts[i])
+        self._roles[i] = role
+        self._texts[i] = text
+        self._start = (i + 1) % self.capacity
+        return evicted
+
+    def entries(self) -> Iterator[Tuple[str, str]]:
+        size = len(self._texts)
+        for k in range(size):
+            i = (self._start + k) % size
+            yield self._roles[i], self._texts[i]
+
+    def render(self) -> str:
+        """The conversation as prompt text, one "Role: text" line per entry."""
+        return "\n".join(f"{role}: {text}" for role, text in self.entries())
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def __bool__(self) -> bool:
+        return bool(self._texts)
+
+    def __getitem__(self, index: int) -> str:
+        size = len(self._texts)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("history index out of range")
+        i = (self._start + index) % size
+        return f"{self._roles[i]}: {self._texts[i]}"
+
+    def __iter__(self) -> Iterator[str]:
+        return (f"{role}: {text}" for role, text in self.entries())
+
+    def clear(self):
+        self._roles = []
+        self._texts = []
+        self._start = 0
+
+    def to_list(self) -> list:
+        """Snapshot form: [[role_code, text], ...], oldest first."""
+        return [[ROLES.index(role), text] for role, text in self.entries()]
+
+    @classmethod
+    def from_list(cls, entries: list, capacity: int = HISTORY_CAPACITY) -> "History":
+        history = cls(capacity)
+        for code, text in entries:
+            history.add(ROLES[code], text)
+        return history
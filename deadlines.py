@@ -0,0 +1,78 @@
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Target time for one chat turn, end to end (LLM, DB and weather calls share it)
+TURN_BUDGET_SECONDS = float(os.getenv("TURN_BUDGET_SECONDS", "8"))
+# Time kept back from every call so the turn still has room to send its fallback reply
+DEADLINE_RESERVE_SECONDS = 0.25
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The turn's time budget ran out before the call finished."""
+
+
+class Deadline:
+    """Absolute expiry time for one turn, on the monotonic clock."""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+# Set per turn; asyncio tasks and to_thread calls inherit it through the context
+_current: ContextVar[Optional[Deadline]] = ContextVar("turn_deadline", default=None)
+
+
+@contextmanager
+def turn_deadline(budget: float = TURN_BUDGET_SECONDS) -> Iterator[Deadline]:
+    """Starts a deadline for the calls made inside the block."""
+    deadline = Deadline(budget)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def time_left(cap: Optional[float] = None) -> Optional[float]:
+    """Seconds a call may take: what is left of the turn (minus the reserve), capped at `cap`.
+
+    None means no deadline and no cap.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return cap
+    left = max(0.0, deadline.remaining() - DEADLINE_RESERVE_SECONDS)
+    return left if cap is None else min(left, cap)
+
+
+async def within_deadline(awaitable: Awaitable[T], cap: Optional[float] = None) -> T:
+    """Awaits `awaitable`, cancelling it with DeadlineExceeded if the turn's budget runs out first."""
+    timeout = time_left(cap)
+    if timeout is not None and timeout <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()  # Never started; avoids the "never awaited" warning
+        raise DeadlineExceeded("Turn deadline already passed")
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError as e:
+        if isinstance(e, DeadlineExceeded):
+            raise
+        raise DeadlineExceeded(f"Call exceeded its {timeout:.2f}s budget") from e
@@ -0,0 +1,152 @@
+import asyncio
+import contextvars
+import logging
+import os
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from deadlines import TURN_BUDGET_SECONDS, time_left, turn_deadline, within_deadline
+from llm_clients import get_json_model, parse_json_content
+from retry_policy import resilient_llm_call
+from model_router import routed_call
+from prompt_builder import PromptLayout
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# How long the first extraction request waits for others to join its batch. 0 disables
+# batching: every turn sends its own request, as before. A few milliseconds is enough
+# at peak; each turn pays at most this much extra latency.
+EXTRACTION_BATCH_WINDOW_MS = float(os.getenv("EXTRACTION_BATCH_WINDOW_MS", "0"))
+EXTRACTION_BATCH_MAX = int(os.getenv("EXTRACTION_BATCH_MAX", "8"))
+
+# Static instructions first (see prompt_builder); the task count and the tasks follow
+BATCH_PROMPT = PromptLayout("extract_batch", """
+You will receive several independent extraction tasks, each from a different conversation.
+Solve each task on its own; never use information from one task in another.
+
+Return ONLY one JSON object whose keys are the task numbers ("1", "2", ...) and whose values
+are the JSON object that task asks for, for example {"1": {...}, "2": {...}}.
+""", [("Number of tasks", "count"), ("Tasks", "tasks")])
+
+_SOLO = object()  # Tells the caller to send its own request
+
+batch_sizes = metrics.histogram("extraction_batch_size", "Extraction requests sent together in one LLM call",
+                                buckets=(1, 2, 4, 8, 16, 32))
+batch_fallbacks = metrics.counter("extraction_batch_fallbacks_total",
+                                  "Batched extraction requests answered by their own call instead")
+
+PendingItem = Tuple[str, Optional[float], asyncio.Future]
+
+
+def _parse_batch_answer(message) -> Dict:
+    answer = parse_json_content(message)
+    if not isinstance(answer, (dict, list)):
+        raise ValueError(f"Batch answer is not an object: {answer!r}")
+    return answer
+
+
+class ExtractionBatcher:
+    """Collects extraction prompts for one event loop and sends them as one LLM request.
+
+    Batches close after `window_ms` or at `max_size` prompts. A batch of one, and any
+    task the combined answer is missing, is handed back so the caller makes its usual
+    single request.
+    """
+
+    def __init__(self, window_ms: float = EXTRACTION_BATCH_WINDOW_MS, max_size: int = EXTRACTION_BATCH_MAX):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._pending: List[PendingItem] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, prompt_text: str) -> Any:
+        """Queues one rendered extraction prompt; returns its parsed dict or _SOLO."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((prompt_text, time_left(), future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            # Empty context: the batch must not inherit the first caller's deadline
+            self._timer = loop.call_later(self.window, self._flush, context=contextvars.Context())
+        # shield: one caller running out of time must not cancel the whole batch
+        return await within_deadline(asyncio.shield(future))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        batch_sizes.observe(len(batch))
+        if len(batch) == 1:
+            batch[0][2].set_result(_SOLO)
+            return
+        asyncio.get_running_loop().create_task(self._send(batch), context=contextvars.Context())
+
+    async def _send(self, batch: List[PendingItem]):
+        tasks = "\n\n".join(f"### Task {i}\n{prompt}" for i, (prompt, _, _) in enumerate(batch, start=1))
+        batch_prompt = BATCH_PROMPT.render(count=len(batch), tasks=tasks)
+        # The batch gets the longest remaining budget among its members
+        budgets = [left for _, left, _ in batch if left is not None]
+        try:
+            with turn_deadline(max(budgets) if budgets else TURN_BUDGET_SECONDS):
+                answer = await routed_call("extract_batch", lambda model: resilient_llm_call(
+                    f"extract_batch:{model}", lambda: get_json_model(model, temperature=0.3).ainvoke(batch_prompt)
+                ), accept=_parse_batch_answer)
+        except Exception as e:
+            logger.warning(f"Batched extraction of {len(batch)} prompts failed: {e!r}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for i, (_, _, future) in enumerate(batch, start=1):
+            if future.done():
+                continue
+            result = None
+            if isinstance(answer, dict):
+                result = answer.get(str(i))
+            elif isinstance(answer, list) and i <= len(answer):
+                result = answer[i - 1]
+            if isinstance(result, dict):
+                future.set_result(result)
+            else:
+                batch_fallbacks.inc()
+                future.set_result(_SOLO)
+
+
+# One batcher per event loop: futures can't cross loops. Flask's per-request loops
+# never see a second request, so batching only takes effect under the FastAPI server.
+_batchers: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+async def extract_with_batching(render_prompt: Callable[[], str], single_call: Callable[[], Awaitable[Any]],
+                                accept: Optional[Callable[[Dict], Any]] = None) -> Any:
+    """Runs one extraction, batched with concurrent ones when EXTRACTION_BATCH_WINDOW_MS > 0.
+
+    `render_prompt` gives this request's full extraction prompt as text and
+    `single_call` makes the usual single request; it is used when batching is off,
+    when the batch held only this request, or when the batch answer skipped it.
+    `accept` checks this request's part of a batch answer, as the single call's own
+    check does for its reply; a part it rejects is also retried as a single call.
+    """
+    if EXTRACTION_BATCH_WINDOW_MS <= 0:
+        return await single_call()
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = ExtractionBatcher()
+    result = await batcher.submit(render_prompt())
+    if result is not _SOLO and accept is not None:
+        try:
+            return accept(result)
+        except Exception as e:
+            logger.info(f"Batched extraction answer rejected ({e!r}); sending it on its own")
+            batch_fallbacks.inc()
+            result = _SOLO
+    if result is _SOLO:
+        return await single_call()
+    return result
@@ -0,0 +1,106 @@
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+    from langchain_groq import ChatGroq
+
+load_dotenv()
+
+DEFAULT_MODEL = "gemma2-9b-it"
+
+# Process-wide registry: one LLM client per configuration and one compiled object per
+# prompt/chain name, shared by every chatbot session (sessions only hold their own state).
+# langchain is imported inside the getters, so importing this module stays cheap.
+_clients: Dict[Tuple[str, float, Optional[int]], "ChatGroq"] = {}
+_shared: Dict[str, Any] = {}
+_lock = threading.RLock()  # Factories may fetch other shared objects
+
+
+def get_chat_model(model_name: str = DEFAULT_MODEL, temperature: float = 0.3,
+                   max_tokens: Optional[int] = None) -> "ChatGroq":
+    """Returns the shared ChatGroq client for this configuration, creating it on first use."""
+    key = (model_name, temperature, max_tokens)
+    client = _clients.get(key)
+    if client is None:
+        from langchain_groq import ChatGroq
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = ChatGroq(
+                    groq_api_key=os.getenv("GROQ_API_KEY"),
+                    model_name=model_name,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+                _clients[key] = client
+    return client
+
+
+def shared(name: str, factory: Callable[[], Any]) -> Any:
+    """Returns the process-wide object registered under `name`, building it once with `factory`."""
+    obj = _shared.get(name)
+    if obj is None:
+        with _lock:
+            obj = _shared.get(name)
+            if obj is None:
+                obj = _shared[name] = factory()
+    return obj
+
+
+def get_json_model(model_name: str = DEFAULT_MODEL, temperature: float = 0.3):
+    """The shared client bound to the provider's JSON mode: every reply is one JSON object."""
+    return shared(f"json_model:{model_name}:{temperature}",
+                  lambda: get_chat_model(model_name, temperature).bind(response_format={"type": "json_object"}))
+
+
+def parse_json_content(message) -> Any:
+    """Parses a JSON-mode reply with orjson (no fence stripping or partial-JSON recovery)."""
+    import orjson
+    return orjson.loads(message.content)
+
+
+def get_chat_prompt(name: str, template: str) -> "ChatPromptTemplate":
+    """Compiled ChatPromptTemplate, parsed once per process."""
+    from langchain_core.prompts import ChatPromptTemplate
+    return shared(f"chat_prompt:{name}", lambda: ChatPromptTemplate.from_template(template))
+
+
+def get_text_prompt(name: str, template: str, input_variables: List[str]) -> "PromptTemplate":
+    """Compiled PromptTemplate, parsed once per process."""
+    from langchain_core.prompts import PromptTemplate
+    return shared(f"text_prompt:{name}", lambda: PromptTemplate(input_variables=input_variables, template=template))
+
+
+# --- Circuit breaker ---
+async def ping_with_own_client():
+    """A one-token request through a short-lived client, for loops other than the serving one.
+
+    The shared clients' async connection pools belong to the serving loop; connections
+    opened on a loop that closes afterwards (the breaker's probe thread, Flask's warm-up
+    thread) would be left dead in them.
+    """
+    import httpx
+    from langchain_groq import ChatGroq
+    from model_router import first_model
+    async with httpx.AsyncClient() as http_client:
+        probe_model = ChatGroq(groq_api_key=os.getenv("GROQ_API_KEY"), model_name=first_model("extract"),
+                               max_tokens=1, http_async_client=http_client)
+        await probe_model.ainvoke("Reply with OK.")
+
+
+def _build_breaker():
+    from circuit_breaker import CircuitBreaker
+    return CircuitBreaker("llm", probe=ping_with_own_client)
+
+
+def get_llm_breaker():
+    """The process-wide breaker shared by every LLM call site."""
+    return shared("llm_breaker", _build_breaker)
+
+
+async def call_llm(awaitable):
+    """Runs one LLM request through the breaker; raises circuit_breaker.CircuitOpen while it is open."""
+    return await get_llm_breaker().call(awaitable)
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Event-loop lag: a ticker coroutine sleeps for LOOP_MONITOR_INTERVAL_MS and measures how
+# late it wakes up. Anything that runs on the loop without awaiting (a synchronous DB
+# call, a big JSON dump, CPU-bound parsing) delays every other request by that much and
+# shows up here. In debug mode a watchdog thread also notices when the ticker is overdue
+# by LOOP_BLOCK_THRESHOLD_MS and logs the loop thread's stack while it is still blocked,
+# which names the blocking call. Only for long-lived loops (the FastAPI server); Flask's
+# per-request loops end before a tick.
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+# Stack capture: off by default (a thread waking every threshold/2, plus stack formatting)
+LOOP_MONITOR_DEBUG = os.getenv("LOOP_MONITOR_DEBUG", "0") == "1"
+LOOP_BLOCK_REPORTS = 20  # Most recent blocking reports kept for /debug/loop
+
+loop_lag = metrics.histogram("event_loop_lag_seconds", "How late the event loop ran a scheduled tick",
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+loop_lag_last = metrics.gauge("event_loop_lag_last_seconds", "Lag of the most recent event loop tick")
+loop_blocks = metrics.counter("event_loop_blocked_total", "Ticks delayed past LOOP_BLOCK_THRESHOLD_MS")
+
+
+class LoopMonitor:
+    """Measures the lag of one event loop; with `debug`, captures the stacks of long blocks."""
+
+    def __init__(self, interval_ms: float = LOOP_MONITOR_INTERVAL_MS, threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS,
+                 debug: bool = LOOP_MONITOR_DEBUG):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.debug = debug
+        self.reports: "deque[Dict]" = deque(maxlen=LOOP_BLOCK_REPORTS)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._ticker: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._beat = time.monotonic()  # Last time the ticker ran; read by the watchdog thread
+
+    def start(self):
+        """Starts monitoring the running loop (call from inside it)."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stopped.clear()
+        self._beat = time.monotonic()
+        self._ticker = self._loop.create_task(self._tick(), name="loop-monitor")
+        self.debug = self.debug or self._loop.get_debug()  # Also on under PYTHONASYNCIODEBUG=1
+        if self.debug:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-monitor-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._ticker is not None:
+            self._ticker.cancel()
+            try:
+                await self._ticker
+            except asyncio.CancelledError:
+                pass
+            self._ticker = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join, self.threshold * 2)
+            self._watchdog = None
+
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._beat = time.monotonic()
+            loop_lag.observe(lag)
+            loop_lag_last.set(lag)
+            if lag >= self.threshold:
+                loop_blocks.inc()
+                if not self.debug:
+                    logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms (LOOP_MONITOR_DEBUG=1 for stacks)")
+
+    def _watch(self):
+        # Runs in its own thread, so it sees the loop while the loop itself can't run
+        reported_beat = None
+        while not self._stopped.wait(self.threshold / 2):
+            beat = self._beat
+            overdue = time.monotonic() - beat - self.interval
+            if overdue < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat  # One report per stall
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            self._report(overdue, traceback.format_stack(frame))
+
+    def _report(self, overdue: float, stack: List[str]):
+        task = None
+        try:
+            current = asyncio.current_task(self._loop)  # Read from another thread: best effort
+            task = current.get_name() if current is not None else None
+        except RuntimeError:
+            pass
+        self.reports.append({
+            "at": time.time(),
+            "blocked_ms": round(overdue * 1000, 1),
+            "task": task,
+            "stack": [line.rstrip() for line in stack],
+        })
+        logger.warning(f"Event loop blocked for over {overdue * 1000:.0f} ms in task {task!r}:\n{''.join(stack)}")
+
+    def report(self) -> Dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "debug": self.debug,
+            "blocks": list(self.reports),
+        }
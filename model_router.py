@@ -0,0 +1,99 @@
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from llm_clients import DEFAULT_MODEL
+import metrics
+import token_accounting
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Model tiers, cheapest and fastest first. Each call site has a ladder of tiers: it
+# starts on the first one (one step up for long inputs) and moves up a tier when the
+# answer fails its check, e.g. invalid JSON or a field name outside the known set.
+TIERS: Dict[str, str] = {
+    "fast": os.getenv("LLM_MODEL_FAST", "llama-3.1-8b-instant"),
+    "standard": os.getenv("LLM_MODEL_STANDARD", DEFAULT_MODEL),
+    "large": os.getenv("LLM_MODEL_LARGE", "llama-3.3-70b-versatile"),
+}
+
+# Default ladders; LLM_ROUTE_<TASK> overrides one, e.g. LLM_ROUTE_EXTRACT=standard,large
+DEFAULT_ROUTES: Dict[str, Tuple[str, ...]] = {
+    "extract": ("fast", "standard"),
+    "extract_batch": ("standard", "large"),  # Several conversations in one prompt
+    "change_field": ("fast", "standard"),
+    "weather_tip": ("fast",),
+}
+
+# Inputs longer than this start one tier up the ladder
+SHORT_INPUT_CHARS = int(os.getenv("LLM_ROUTE_SHORT_INPUT_CHARS", "80"))
+
+# USD per million (input, output) tokens, from the provider's price list
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "gemma2-9b-it": (0.20, 0.20),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+}
+
+route_calls = metrics.counter("llm_route_calls_total", "Routed LLM calls by task, tier and outcome (ok, rejected)")
+route_latency = metrics.histogram("llm_route_seconds", "Routed LLM call latency (retries included) by task and tier")
+route_escalations = metrics.counter("llm_route_escalations_total", "Answers rejected by their check, moved up a tier")
+route_cost = metrics.counter("llm_route_cost_usd_total", "Estimated LLM spend by task and tier, from reported token usage")
+
+
+class RejectedAnswer(ValueError):
+    """The answer of every tier on the ladder failed its check."""
+
+
+def ladder(task: str) -> Tuple[str, ...]:
+    override = os.getenv(f"LLM_ROUTE_{task.upper()}")
+    tiers = tuple(t.strip() for t in override.split(",") if t.strip()) if override else DEFAULT_ROUTES.get(task, ("standard",))
+    unknown = [t for t in tiers if t not in TIERS]
+    if unknown:
+        raise ValueError(f"Unknown model tier(s) {unknown} for task '{task}' (use {', '.join(TIERS)})")
+    return tiers
+
+
+def first_model(task: str) -> str:
+    """Model of the first tier of the task's ladder (what warm-up should prepare)."""
+    return TIERS[ladder(task)[0]]
+
+
+async def routed_call(task: str, make_call: Callable[[str], Awaitable[Any]], text: Optional[str] = None,
+                      accept: Optional[Callable[[Any], T]] = None) -> T:
+    """Runs one LLM task on the cheapest suitable model, escalating while the answer is rejected.
+
+    `make_call(model_name)` starts the request on the given model. `accept` turns the
+    raw answer into the result and raises to reject it; the last tier's rejection is
+    raised as RejectedAnswer. Request errors (circuit open, deadline, exhausted
+    retries) propagate as they are: a bigger model wouldn't fix those.
+    """
+    tiers = ladder(task)
+    start = 1 if text is not None and len(text) > SHORT_INPUT_CHARS and len(tiers) > 1 else 0
+    for position in range(start, len(tiers)):
+        tier = tiers[position]
+        model = TIERS[tier]
+        started = time.perf_counter()
+        result = await make_call(model)
+        route_latency.observe(time.perf_counter() - started, task=task, tier=tier)
+        # Tokens go to the session/turn in context; the cost also to the route
+        cost = token_accounting.record(task, model, result, MODEL_PRICES.get(model))
+        if cost:
+            route_cost.inc(cost, task=task, tier=tier)
+        if accept is None:
+            route_calls.inc(task=task, tier=tier, outcome="ok")
+            return result
+        try:
+            accepted = accept(result)
+        except Exception as e:
+            route_calls.inc(task=task, tier=tier, outcome="rejected")
+            if position == len(tiers) - 1:
+                raise RejectedAnswer(f"{task}: answer from {model} rejected: {e!r}") from e
+            route_escalations.inc(task=task, from_tier=tier)
+            logger.info(f"Escalating '{task}' from {tier} after rejected answer: {e!r}")
+            continue
+        route_calls.inc(task=task, tier=tier, outcome="ok")
+        return accepted
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Sequence, Tuple
+
+import metrics
+import token_accounting
+
+# Last renders kept to measure reuse, one per (prompt, session); least recent dropped first
+PROMPT_REUSE_RENDERS = int(os.getenv("PROMPT_REUSE_RENDERS", "1000"))
+
+_PLACEHOLDER = re.compile(r"\{[A-Za-z_][A-Za-z0-9_]*\}")
+
+# Reuse: the longest common prefix of a render with the previous render of the same prompt
+# in the same session (from token_accounting's turn context), as a share of the render.
+# That is the most a provider prefix cache can serve; llm_cached_prompt_tokens_total
+# (token_accounting) is what it actually served.
+prefix_reuse = metrics.histogram("prompt_prefix_reuse",
+                                 "Share of each render identical to the session's previous render of the prompt, by prompt",
+                                 buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0))
+prefix_chars = metrics.gauge("prompt_prefix_chars", "Length of each prompt's static prefix, by prompt and prefix hash")
+
+Section = Tuple[str, str]  # (label shown in the prompt, name of the value)
+
+# Prompts are laid out as a static instruction prefix followed by the variable sections.
+# Providers that cache prompt prefixes (KV/prefix caching) can only reuse the part of a
+# prompt that is byte-identical to an earlier one, so nothing that changes per request
+# (today's date, the history, the message) may appear before or inside the instructions.
+# Variable sections are ordered from the slowest changing to the fastest changing: the
+# date changes once a day, the history grows by appending until its ring is full (then
+# the window slides and the summary changes every turn), the message changes every turn.
+
+
+class PromptLayout:
+    """A prompt as a static instruction prefix plus labelled variable sections, in that order.
+
+    The prefix is never formatted, so it is byte-identical in every render; a leftover
+    `{placeholder}` in it is a bug (it would either leak literally or, if someone
+    formats it, make the prefix vary) and is rejected here.
+    """
+
+    def __init__(self, name: str, prefix: str, sections: Sequence[Section]):
+        leftover = _PLACEHOLDER.findall(prefix)
+        if leftover:
+            raise ValueError(f"Prompt '{name}' has placeholders in its static prefix: {leftover}")
+        self.name = name
+        self.prefix = prefix.strip() + "\n\n"
+        self.sections = tuple(sections)
+        self.prefix_hash = hashlib.sha256(self.prefix.encode()).hexdigest()[:12]
+        prefix_chars.set(len(self.prefix), prompt=name, hash=self.prefix_hash)
+
+    @property
+    def input_variables(self) -> Tuple[str, ...]:
+        return tuple(key for _, key in self.sections)
+
+    def render(self, **values) -> str:
+        """Prefix + one "Label: value" block per section; every section's value is required."""
+        missing = [key for key in self.input_variables if key not in values]
+        if missing:
+            raise KeyError(f"Prompt '{self.name}' is missing {missing}")
+        body = "\n\n".join(_block(label, values[key]) for label, key in self.sections)
+        text = self.prefix + body
+        session_id = token_accounting.current_session()
+        if session_id is not None:
+            previous = _last_renders.swap((self.name, session_id), text)
+            if previous is not None:
+                prefix_reuse.observe(_common_prefix_length(previous, text) / len(text), prompt=self.name)
+        return text
+
+    def as_template(self) -> str:
+        """The layout as a LangChain template string (prefix braces escaped), for prompt | model chains."""
+        escaped = self.prefix.replace("{", "{{").replace("}", "}}")
+        return escaped + "\n\n".join(_block(label, "{" + key + "}") for label, key in self.sections)
+
+
+class _LastRenders:
+    """Most recent render per (prompt, session), LRU-bounded."""
+
+    def __init__(self, max_entries: int = PROMPT_REUSE_RENDERS):
+        self.max_entries = max_entries
+        self._renders: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()  # Flask serves requests from several threads
+
+    def swap(self, key: Tuple[str, str], text: str):
+        """Stores `text` under `key`; returns the render it replaces, if any."""
+        with self._lock:
+            previous = self._renders.pop(key, None)
+            self._renders[key] = text
+            while len(self._renders) > self.max_entries:
+                self._renders.popitem(last=False)
+            return previous
+
+
+_last_renders = _LastRenders()
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    return len(os.path.commonprefix([a, b]))
+
+
+def _block(label: str, value) -> str:
+    value = str(value)
+    # Multi-line values (the history) start on their own line
+    return f"{label}:\n{value}" if "\n" in value else f"{label}: {value}"
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from circuit_breaker import CircuitOpen
+from deadlines import DeadlineExceeded, time_left, within_deadline
+from llm_clients import call_llm
+import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.2"))
+LLM_RETRY_MAX_WAIT_SECONDS = float(os.getenv("LLM_RETRY_MAX_WAIT_SECONDS", "2"))
+# Don't start another attempt with less than this left of the turn budget
+LLM_RETRY_MIN_BUDGET_SECONDS = float(os.getenv("LLM_RETRY_MIN_BUDGET_SECONDS", "0.5"))
+
+# Hedging sends a second request once the first is slower than the call site's p95.
+# It trades a few percent more LLM calls for a shorter tail, so it is opt-in.
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0") == "1"
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 200
+
+# Errors from the Groq SDK / httpx / aiohttp that are worth retrying, matched by name
+# so this module doesn't import the SDKs
+TRANSIENT_ERROR_NAMES = {
+    "RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError",
+    "ServiceUnavailableError", "ConnectError", "ReadTimeout", "RemoteProtocolError",
+    "ServerDisconnectedError", "ClientConnectionError",
+}
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+llm_calls = metrics.histogram("llm_call_seconds", "LLM request latency by call site")
+llm_retries = metrics.counter("llm_retries_total", "LLM requests retried after a transient error")
+llm_hedges = metrics.counter("llm_hedges_total", "Hedge requests issued because the first was slower than p95")
+llm_hedge_wins = metrics.counter("llm_hedge_wins_total", "Hedge requests that answered before the original")
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for rate limits, 5xx responses, connection drops and per-request timeouts."""
+    if isinstance(error, (CircuitOpen, DeadlineExceeded)):
+        return False  # Retrying can't help: the breaker is open or the turn is out of time
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if getattr(error, "status_code", None) in TRANSIENT_STATUS_CODES:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class LatencyTracker:
+    """Recent successful latencies of one call site, for the hedging threshold."""
+
+    def __init__(self, size: int = LATENCY_SAMPLES):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_latencies: Dict[str, LatencyTracker] = {}
+
+
+def _tracker(call_site: str) -> LatencyTracker:
+    tracker = _latencies.get(call_site)
+    if tracker is None:
+        tracker = _latencies.setdefault(call_site, LatencyTracker())
+    return tracker
+
+
+async def _timed(call_site: str, make_call: Callable[[], Awaitable[T]]) -> T:
+    started = time.perf_counter()
+    result = await make_call()
+    elapsed = time.perf_counter() - started
+    llm_calls.observe(elapsed, call_site=call_site)
+    _tracker(call_site).record(elapsed)
+    return result
+
+
+async def _hedged(call_site: str, make_call: Callable[[], Awaitable[T]]) -> T:
+    """Runs make_call; if it outlives the p95 and budget remains, races a second copy against it."""
+    threshold = _tracker(call_site).percentile(HEDGE_PERCENTILE)
+    left = time_left()
+    if threshold is None or (left is not None and left <= threshold + LLM_RETRY_MIN_BUDGET_SECONDS):
+        return await _timed(call_site, make_call)
+
+    primary = asyncio.ensure_future(_timed(call_site, make_call))
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=threshold)
+        if not done:
+            llm_hedges.inc(call_site=call_site)
+            tasks.add(asyncio.ensure_future(_timed(call_site, make_call)))
+        while True:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                tasks.discard(task)
+                if task.exception() is None or not tasks:
+                    if task is not primary and task.exception() is None:
+                        llm_hedge_wins.inc(call_site=call_site)
+                    return task.result()
+            # The finished request failed; keep waiting for the other one
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def resilient_llm_call(call_site: str, make_call: Callable[[], Awaitable[T]],
+                             hedge: bool = LLM_HEDGING) -> T:
+    """One LLM request with the full policy: breaker, turn deadline, retries and optional hedging.
+
+    `make_call` must start a fresh request each time it is called. Transient errors are
+    retried with jittered exponential backoff (tenacity) for up to LLM_RETRY_ATTEMPTS
+    attempts, stopping early when the turn budget can't cover another attempt.
+    """
+    from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+    def out_of_budget(retry_state) -> bool:
+        left = time_left()
+        return left is not None and left < LLM_RETRY_MIN_BUDGET_SECONDS
+
+    def before_sleep(retry_state):
+        llm_retries.inc(call_site=call_site)
+        logger.warning(f"Retrying LLM call '{call_site}' after {retry_state.outcome.exception()!r} "
+                       f"(attempt {retry_state.attempt_number})")
+
+    attempt_call = (lambda: _hedged(call_site, make_call)) if hedge else (lambda: _timed(call_site, make_call))
+    async for attempt in AsyncRetrying(
+        retry=retry_if_exception(is_transient),
+        stop=stop_after_attempt(LLM_RETRY_ATTEMPTS) | out_of_budget,
+        wait=wait_random_exponential(multiplier=LLM_RETRY_BASE_SECONDS, max=LLM_RETRY_MAX_WAIT_SECONDS),
+        before_sleep=before_sleep,
+        reraise=True,
+    ):
+        with attempt:
+            result = await call_llm(within_deadline(attempt_call()))
+    return result
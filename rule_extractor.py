@@ -0,0 +1,174 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+# Deterministic stand-ins for the LLM extraction and change-analysis calls, used while
+# the LLM circuit is open (or a call fails). They only understand common phrasings,
+# but they answer instantly and never fail.
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august",
+          "september", "october", "november", "december"]
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                "eight": 8, "nine": 9, "ten": 10}
+
+_NUM = r"(\d{1,2}|one|two|three|four|five|six|seven|eight|nine|ten)"
+_ISO_DATE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+_MONTH_DAY = re.compile(r"\b(" + "|".join(m[:3] for m in MONTHS) + r")[a-z]*\.?\s+(\d{1,2})(?:st|nd|rd|th)?\b")
+_DAY_MONTH = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?(" + "|".join(m[:3] for m in MONTHS) + r")[a-z]*\b")
+_RELATIVE = re.compile(r"\b(day after tomorrow|today|tonight|tomorrow)\b")
+_IN_DAYS = re.compile(r"\bin\s+" + _NUM + r"\s+days?\b")
+_WEEKDAY = re.compile(r"\b(next |this |on )?(" + "|".join(WEEKDAYS) + r")\b")
+_NIGHTS = re.compile(r"\b" + _NUM + r"\s+(nights?|days?)\b|\b(a|one)\s+(week)\b|\b" + _NUM + r"\s+weeks?\b")
+_GUESTS = re.compile(r"\b" + _NUM + r"\s+(guests?|people|persons?|adults?|travell?ers?|of us)\b|\bwe\s+are\s+" + _NUM + r"\b"
+                     r"|\bfor\s+" + _NUM + r"\b(?!\s+(nights?|days?|weeks?))")
+# Children are counted on top of the adults: "2 adults and a kid" is 3 guests
+_CHILDREN = re.compile(r"\b(\d{1,2}|one|two|three|four|five|six|seven|eight|nine|ten|a|an)\s+(?:little\s+|young\s+)?"
+                       r"(kids?|children|child|bab(?:y|ies)|infants?|toddlers?|teens?|teenagers?)\b")
+_SOLO = re.compile(r"\b(just me|only me|myself|alone|solo)\b")
+_COUPLE = re.compile(r"\b(my (wife|husband|partner|girlfriend|boyfriend)|the two of us|a couple)\b")
+_DESTINATION = re.compile(r"\b(?:to|in|at|visit(?:ing)?|destination(?: is)?)\s+([A-Z][\w'\-]+(?:\s+[A-Z][\w'\-]+){0,2})")
+_BARE_NUMBER = re.compile(r"^\s*" + _NUM + r"\s*$")
+_NOT_AN_ANSWER = re.compile(r"^(yes|yeah|no|nope|ok|okay|sure|hi|hello|hey|thanks?|thank you|what|why|how)\b", re.IGNORECASE)
+_NOT_PLACES = {"The", "A", "My", "Our", "March", "May", "June", "July", "August"} | {d.capitalize() for d in WEEKDAYS}
+
+
+def _to_int(token: str) -> Optional[int]:
+    token = token.lower()
+    if token.isdigit():
+        return int(token)
+    return NUMBER_WORDS.get(token)
+
+
+def _next_date(today: date, month: int, day: int) -> Optional[date]:
+    """The next occurrence of month/day on or after today."""
+    for year in (today.year, today.year + 1):
+        try:
+            candidate = date(year, month, day)
+        except ValueError:
+            return None
+        if candidate >= today:
+            return candidate
+    return None
+
+
+def _find_dates(text: str, today: date) -> list:
+    """All dates mentioned in `text`, in order of appearance."""
+    found = []
+    for m in _ISO_DATE.finditer(text):
+        try:
+            found.append((m.span(), datetime.strptime(m.group(1), "%Y-%m-%d").date()))
+        except ValueError:
+            pass
+    month_prefixes = [m[:3] for m in MONTHS]
+    for m in _MONTH_DAY.finditer(text):
+        found.append((m.span(), _next_date(today, month_prefixes.index(m.group(1)) + 1, int(m.group(2)))))
+    for m in _DAY_MONTH.finditer(text):
+        found.append((m.span(), _next_date(today, month_prefixes.index(m.group(2)) + 1, int(m.group(1)))))
+    for m in _RELATIVE.finditer(text):
+        offset = {"today": 0, "tonight": 0, "tomorrow": 1, "day after tomorrow": 2}[m.group(1)]
+        found.append((m.span(), today + timedelta(days=offset)))
+    for m in _IN_DAYS.finditer(text):
+        found.append((m.span(), today + timedelta(days=_to_int(m.group(1)) or 0)))
+    for m in _WEEKDAY.finditer(text):
+        ahead = (WEEKDAYS.index(m.group(2)) - today.weekday()) % 7 or 7
+        found.append((m.span(), today + timedelta(days=ahead)))
+    # Patterns can overlap ("march 5 ... 5 march"); keep the first match of each span
+    dates = []
+    last_end = -1
+    for (start, end), d in sorted(found, key=lambda item: item[0]):
+        if start >= last_end and d is not None:
+            dates.append(d)
+            last_end = end
+    return dates
+
+
+def _find_nights(text: str) -> Optional[int]:
+    # "in 3 days" is the check-in offset (see _IN_DAYS), not the length of the stay
+    offsets = [m.span() for m in _IN_DAYS.finditer(text)]
+    m = next((m for m in _NIGHTS.finditer(text)
+              if not any(start <= m.start() < end for start, end in offsets)), None)
+    if not m:
+        return None
+    if m.group(1):
+        return _to_int(m.group(1))
+    if m.group(4):
+        return 7
+    return (_to_int(m.group(5)) or 0) * 7 or None
+
+
+def _find_guests(text: str, expecting: Optional[str]) -> Optional[int]:
+    children = [(m.span(), 1 if m.group(1) in ("a", "an") else _to_int(m.group(1))) for m in _CHILDREN.finditer(text)]
+    adults = None
+    m = _GUESTS.search(text)
+    if m:
+        adults = _to_int(next(g for g in (m.group(1), m.group(3), m.group(4)) if g))
+        # "for 3 kids": the same words are not counted twice
+        children = [(span, count) for span, count in children if span[1] <= m.start() or span[0] >= m.end()]
+    elif _SOLO.search(text):
+        adults = 1
+    elif _COUPLE.search(text):
+        adults = 2
+    elif expecting == "guests" and not children:
+        m = _BARE_NUMBER.match(text)
+        if m:
+            adults = _to_int(m.group(1))
+    kids = sum(count or 0 for _, count in children)
+    if adults is None:
+        return kids or None
+    return adults + kids
+
+
+def _find_destination(message: str, expecting: Optional[str]) -> Optional[str]:
+    for m in _DESTINATION.finditer(message):
+        words = [w for w in m.group(1).split() if w not in _NOT_PLACES]
+        if words:
+            return " ".join(words)
+    if expecting == "destination":
+        # A short answer to "Where would you like to stay?" is the city itself
+        candidate = message.strip().strip(".!?")
+        if 0 < len(candidate.split()) <= 3 and not re.search(r"\d", candidate) and not _NOT_AN_ANSWER.match(candidate):
+            return candidate.title()
+    return None
+
+
+def extract_booking_details(message: str, today: date, check_in: Optional[str] = None,
+                            expecting: Optional[str] = None) -> Dict[str, Optional[object]]:
+    """Rule-based version of the extraction chain; returns the same keys, None when not found.
+
+    `check_in` is the already-collected check-in (for "3 nights"), `expecting` the field
+    the bot just asked for, which lets bare answers like "Paris" or "2" be understood.
+    """
+    text = message.lower()
+    result: Dict[str, Optional[object]] = {"destination": None, "check_in": None, "check_out": None, "guests": None}
+    dates = _find_dates(text, today)
+    if len(dates) >= 2:
+        result["check_in"], result["check_out"] = dates[0].isoformat(), dates[1].isoformat()
+    elif len(dates) == 1:
+        field = "check_out" if expecting == "check_out" or (check_in and expecting != "check_in") else "check_in"
+        result[field] = dates[0].isoformat()
+
+    nights = _find_nights(text)
+    start = result["check_in"] or check_in
+    if nights and start and not result["check_out"]:
+        result["check_out"] = (datetime.strptime(start, "%Y-%m-%d").date() + timedelta(days=nights)).isoformat()
+
+    result["guests"] = _find_guests(text, expecting)
+    result["destination"] = _find_destination(message, expecting)
+    return result
+
+
+def detect_change_field(message: str) -> str:
+    """Rule-based version of the change analysis: which booking field the user wants to change."""
+    text = message.lower()
+    if re.search(r"\b(check[- ]?in|arriv\w*|start)\b", text):
+        return "check_in"
+    if re.search(r"\b(check[- ]?out|depart\w*|leav\w*|end)\b", text):
+        return "check_out"
+    if re.search(r"\b(dates?|days?|nights?|when)\b", text):
+        return "dates"
+    if re.search(r"\b(guests?|people|persons?|adults?|travell?ers?)\b", text):
+        return "guests"
+    if re.search(r"\b(destination|city|place|location|hotel|where)\b", text) or _DESTINATION.search(message):
+        return "destination"
+    return "unknown"
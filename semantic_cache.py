@@ -0,0 +1,167 @@
+import logging
+import os
+import random
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from lazy_imports import lazy_import
+from llm_clients import shared
+import metrics
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+# Reuses a previous extraction result when a new message is a close paraphrase of one
+# already answered ("2 people" / "2 people please" / "two persons"). Opt-in: a wrong
+# hit puts wrong details into the booking, so size 0 (the default) turns it off.
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "0"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+# Share of hits that still call the LLM and compare, to measure false hits
+SEMANTIC_CACHE_AUDIT_RATE = float(os.getenv("SEMANTIC_CACHE_AUDIT_RATE", "0.05"))
+SEMANTIC_CACHE_MAX_CHARS = 80  # Longer messages lean on the conversation, not just their wording
+VECTOR_DIM = 512
+NGRAM_SIZES = (2, 3, 4)
+
+# Normalization maps paraphrases onto the same words before vectorizing: number words
+# become digits, guest nouns become "people", and filler words are dropped so the
+# similarity is decided by the words that carry the booking details.
+CANONICAL = {"one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7",
+             "eight": "8", "nine": "9", "ten": "10", "a couple": "2", "couple": "2", "single": "1",
+             "of us": "people", "ppl": "people", "persons": "people", "person": "people", "guests": "people",
+             "guest": "people", "adults": "people", "travelers": "people", "travellers": "people",
+             "nite": "night", "nites": "nights"}
+FILLER = {"a", "an", "the", "i", "im", "we", "were", "us", "it", "its", "is", "are", "be", "will", "would",
+          "want", "like", "need", "to", "go", "for", "please", "pls", "just", "and", "so", "there", "me", "my"}
+_CANONICAL = re.compile(r"\b(" + "|".join(sorted(CANONICAL, key=len, reverse=True)) + r")\b")
+_NON_WORD = re.compile(r"[^\w\s-]+")
+_NUMERALS = re.compile(r"\d+")
+
+cache_lookups = metrics.counter("semantic_cache_lookups_total", "Extraction cache lookups by result (exact, similar, miss)")
+cache_audits = metrics.counter("semantic_cache_audits_total",
+                               "Cache hits re-checked against the LLM, by outcome (match, false_hit)")
+cache_entries = metrics.gauge("semantic_cache_entries", "Messages held by the extraction cache")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, punctuation dropped, CANONICAL words substituted and FILLER words removed."""
+    text = _NON_WORD.sub(" ", text.lower().replace("'", ""))
+    text = _CANONICAL.sub(lambda m: CANONICAL[m.group(1)], text)
+    words = [word for word in text.split() if word not in FILLER]
+    return " ".join(words) or text.strip()
+
+
+class SemanticCache:
+    """LRU cache of results keyed by message similarity, within a namespace.
+
+    Each message becomes a hashed bag of character n-grams (L2-normalized, VECTOR_DIM
+    floats) stored as one row of a preallocated NumPy matrix, so a lookup is a single
+    matrix-vector product. A hit needs the same namespace, the same numbers in the
+    same order (n-grams alone would match "2 guests" with "3 guests") and a cosine
+    similarity of at least `threshold`.
+    """
+
+    def __init__(self, capacity: int = SEMANTIC_CACHE_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 dim: int = VECTOR_DIM):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.dim = dim
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._groups = np.full(capacity, -1, dtype=np.int64)  # Row -> hash of its (namespace, numbers), -1 = free
+        self._rows: "OrderedDict[Tuple[str, str], int]" = OrderedDict()  # (namespace, normalized) -> row, oldest first
+        self._values: List[Any] = [None] * capacity
+        self._keys: List[Optional[Tuple[str, str]]] = [None] * capacity
+        self._lock = threading.Lock()
+
+    def _vectorize(self, normalized: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        padded = f" {normalized} "
+        for n in NGRAM_SIZES:
+            for i in range(len(padded) - n + 1):
+                vector[zlib.crc32(padded[i:i + n].encode()) % self.dim] += 1.0
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _group(namespace: str, normalized: str) -> Tuple[str, Tuple[str, ...]]:
+        return namespace, tuple(_NUMERALS.findall(normalized))
+
+    def get(self, text: str, namespace: str = "") -> Tuple[Optional[Any], str]:
+        """Returns (value, "exact" | "similar") for a hit, or (None, "miss")."""
+        normalized = normalize(text)
+        with self._lock:
+            row = self._rows.get((namespace, normalized))
+            if row is not None:
+                self._rows.move_to_end((namespace, normalized))
+                return self._values[row], "exact"
+            if not self._rows:
+                return None, "miss"
+            group = self._group(namespace, normalized)
+            scores = self._vectors @ self._vectorize(normalized)
+            scores[self._groups != hash(group)] = -1.0  # hash() is never -1, so free rows are masked too
+            row = int(np.argmax(scores))
+            # The hash only narrows the rows down; the stored key settles a collision
+            if scores[row] < self.threshold or self._group(*self._keys[row]) != group:
+                return None, "miss"
+            self._rows.move_to_end(self._keys[row])
+            return self._values[row], "similar"
+
+    def put(self, text: str, value: Any, namespace: str = ""):
+        normalized = normalize(text)
+        key = (namespace, normalized)
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                if len(self._rows) < self.capacity:
+                    row = len(self._rows)
+                else:
+                    _, row = self._rows.popitem(last=False)  # Reuse the least recently used row
+                self._vectors[row] = self._vectorize(normalized)
+                self._groups[row] = hash(self._group(namespace, normalized))
+                self._keys[row] = key
+            self._rows[key] = row
+            self._rows.move_to_end(key)
+            self._values[row] = value
+            cache_entries.set(len(self._rows))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+def get_extraction_cache() -> Optional[SemanticCache]:
+    """The process-wide extraction cache, or None while SEMANTIC_CACHE_SIZE is 0."""
+    if SEMANTIC_CACHE_SIZE <= 0:
+        return None
+    return shared("extraction_semantic_cache", SemanticCache)
+
+
+async def cached_extraction(message: str, namespace: str, extract: Callable[[], Awaitable[Dict]]) -> Dict:
+    """Runs `extract` for `message` unless a close paraphrase in `namespace` already has a result.
+
+    `namespace` must hold everything besides the message that the result depends on
+    (today's date, the field being asked for, the check-in date). Only successful
+    results are stored: errors from `extract` propagate.
+    """
+    cache = get_extraction_cache()
+    if cache is None or len(message) > SEMANTIC_CACHE_MAX_CHARS:
+        return await extract()
+    cached, result = cache.get(message, namespace)
+    cache_lookups.inc(result=result)
+    if cached is not None:
+        if random.random() >= SEMANTIC_CACHE_AUDIT_RATE:
+            return dict(cached)
+        fresh = await extract()
+        if fresh == cached:
+            cache_audits.inc(outcome="match")
+        else:
+            cache_audits.inc(outcome="false_hit")
+            logger.info(f"Semantic cache false hit ({result}) for {message!r}: cached {cached}, fresh {fresh}")
+            cache.put(message, dict(fresh), namespace)
+        return fresh
+    fresh = await extract()
+    if isinstance(fresh, dict):
+        cache.put(message, dict(fresh), namespace)  # Copies: callers may edit the dict they get
+    return fresh
@@ -0,0 +1,381 @@
+import asyncio
+import heapq
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import orjson
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# memory (per process), sqlite (one host, several workers) or redis (several hosts)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "sessions.sqlite3")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+# Idle time after which a conversation is dropped (every turn saves it again)
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+# In-memory store limits: least recently used sessions go first. 0 disables the byte budget.
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "100000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", "0"))
+# SQLite store: expired rows are deleted by a write at most this often, per worker
+SESSION_SWEEP_SECONDS = float(os.getenv("SESSION_SWEEP_SECONDS", "60"))
+SESSION_COOKIE = "session_id"
+
+# Snapshots are one version byte followed by an orjson document. Readers drop snapshots
+# with an unknown version (the conversation restarts) instead of failing the turn.
+# v2: compact conversation state (positional booking fields, role-coded history)
+SNAPSHOT_VERSION = 2
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def is_valid_session_id(session_id: Optional[str]) -> bool:
+    """Client-supplied IDs become store keys, so only plain tokens are accepted."""
+    return bool(session_id) and bool(_SESSION_ID.match(session_id))
+
+
+def dump_snapshot(snapshot: Dict) -> bytes:
+    return bytes([SNAPSHOT_VERSION]) + orjson.dumps(snapshot)
+
+
+def load_snapshot(blob: Optional[bytes]) -> Optional[Dict]:
+    if not blob:
+        return None
+    if blob[0] != SNAPSHOT_VERSION:
+        logger.warning(f"Dropping session snapshot with unknown version {blob[0]}")
+        return None
+    return orjson.loads(blob[1:])
+
+
+# --- Backends ---
+class SessionStore(ABC):
+    """Interface for conversation snapshot storage, keyed by session ID."""
+
+    @abstractmethod
+    async def get(self, session_id: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, session_id: str, blob: bytes, ttl: int = SESSION_TTL_SECONDS):
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        ...
+
+    async def close(self):
+        pass
+
+
+session_evictions = metrics.counter("session_evictions_total", "Sessions dropped from the in-memory store, by reason")
+sessions_live = metrics.gauge("sessions_live", "Sessions held by the in-memory store")
+session_bytes = metrics.gauge("session_store_bytes", "Snapshot bytes held by the in-memory store")
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store; conversations don't survive restarts or cross workers.
+
+    Memory stays bounded by three limits, enforced on every write: the idle TTL,
+    max_sessions and an optional byte budget (snapshot bytes). Sessions are kept in
+    LRU order for the last two. Expiry times sit in a min-heap, so finding what has
+    expired costs O(log n) per session instead of a scan. Superseded heap entries are
+    skipped when popped, and the heap is rebuilt once they outnumber live sessions.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX_SESSIONS, max_bytes: int = SESSION_MAX_BYTES):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()  # Oldest use first
+        self._expiry: List[Tuple[float, str]] = []
+        self._bytes = 0
+        self._lock = threading.Lock()  # Flask serves requests from several threads
+
+    async def get(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(session_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                self._remove(session_id, "ttl")
+                return None
+            self._data.move_to_end(session_id)
+            return entry[0]
+
+    async def set(self, session_id: str, blob: bytes, ttl: int = SESSION_TTL_SECONDS):
+        with self._lock:
+            now = time.monotonic()
+            old = self._data.pop(session_id, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._data[session_id] = (blob, now + ttl)
+            self._bytes += len(blob)
+            heapq.heappush(self._expiry, (now + ttl, session_id))
+            self._evict(now)
+
+    async def delete(self, session_id: str):
+        with self._lock:
+            if session_id in self._data:
+                self._remove(session_id, None)
+                self._update_gauges()
+
+    def _remove(self, session_id: str, reason: Optional[str]):
+        blob, _ = self._data.pop(session_id)
+        self._bytes -= len(blob)
+        if reason:
+            session_evictions.inc(reason=reason)
+
+    def _evict(self, now: float):
+        # Caller holds self._lock
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, session_id = heapq.heappop(self._expiry)
+            entry = self._data.get(session_id)
+            if entry is not None and entry[1] == expires_at:  # Else superseded by a later write
+                self._remove(session_id, "ttl")
+        while len(self._data) > self.max_sessions:
+            self._remove(next(iter(self._data)), "lru")
+        while self.max_bytes and self._bytes > self.max_bytes and len(self._data) > 1:
+            self._remove(next(iter(self._data)), "bytes")
+        if len(self._expiry) > 2 * len(self._data) + 64:
+            self._expiry = [(expires_at, session_id) for session_id, (_, expires_at) in self._data.items()]
+            heapq.heapify(self._expiry)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        sessions_live.set(len(self._data))
+        session_bytes.set(self._bytes)
+
+
+class SqliteSessionStore(SessionStore):
+    """Shared by every worker on one host through a WAL-mode SQLite file."""
+
+    def __init__(self, path: str = SESSION_SQLITE_PATH, sweep_seconds: float = SESSION_SWEEP_SECONDS):
+        self.path = path
+        self.sweep_seconds = sweep_seconds
+        self._local = threading.local()
+        self._next_sweep = 0.0  # Monotonic time; the first write sweeps
+        self._sweep_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, session_id: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (session_id, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, session_id: str, blob: bytes, ttl: int):
+        conn = self._connection()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)", (session_id, blob, now + ttl))
+        if self._sweep_due():
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def _sweep_due(self) -> bool:
+        # On a timer, not per session: whichever write comes next does it, on every worker
+        with self._sweep_lock:
+            now = time.monotonic()
+            if now < self._next_sweep:
+                return False
+            self._next_sweep = now + self.sweep_seconds
+            return True
+
+    def _delete(self, session_id: str):
+        self._connection().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    async def get(self, session_id: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, session_id)
+
+    async def set(self, session_id: str, blob: bytes, ttl: int = SESSION_TTL_SECONDS):
+        await asyncio.to_thread(self._set, session_id, blob, ttl)
+
+    async def delete(self, session_id: str):
+        await asyncio.to_thread(self._delete, session_id)
+
+
+class RedisError(Exception):
+    """Error reply from the Redis server."""
+
+
+class _RespConnection:
+    """One Redis connection speaking RESP2; commands are serialized with a lock.
+
+    A command that fails on I/O, or is cancelled between sending and reading its
+    reply, leaves the stream out of step (a late reply would be read as the next
+    command's), so the connection is closed and marked broken; callers reconnect.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.lock = asyncio.Lock()
+        self.broken = False
+
+    async def command(self, *args):
+        payload = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            payload.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        async with self.lock:
+            if self.broken:
+                raise ConnectionError("Redis connection is closed")
+            try:
+                self.writer.write(b"".join(payload))
+                await self.writer.drain()
+                return await self._read_reply()
+            except RedisError:
+                if self.broken:  # Protocol error: the stream is out of step
+                    self.writer.close()
+                raise  # An error reply was read in full; the connection is still usable
+            except BaseException:
+                self.broken = True
+                self.writer.close()
+                raise
+
+    async def _read_reply(self):
+        line = await self.reader.readuntil(b"\r\n")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [await self._read_reply() for _ in range(count)]
+        self.broken = True
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass  # Already broken
+
+
+class RedisSessionStore(SessionStore):
+    """Shared across hosts through any Redis-protocol server (GET / SET EX / DEL only).
+
+    Long-lived event loops (the FastAPI server) keep one connection open via
+    open_connection(); other loops, such as Flask's per-request ones, connect per call.
+    A kept connection that breaks (Redis restart, idle timeout, cancelled command) is
+    dropped, and the loop's next command opens a new one.
+    """
+
+    def __init__(self, url: str = SESSION_REDIS_URL):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self._connections: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._keep_open: "weakref.WeakSet" = weakref.WeakSet()  # Loops that called open_connection()
+
+    async def _connect(self) -> _RespConnection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        conn = _RespConnection(reader, writer)
+        if self.password:
+            await conn.command("AUTH", self.password)
+        if self.db:
+            await conn.command("SELECT", self.db)
+        return conn
+
+    async def open_connection(self):
+        """Keeps a connection open for the running loop (call at app startup)."""
+        loop = asyncio.get_running_loop()
+        self._keep_open.add(loop)
+        if loop not in self._connections:
+            self._connections[loop] = await self._connect()
+
+    async def _command(self, *args):
+        loop = asyncio.get_running_loop()
+        if loop in self._keep_open:
+            conn = self._connections.get(loop)
+            if conn is None or conn.broken:
+                conn = self._connections[loop] = await self._connect()
+            try:
+                return await conn.command(*args)
+            finally:
+                if conn.broken and self._connections.get(loop) is conn:
+                    del self._connections[loop]  # Reconnect on the next command
+        conn = await self._connect()
+        try:
+            return await conn.command(*args)
+        finally:
+            await conn.close()
+
+    async def get(self, session_id: str) -> Optional[bytes]:
+        return await self._command("GET", f"session:{session_id}")
+
+    async def set(self, session_id: str, blob: bytes, ttl: int = SESSION_TTL_SECONDS):
+        await self._command("SET", f"session:{session_id}", blob, "EX", ttl)
+
+    async def delete(self, session_id: str):
+        await self._command("DEL", f"session:{session_id}")
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        self._keep_open.discard(loop)
+        conn = self._connections.pop(loop, None)
+        if conn is not None:
+            await conn.close()
+
+
+_BACKENDS = {"memory": MemorySessionStore, "sqlite": SqliteSessionStore, "redis": RedisSessionStore}
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """The process-wide store selected by SESSION_STORE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if SESSION_STORE not in _BACKENDS:
+                    raise ValueError(f"Unknown SESSION_STORE '{SESSION_STORE}' (use memory, sqlite or redis)")
+                _store = _BACKENDS[SESSION_STORE]()
+    return _store
+
+
+# --- Helpers for the apps ---
+async def load_session(session_id: str) -> Optional[Dict]:
+    return load_snapshot(await get_session_store().get(session_id))
+
+
+async def save_session(session_id: str, snapshot: Dict):
+    await get_session_store().set(session_id, dump_snapshot(snapshot))
+
+
+async def delete_session(session_id: str):
+    await get_session_store().delete(session_id)
@@ -0,0 +1,79 @@
+import os
+from datetime import date
+from typing import List, Optional
+
+from conversation_state import FIELDS, USER
+from rule_extractor import extract_booking_details
+
+# Rolling summary of the turns that have dropped out of the history ring. The prompts
+# get this summary plus the recent turns, so their size stays roughly constant however
+# long the conversation runs. Folding is rule-based (no LLM call) and costs a few
+# regex passes per evicted entry.
+
+SUMMARY_MAX_NOTES = int(os.getenv("SUMMARY_MAX_NOTES", "5"))
+SUMMARY_NOTE_CHARS = 100
+NOTE_MIN_WORDS = 4  # Shorter messages are answers ("Paris", "yes please"), not context
+
+_FACT_LABELS = {"destination": "destination", "check_in": "check-in", "check_out": "check-out", "guests": "guests"}
+
+
+class RollingSummary:
+    """Booking details the user mentioned in older turns, plus their last few free-form requests.
+
+    Assistant entries are only counted: they are questions and summaries built from
+    the same booking details.
+    """
+    __slots__ = ("folded", "facts", "notes")
+
+    def __init__(self):
+        self.folded = 0
+        self.facts: List = [None] * len(FIELDS)  # Latest value per field, in FIELDS order
+        self.notes: List[str] = []
+
+    def fold(self, role: str, text: str, today: date):
+        """Adds one entry pushed out of the history ring."""
+        self.folded += 1
+        if role != USER:
+            return
+        details = extract_booking_details(text, today)
+        found = False
+        for i, field in enumerate(FIELDS):
+            if details.get(field) is not None:
+                self.facts[i] = details[field]
+                found = True
+        if not found and len(text.split()) >= NOTE_MIN_WORDS:
+            note = text if len(text) <= SUMMARY_NOTE_CHARS else text[:SUMMARY_NOTE_CHARS - 1] + "…"
+            if note not in self.notes:
+                self.notes.append(note)
+                del self.notes[:-SUMMARY_MAX_NOTES]
+
+    def render(self) -> str:
+        """Prompt text; "(none)" until something has been folded."""
+        if not self.folded:
+            return "(none)"
+        parts = [f"{self.folded} earlier messages."]
+        facts = [f"{_FACT_LABELS[field]} {value}" for field, value in zip(FIELDS, self.facts) if value is not None]
+        if facts:
+            parts.append("The user mentioned: " + "; ".join(facts) + ".")
+        if self.notes:
+            parts.append("The user also said: " + "; ".join(f'"{note}"' for note in self.notes) + ".")
+        return " ".join(parts)
+
+    def __bool__(self) -> bool:
+        return bool(self.folded)
+
+    def clear(self):
+        self.folded = 0
+        self.facts = [None] * len(FIELDS)
+        self.notes = []
+
+    def to_list(self) -> list:
+        """Snapshot form: [folded, [destination, check_in, check_out, guests], notes]."""
+        return [self.folded, self.facts, self.notes]
+
+    @classmethod
+    def from_list(cls, values: Optional[list]) -> "RollingSummary":
+        summary = cls()
+        if values:
+            summary.folded, summary.facts, summary.notes = values[0], list(values[1]), list(values[2])
+        return summary
@@ -1,29 +1,102 @@
-from flask import Flask, render_template, request, jsonify
-from chatbot import HotelBookingChatbot
-from booking_info import add_to_db
-from datetime import datetime
-import uuid
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from chatbot import HotelBookingChatbot, warm_up
+from booking_info import RoomsUnavailable, save_booking, fetch_upcoming_stays, fetch_rollups, warm_up_db
+from availability import get_inventory
+from bulk_bookings import import_bookings, iter_csv_rows, iter_ndjson_rows, export_csv, export_ndjson
+from weather_utils import prime_weather_connection
+from warmup import WarmupState, WARMUP_LLM, ping_llm_standalone
+from llm_clients import get_llm_breaker
+from session_store import SESSION_COOKIE, is_valid_session_id, new_session_id, load_session, save_session, delete_session
+import metrics
+import token_accounting
+from datetime import datetime, timezone
+import asyncio
+import io
+import os
 
 app = Flask(__name__)
-chatbot = HotelBookingChatbot()
+
+# --- Warm-up ---
+# Flask has no lifespan hook, so warm-up runs in a background thread at startup and
+# /ready answers 503 until it has finished.
+warmup_state = WarmupState()
+
+def _warmup_steps():
+    steps = {
+        "imports": lambda: asyncio.to_thread(warm_up),
+        "database": lambda: asyncio.to_thread(warm_up_db),
+        "inventory": lambda: asyncio.to_thread(get_inventory, fetch_upcoming_stays),
+        "weather_dns": prime_weather_connection,
+    }
+    if WARMUP_LLM:
+        # Warm-up runs on its own short-lived loop here, so it can't warm the shared client's pool
+        steps["llm"] = ping_llm_standalone
+    return steps
+
+if os.getenv("WARMUP_ON_START", "1") == "1":
+    warmup_state.start_in_thread(_warmup_steps())
+else:
+    warmup_state.skip()  # /ready must not stay 503 for the life of the process
+
+@app.route('/health')
+def health():
+    # Still alive while the LLM circuit is open; replies are rule-based until it closes
+    return jsonify({"status": "alive", "llm_circuit": get_llm_breaker().snapshot()})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/ready')
+def ready():
+    report = warmup_state.report()
+    return jsonify(report), 200 if report["ready"] else 503
+
+# --- Sessions ---
+# Conversations live in the session store (SESSION_STORE), so any worker can serve any turn
+def _session_id(data=None):
+    session_id = (data or {}).get('session_id') or request.cookies.get(SESSION_COOKIE)
+    return session_id if is_valid_session_id(session_id) else new_session_id()
 
 @app.route('/')
-def index():
-    chatbot.reset()
+async def index():
+    # A page load starts a fresh conversation
+    session_id = _session_id()
+    await delete_session(session_id)
     initial_message = "Hello! I'm your AI Booking Assistant, where would you like to book a hotel?"
-    return render_template('index.html', initial_message=initial_message)
+    response = app.make_response(render_template('index.html', initial_message=initial_message))
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+    return response
 
 @app.route('/chat', methods=['POST'])
 async def chat():
     user_message = request.json.get('message')
     print(f"Received user message: {user_message}")
+    session_id = _session_id(request.json)
     if user_message.lower() == 'reset':
-        response = chatbot.reset()
+        await delete_session(session_id)
+        response = "Let's start over! Where would you like to book a hotel? 🌍"
         print(f"Reset response (raw): {response}")
-        return jsonify({'responses': [response]})
-    responses = await chatbot.process_message(user_message)
-    print(f"Chat responses (raw): {responses}")
-    return jsonify({'responses': responses})
+        responses = [response]
+    else:
+        snapshot = await load_session(session_id)
+        chatbot = HotelBookingChatbot.from_snapshot(snapshot) if snapshot else HotelBookingChatbot(session_id=session_id)
+        with token_accounting.turn(session_id):
+            responses = await chatbot.process_message(user_message)
+        await save_session(session_id, chatbot.to_snapshot())
+        print(f"Chat responses (raw): {responses}")
+    response = jsonify({'responses': responses, 'session_id': session_id})
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+    return response
+
+@app.route('/debug/usage/<session_id>')
+def session_usage(session_id):
+    """LLM token usage and cost of one conversation, by call site and recent turn."""
+    usage = token_accounting.session_usage(session_id)
+    if usage is None:
+        return jsonify({"error": "No LLM usage recorded for this session"}), 404
+    return jsonify(usage)
 
 @app.route('/booking', methods=['POST'])
 async def get_booking():
@@ -41,15 +114,76 @@ async def get_booking():
         return jsonify({"status": "error", "message": "Invalid date format. Use YYYY-MM-DD"}), 400
     if not str(data['guests']).isdigit() or int(data['guests']) <= 0:
         return jsonify({"status": "error", "message": "Guests must be a positive integer"}), 400
-    db_success = await add_to_db(data['destination'], data['check_in'], data['check_out'], int(data['guests']))
+    inventory = get_inventory(loader=fetch_upcoming_stays)
+    try:
+        reservation = inventory.reserve(data['destination'], data['check_in'], data['check_out'], int(data['guests']))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if reservation is None:
+        return jsonify({"status": "error", "message": "No rooms available for these dates"}), 409
+    # The time-ordered ID is stored with the row, so it can be looked up later; the
+    # database re-checks the hold against bookings made through other workers
+    try:
+        booking_id = save_booking(data['destination'], data['check_in'], data['check_out'], int(data['guests']),
+                                  reservation=reservation)
+    except RoomsUnavailable:
+        inventory.release(reservation)
+        return jsonify({"status": "error", "message": "No rooms available for these dates"}), 409
+    if booking_id is None:
+        inventory.release(reservation)
     print("Received booking:", data)
-    booking_id = str(uuid.uuid4())
     response = {
         "status": "success",
         "booking_id": booking_id,
-        "db_saved": db_success
+        "db_saved": booking_id is not None
     }
     return jsonify(response), 201
 
+@app.route('/bookings/import', methods=['POST'])
+def bulk_import():
+    # Format from ?format=csv|ndjson, else from the Content-Type
+    fmt = request.args.get('format') or ('ndjson' if 'ndjson' in (request.content_type or '') else 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({"status": "error", "message": "format must be csv or ndjson"}), 400
+    # Read the body as a stream so large files are never held in memory
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    rows = iter_csv_rows(lines) if fmt == 'csv' else iter_ndjson_rows(lines)
+    report = import_bookings(rows)
+    return jsonify({"status": "success", **report}), 200
+
+@app.route('/bookings/export', methods=['GET'])
+def bulk_export():
+    fmt = request.args.get('format', 'csv')
+    day = request.args.get('date')
+    if day:
+        try:
+            datetime.strptime(day, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({"status": "error", "message": "Invalid date format. Use YYYY-MM-DD"}), 400
+    if fmt == 'csv':
+        return Response(stream_with_context(export_csv(day)), mimetype='text/csv',
+                        headers={'Content-Disposition': f"attachment; filename=bookings-{day or 'all'}.csv"})
+    if fmt == 'ndjson':
+        return Response(stream_with_context(export_ndjson(day)), mimetype='application/x-ndjson')
+    return jsonify({"status": "error", "message": "format must be csv or ndjson"}), 400
+
+@app.route('/analytics', methods=['GET'])
+def analytics():
+    # Served from the daily rollups only, never from booking_infos
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    date_from = request.args.get('from', today)
+    date_to = request.args.get('to', today)
+    try:
+        datetime.strptime(date_from, '%Y-%m-%d')
+        datetime.strptime(date_to, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid date format. Use YYYY-MM-DD"}), 400
+    try:
+        rows = fetch_rollups(date_from, date_to, request.args.get('destination'))
+    except Exception as e:
+        print(f"Analytics query failed: {e}")
+        return jsonify({"status": "error", "message": "Analytics unavailable"}), 503
+    return jsonify({"status": "success", "from": date_from, "to": date_to, "rollups": rows})
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,155 @@
+import asyncio
+import importlib
+import os
+import sys
+
+import httpx
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chatbot_using_fastapi")
+# The FastAPI app has its own modules under these names; the root ones are put back afterwards
+APP_MODULES = ("main", "chatbot", "booking_info", "admission")
+
+
+@pytest.fixture
+def app_modules(monkeypatch):
+    saved = {name: sys.modules.pop(name) for name in APP_MODULES if name in sys.modules}
+    monkeypatch.chdir(APP_DIR)  # main.py reads ../templates and ../static
+    monkeypatch.syspath_prepend(APP_DIR)
+    try:
+        yield importlib.import_module
+    finally:
+        for name in APP_MODULES:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+
+
+@pytest.fixture
+def admission(app_modules):
+    return app_modules("admission")
+
+
+async def never_disconnected():
+    return False
+
+
+def test_queue_full_is_rejected_with_retry_after(admission):
+    async def run():
+        controller = admission.AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+        release = asyncio.Event()
+
+        async def request():
+            async with controller.slot(never_disconnected):
+                await release.wait()
+
+        first = asyncio.ensure_future(request())
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(request())  # Queued behind the first
+        await asyncio.sleep(0)
+        with pytest.raises(admission.Overloaded) as shed:
+            await request()
+        stats = controller.stats()
+        release.set()
+        await asyncio.gather(first, second)
+        return shed.value, stats, controller.stats()
+
+    shed, during, after = asyncio.run(run())
+    assert shed.status_code == 503 and shed.retry_after >= 1
+    assert (during["in_flight"], during["queued"], during["rejected_queue_full"]) == (1, 1, 1)
+    assert (after["in_flight"], after["queued"], after["admitted"]) == (0, 0, 2)
+
+
+def test_queued_requests_are_admitted_in_order(admission):
+    async def run():
+        controller = admission.AdmissionController(max_in_flight=1, max_queue=4)
+        order = []
+
+        async def request(name):
+            async with controller.slot(never_disconnected):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(request(name) for name in "abcd"))
+        return order
+
+    assert asyncio.run(run()) == list("abcd")
+
+
+def test_queue_timeout(admission):
+    async def run():
+        controller = admission.AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.slot(never_disconnected):
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(admission.Overloaded, match="Timed out"):
+            async with controller.slot(never_disconnected):
+                pass
+        release.set()
+        await holder
+        return controller.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["rejected_timeout"], stats["queued"], stats["in_flight"]) == (1, 0, 0)
+
+
+def test_disconnected_client_leaves_the_queue(admission):
+    async def run():
+        controller = admission.AdmissionController(max_in_flight=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.slot(never_disconnected):
+                await release.wait()
+
+        async def gone():
+            return True
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(admission.ClientGone):
+            async with controller.slot(gone):
+                pass
+        release.set()
+        await holder
+        return controller.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["cancelled_disconnected"], stats["queued"], stats["in_flight"]) == (1, 0, 0)
+
+
+def test_chat_sheds_with_503_and_keeps_queued_bodies(app_modules, monkeypatch):
+    main = app_modules("main")
+    admission = app_modules("admission")
+    monkeypatch.setattr(main, "chat_admission", admission.AdmissionController(max_in_flight=1, max_queue=1))
+    release = asyncio.Event()
+    handled = []
+
+    async def handle_chat(request, data):
+        handled.append(data["message"])
+        await release.wait()
+        return main.JSONResponse(content={"reply": data["message"]})
+
+    monkeypatch.setattr(main, "_handle_chat", handle_chat)
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = asyncio.ensure_future(client.post("/chat", json={"message": "first"}))
+            second = asyncio.ensure_future(client.post("/chat", json={"message": "second"}))
+            while main.chat_admission.stats()["queued"] < 1:
+                await asyncio.sleep(0.005)
+            shed = await client.post("/chat", json={"message": "third"})
+            release.set()
+            return shed, await first, await second
+
+    shed, first, second = asyncio.run(run())
+    assert shed.status_code == 503
+    assert int(shed.headers["Retry-After"]) >= 1
+    assert shed.json()["retry_after"] == int(shed.headers["Retry-After"])
+    assert (first.json(), second.json()) == ({"reply": "first"}, {"reply": "second"})
+    assert handled == ["first", "second"]  # The queued request still had its body
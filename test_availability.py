@@ -0,0 +1,176 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from availability import RoomInventory, _NightLedger, _RangeMaxTree, rooms_for
+from booking_info import RoomsUnavailable, _hold_rooms
+
+TODAY = date(2026, 10, 19)
+
+
+class Clock:
+    def __init__(self, today: date):
+        self.today = today
+
+    def __call__(self) -> date:
+        return self.today
+
+
+def test_range_max_tree_matches_brute_force():
+    rng = random.Random(29)
+    size = 37
+    tree, counts = _RangeMaxTree(size), [0] * size
+    for _ in range(2000):
+        lo = rng.randrange(size)
+        hi = rng.randrange(lo, size)
+        if rng.random() < 0.5:
+            delta = rng.randint(-3, 5)
+            tree.add(lo, hi, delta)
+            for i in range(lo, hi + 1):
+                counts[i] += delta
+        else:
+            assert tree.max(lo, hi) == max(counts[lo:hi + 1])
+
+
+def test_ledger_roll_clears_past_nights():
+    start = TODAY.toordinal()
+    ledger = _NightLedger(5, start)
+    ledger.add(start, start + 4, 2)
+    ledger.add(start + 1, start + 1, 3)
+    ledger.roll(start + 2)  # Two days pass
+    assert ledger.start == start + 2
+    assert ledger.max(start, start + 1) == 0  # Dropped nights hold nothing
+    assert ledger.max(start + 5, start + 6) == 0  # Their slots now stand for new nights
+    assert ledger.max(start + 2, start + 4) == 2
+
+
+def test_ledger_spans_wrap_around_the_ring():
+    start = TODAY.toordinal()
+    ledger = _NightLedger(5, start)
+    ledger.roll(start + 3)
+    ledger.add(start + 4, start + 6, 1)  # Slots 4, 0 and 1 for a ring starting at slot 3
+    ledger.add(start + 6, start + 7, 2)
+    assert [ledger.max(day, day) for day in range(start + 3, start + 8)] == [0, 1, 1, 3, 2]
+    ledger.roll(start + 6)
+    assert [ledger.max(day, day) for day in range(start + 6, start + 11)] == [3, 2, 0, 0, 0]
+
+
+def test_ledger_roll_past_the_whole_window():
+    start = TODAY.toordinal()
+    ledger = _NightLedger(5, start)
+    ledger.add(start, start + 4, 4)
+    ledger.roll(start + 30)
+    assert ledger.max(start + 30, start + 34) == 0
+
+
+def test_ledger_matches_brute_force_across_days():
+    rng = random.Random(7)
+    size, today = 10, TODAY.toordinal()
+    ledger, booked = _NightLedger(size, today), {}
+    for _ in range(500):
+        if rng.random() < 0.1:
+            today += rng.randint(1, 3)
+            ledger.roll(today)
+        first = today + rng.randrange(size)
+        last = rng.randrange(first, today + size)
+        if rng.random() < 0.5:
+            ledger.add(first, last, 1)
+            for day in range(first, last + 1):
+                booked[day] = booked.get(day, 0) + 1
+        else:
+            assert ledger.max(first, last) == max(booked.get(day, 0) for day in range(first, last + 1))
+
+
+def test_reserve_until_full_then_release():
+    inventory = RoomInventory({"Paris": 2}, guests_per_room=2, today=Clock(TODAY))
+    first = inventory.reserve("paris", "2026-11-01", "2026-11-04", 3)
+    assert first.rooms == 2 and first.capacity == 2
+    assert first.nights == [date(2026, 11, 1), date(2026, 11, 2), date(2026, 11, 3)]
+    assert inventory.reserve("Paris ", "2026-11-03", "2026-11-05", 1) is None
+    assert inventory.reserve("Paris", "2026-11-04", "2026-11-05", 4) is not None  # Check-out night is free
+    inventory.release(first)
+    assert inventory.reserve("Paris", "2026-11-03", "2026-11-04", 1) is not None
+
+
+def test_keyed_reservations_count_once():
+    inventory = RoomInventory({"paris": 1}, today=Clock(TODAY))
+    first = inventory.reserve("Paris", "2026-11-01", "2026-11-02", 2, key="k")
+    assert inventory.reserve("Paris", "2026-11-01", "2026-11-02", 2, key="k") is first
+    inventory.release(first)
+    inventory.release(first)  # Already released: no rooms handed back twice
+    assert inventory.rooms_booked("Paris", "2026-11-01", "2026-11-02") == 0
+
+
+@pytest.mark.parametrize("check_in, check_out, message", [
+    ("2026-10-18", "2026-10-20", "today or later"),
+    ("2026-10-20", "2026-10-20", "today or later"),
+    ("2026-12-01", "2026-12-20", "only open 30 days ahead"),
+])
+def test_stays_outside_the_horizon_are_refused(check_in, check_out, message):
+    inventory = RoomInventory(horizon_days=30, today=Clock(TODAY))
+    with pytest.raises(ValueError, match=message):
+        inventory.reserve("Paris", check_in, check_out, 2)
+
+
+def test_inventory_window_follows_the_date():
+    clock = Clock(TODAY)
+    inventory = RoomInventory({"paris": 1}, horizon_days=10, today=clock)
+    inventory.reserve("Paris", "2026-10-20", "2026-10-22", 1)
+    clock.today = TODAY + timedelta(days=5)
+    # The old stay's slots were reused for later nights, which start empty
+    assert inventory.reserve("Paris", "2026-10-28", "2026-10-29", 1) is not None
+    with pytest.raises(ValueError):
+        inventory.reserve("Paris", "2026-10-21", "2026-10-22", 1)
+    clock.today = TODAY  # A clock going backwards does not reopen past nights
+    with pytest.raises(ValueError):
+        inventory.reserve("Paris", "2026-10-21", "2026-10-22", 1)
+
+
+def test_seed_counts_stored_stays_from_today():
+    inventory = RoomInventory({"paris": 3}, today=Clock(TODAY))
+    applied = inventory.seed([
+        ("Paris", date(2026, 10, 17), date(2026, 10, 21), 4),  # Started already: counts from today
+        ("Paris", date(2026, 10, 10), date(2026, 10, 12), 2),  # Finished
+        ("paris", "2026-10-20", "2026-10-21", 1),
+    ])
+    assert applied == 2
+    assert inventory.rooms_booked("Paris", "2026-10-19", "2026-10-21") == 3
+    assert inventory.reserve("Paris", "2026-10-20", "2026-10-21", 1) is None
+
+
+def test_rooms_for():
+    assert [rooms_for(guests, 2) for guests in (1, 2, 3, 4, 5)] == [1, 1, 2, 2, 3]
+
+
+class FakeCursor:
+    """Applies room_nights statements to a dict, like MySQL would for one connection."""
+
+    def __init__(self, rooms=None):
+        self.rooms = dict(rooms or {})
+        self.rowcount = 0
+
+    def executemany(self, query, rows):
+        assert query.startswith("INSERT IGNORE INTO room_nights")
+        for city, night in rows:
+            self.rooms.setdefault((city, night), 0)
+
+    def execute(self, query, params):
+        assert query.startswith("UPDATE room_nights")
+        rooms, city, first, last, _, capacity = params
+        nights = [key for key in self.rooms if key[0] == city and first <= key[1] <= last]
+        updated = [key for key in nights if self.rooms[key] + rooms <= capacity]
+        for key in updated:
+            self.rooms[key] += rooms
+        self.rowcount = len(updated)
+
+
+def test_database_hold_refuses_nights_booked_elsewhere():
+    inventory = RoomInventory({"paris": 2}, today=Clock(TODAY))
+    reservation = inventory.reserve("Paris", "2026-11-01", "2026-11-03", 2)
+    cursor = FakeCursor({("paris", date(2026, 11, 2)): 2})  # Another worker sold the last room
+    with pytest.raises(RoomsUnavailable):
+        _hold_rooms(cursor, reservation)
+    cursor = FakeCursor({("paris", date(2026, 11, 2)): 1})
+    _hold_rooms(cursor, reservation)
+    assert cursor.rooms == {("paris", date(2026, 11, 1)): 1, ("paris", date(2026, 11, 2)): 2}
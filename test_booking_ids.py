@@ -0,0 +1,85 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import booking_ids
+from booking_ids import (booking_id_bounds, booking_id_timestamp, format_booking_id, new_booking_id,
+                         parse_booking_id)
+
+NOW_MS = 1_792_368_000_000  # 2026-10-19 00:00:00 UTC
+
+
+class Clock:
+    def __init__(self, ms):
+        self.ms = ms
+
+    def time_ns(self):
+        return self.ms * 1_000_000
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock(NOW_MS)
+    monkeypatch.setattr(booking_ids.time, "time_ns", fake.time_ns)
+    monkeypatch.setattr(booking_ids, "_last_ms", 0)
+    monkeypatch.setattr(booking_ids, "_seq", 0)
+    return fake
+
+
+def fields(booking_id: uuid.UUID):
+    value = booking_id.int
+    return value >> 80, (value >> 76) & 0xF, (value >> 64) & 0xFFF, (value >> 62) & 0b11
+
+
+def test_layout(clock):
+    booking_id = new_booking_id()
+    ms, version, _, variant = fields(booking_id)
+    assert (ms, version, variant) == (NOW_MS, 7, 0b10)
+    assert booking_id.version == 7 and booking_id.variant == uuid.RFC_4122
+    assert booking_id_timestamp(booking_id) == datetime(2026, 10, 19, tzinfo=timezone.utc)
+
+
+def test_monotonic_when_the_sequence_overflows(clock):
+    ids = [new_booking_id() for _ in range(3 * 4096)]  # All in the same millisecond
+    assert all(a.bytes < b.bytes for a, b in zip(ids, ids[1:]))
+    stamps = [fields(booking_id)[0] for booking_id in ids]
+    assert stamps[0] == NOW_MS
+    assert NOW_MS < stamps[-1] <= NOW_MS + 3  # Exhausted counters borrow the next milliseconds
+    assert len(set(ids)) == len(ids)
+
+
+def test_monotonic_when_the_clock_goes_back(clock):
+    first = new_booking_id()
+    clock.ms -= 5_000
+    second = new_booking_id()
+    clock.ms += 5_001
+    third = new_booking_id()
+    assert first.bytes < second.bytes < third.bytes
+    assert fields(second)[0] == NOW_MS  # Stays on the last millisecond issued
+
+
+def test_new_millisecond_restarts_the_sequence_low(clock):
+    for _ in range(4000):
+        new_booking_id()
+    clock.ms += 1
+    _, _, seq, _ = fields(new_booking_id())
+    assert seq <= 0x3FF  # Leaves room for the counter within the millisecond
+
+
+def test_string_round_trip(clock):
+    booking_id = new_booking_id()
+    raw = parse_booking_id(str(booking_id))
+    assert raw == booking_id.bytes and len(raw) == 16
+    assert format_booking_id(raw) == str(booking_id)
+    with pytest.raises(ValueError):
+        parse_booking_id("not-a-booking-id")
+
+
+def test_bounds_cover_ids_of_the_range(clock):
+    start = datetime(2026, 10, 19, tzinfo=timezone.utc)
+    low, high = booking_id_bounds(start, start + timedelta(days=1))
+    inside = new_booking_id().bytes
+    clock.ms += 24 * 3600 * 1000
+    next_day = new_booking_id().bytes
+    assert low <= inside < high <= next_day
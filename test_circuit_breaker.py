@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+class Probe:
+    """Fails `failures` times, then succeeds; each call waits until the test lets it finish."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = 0
+        self.started = threading.Event()
+        self.proceed = threading.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        self.started.set()
+        while not self.proceed.is_set():
+            await asyncio.sleep(0.005)
+        self.proceed.clear()
+        self.started.clear()
+        if self.calls <= self.failures:
+            raise ConnectionError("still down")
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+async def ok():
+    return "ok"
+
+
+async def boom():
+    raise ConnectionError("down")
+
+
+def fail(breaker, times):
+    for _ in range(times):
+        with pytest.raises(ConnectionError):
+            asyncio.run(breaker.call(boom()))
+
+
+def test_opens_at_the_failure_rate_after_min_calls():
+    breaker = CircuitBreaker("test", window=4, min_calls=4, failure_rate=0.5)
+    asyncio.run(breaker.call(ok()))
+    asyncio.run(breaker.call(ok()))
+    fail(breaker, 1)
+    assert breaker.state == CLOSED  # 1 of 3: under min_calls
+    fail(breaker, 1)
+    assert breaker.state == OPEN  # 2 of 4 failed
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("test", window=2, min_calls=2, failure_rate=1.0, slow_call_seconds=0.01)
+
+    async def slow():
+        await asyncio.sleep(0.02)
+
+    asyncio.run(breaker.call(slow()))
+    asyncio.run(breaker.call(slow()))
+    assert breaker.state == OPEN
+
+
+def test_open_circuit_refuses_calls_without_starting_them():
+    breaker = CircuitBreaker("test", window=2, min_calls=2, failure_rate=0.5)
+    fail(breaker, 2)
+    started = []
+
+    async def call():
+        started.append(True)
+
+    with pytest.raises(CircuitOpen):
+        asyncio.run(breaker.call(call()))
+    assert started == []
+
+
+def test_open_half_open_closed():
+    probe = Probe(failures=1)
+    breaker = CircuitBreaker("test", probe=probe, window=2, min_calls=2, failure_rate=0.5, open_seconds=0.02)
+    fail(breaker, 2)
+    assert breaker.state == OPEN
+
+    probe.started.wait(2)
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):  # User traffic still doesn't get through while probing
+        asyncio.run(breaker.call(ok()))
+    probe.proceed.set()  # First probe fails
+    wait_for(lambda: breaker.state == OPEN)
+
+    probe.started.wait(2)  # Retried after twice the delay
+    assert breaker.state == HALF_OPEN
+    probe.proceed.set()  # Second probe succeeds
+    wait_for(lambda: breaker.state == CLOSED)
+    assert probe.calls == 2
+    assert asyncio.run(breaker.call(ok())) == "ok"
+    assert breaker.snapshot()["recent_calls"] == 1  # The window started over
+
+
+def test_cancelled_calls_are_not_failures():
+    breaker = CircuitBreaker("test", window=2, min_calls=1, failure_rate=0.5)
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(breaker.call(asyncio.sleep(1)), 0.01)
+
+    asyncio.run(run())
+    assert breaker.state == CLOSED and breaker.snapshot()["recent_calls"] == 0
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from conversation_fsm import (AFFIRM, AWAITING_CONFIRMATION, BOOKED, COLLECTING, CONFIRM_PROMPT, CONVERSATION_FSM,
+                              DENY, EMPTY, ERROR, INFO, QUESTION, ROUTES, SMALL_TALK, STATEMENT, ConversationFSM)
+
+
+@pytest.mark.parametrize("state, text, event, topic", [
+    (COLLECTING, "", EMPTY, None),
+    (COLLECTING, "hi", SMALL_TALK, "greeting"),
+    (COLLECTING, "Hi there!", SMALL_TALK, "greeting"),
+    (COLLECTING, "thanks so much for the help", SMALL_TALK, "thanks"),
+    (COLLECTING, "how are you doing today?", SMALL_TALK, "how_are_you"),
+    (COLLECTING, "Hi, Paris for 2", INFO, None),
+    (COLLECTING, "hello, I'd like a hotel in Rome", INFO, None),
+    (COLLECTING, "thanks, 3 guests", INFO, None),
+    (COLLECTING, "yes", INFO, None),  # No confirmation pending: nothing to say yes to
+    (COLLECTING, "Paris from 2026-11-02 to 2026-11-05", INFO, None),
+    (AWAITING_CONFIRMATION, "", EMPTY, None),
+    (AWAITING_CONFIRMATION, "yes", AFFIRM, None),
+    (AWAITING_CONFIRMATION, "yes thanks", AFFIRM, None),
+    (AWAITING_CONFIRMATION, "ok thanks!", AFFIRM, None),
+    (AWAITING_CONFIRMATION, "Sounds good, cheers", AFFIRM, None),
+    (AWAITING_CONFIRMATION, "no thanks", DENY, None),
+    (AWAITING_CONFIRMATION, "hi, can I change the dates?", DENY, None),
+    (AWAITING_CONFIRMATION, "thank you", SMALL_TALK, "thanks"),
+    (AWAITING_CONFIRMATION, "bye", SMALL_TALK, "bye"),
+    (AWAITING_CONFIRMATION, "hmm, 3 guests", INFO, None),
+    (AWAITING_CONFIRMATION, "hey, Rome for 3 instead", INFO, None),
+])
+def test_classify(state, text, event, topic):
+    turn = CONVERSATION_FSM.classify(state, text)
+    assert (turn.event, turn.topic) == (event, topic)
+
+
+@pytest.mark.parametrize("state, reply_kind, expected", [
+    (COLLECTING, QUESTION, COLLECTING),
+    (COLLECTING, CONFIRM_PROMPT, AWAITING_CONFIRMATION),
+    (COLLECTING, ERROR, COLLECTING),
+    (COLLECTING, BOOKED, COLLECTING),
+    (AWAITING_CONFIRMATION, CONFIRM_PROMPT, AWAITING_CONFIRMATION),
+    (AWAITING_CONFIRMATION, STATEMENT, AWAITING_CONFIRMATION),
+    (AWAITING_CONFIRMATION, ERROR, AWAITING_CONFIRMATION),
+    (AWAITING_CONFIRMATION, QUESTION, COLLECTING),
+    (AWAITING_CONFIRMATION, BOOKED, COLLECTING),
+])
+def test_next_state(state, reply_kind, expected):
+    assert CONVERSATION_FSM.next_state(state, reply_kind) == expected
+
+
+class Handlers:
+    """Replies with a fixed kind per handler and records the turns it saw."""
+
+    def __init__(self, kinds):
+        self.seen = []
+        for name in set(ROUTES.values()):
+            setattr(self, name, self._make(name, kinds.get(name, STATEMENT)))
+
+    def _make(self, name, kind):
+        async def handler(turn):
+            self.seen.append((name, turn.text))
+            return [name], kind
+        return handler
+
+
+def test_booking_conversation():
+    handlers = Handlers({"_on_booking_info": CONFIRM_PROMPT, "_on_affirm": BOOKED, "_on_deny": QUESTION})
+
+    async def run(state, messages):
+        for text in messages:
+            state = (await CONVERSATION_FSM.dispatch(handlers, state, text)).next_state
+        return state
+
+    assert asyncio.run(run(COLLECTING, ["Hi, Paris for 2 from 2026-11-02 to 2026-11-05"])) == AWAITING_CONFIRMATION
+    assert asyncio.run(run(AWAITING_CONFIRMATION, ["thanks"])) == AWAITING_CONFIRMATION
+    assert asyncio.run(run(AWAITING_CONFIRMATION, ["no, change the dates"])) == COLLECTING
+    assert asyncio.run(run(AWAITING_CONFIRMATION, ["yes thanks"])) == COLLECTING
+    assert [name for name, _ in handlers.seen] == ["_on_booking_info", "_on_small_talk", "_on_deny", "_on_affirm"]
+
+
+def test_unknown_state_restarts_collecting():
+    handlers = Handlers({})
+    turn = asyncio.run(CONVERSATION_FSM.dispatch(handlers, "greeting_phase", "yes"))
+    assert (turn.event, turn.next_state) == (INFO, COLLECTING)
+
+
+def test_routes_must_cover_every_state():
+    routes = {key: name for key, name in ROUTES.items() if key != (AWAITING_CONFIRMATION, SMALL_TALK)}
+    with pytest.raises(ValueError, match="small_talk"):
+        ConversationFSM(routes=routes)
@@ -0,0 +1,112 @@
+import asyncio
+import re
+import time
+
+import orjson
+import pytest
+
+import extraction_batcher
+from extraction_batcher import _SOLO, ExtractionBatcher, extract_with_batching
+
+
+class FakeMessage:
+    def __init__(self, answer):
+        self.content = orjson.dumps(answer)
+
+
+class FakeJsonModel:
+    """Answers a batch prompt task by task, echoing each task's prompt back under its number."""
+
+    def __init__(self, skip=()):
+        self.prompts = []
+        self.skip = set(skip)
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        tasks = re.findall(r"### Task (\d+)\n(.*?)(?=\n\n### Task |\Z)", prompt, re.S)
+        return FakeMessage({number: {"echo": text} for number, text in tasks if text not in self.skip})
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeJsonModel()
+    monkeypatch.setattr(extraction_batcher, "get_json_model", lambda name, temperature: fake)
+    return fake
+
+
+def test_full_batch_is_sent_without_waiting_for_the_window(model):
+    async def run():
+        batcher = ExtractionBatcher(window_ms=10_000, max_size=3)
+        started = time.monotonic()
+        results = await asyncio.gather(*(batcher.submit(f"prompt {i}") for i in range(3)))
+        return results, time.monotonic() - started
+
+    results, elapsed = asyncio.run(run())
+    assert results == [{"echo": f"prompt {i}"} for i in range(3)]  # Each caller gets its own task's answer
+    assert len(model.prompts) == 1 and elapsed < 1
+
+
+def test_window_flushes_a_partial_batch(model):
+    async def run():
+        batcher = ExtractionBatcher(window_ms=20, max_size=8)
+        first = asyncio.ensure_future(batcher.submit("prompt a"))
+        await asyncio.sleep(0.005)  # Joins the batch the first request opened
+        second = asyncio.ensure_future(batcher.submit("prompt b"))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(run()) == [{"echo": "prompt a"}, {"echo": "prompt b"}]
+    assert len(model.prompts) == 1
+    assert "Number of tasks: 2" in model.prompts[0]
+
+
+def test_requests_after_a_flush_start_a_new_batch(model):
+    async def run():
+        batcher = ExtractionBatcher(window_ms=10, max_size=2)
+        first = await asyncio.gather(batcher.submit("prompt a"), batcher.submit("prompt b"))
+        second = await asyncio.gather(batcher.submit("prompt c"), batcher.submit("prompt d"))
+        return first + second
+
+    assert asyncio.run(run()) == [{"echo": f"prompt {x}"} for x in "abcd"]
+    assert len(model.prompts) == 2
+
+
+def test_a_batch_of_one_sends_its_own_request(model):
+    async def run():
+        return await ExtractionBatcher(window_ms=5, max_size=8).submit("alone")
+
+    assert asyncio.run(run()) is _SOLO
+    assert model.prompts == []
+
+
+def test_tasks_missing_from_the_answer_fall_back(monkeypatch):
+    fake = FakeJsonModel(skip={"prompt b"})
+    monkeypatch.setattr(extraction_batcher, "get_json_model", lambda name, temperature: fake)
+
+    async def run():
+        batcher = ExtractionBatcher(window_ms=10_000, max_size=2)
+        return await asyncio.gather(batcher.submit("prompt a"), batcher.submit("prompt b"))
+
+    assert asyncio.run(run()) == [{"echo": "prompt a"}, _SOLO]
+
+
+def test_rejected_part_is_retried_on_its_own(model, monkeypatch):
+    monkeypatch.setattr(extraction_batcher, "EXTRACTION_BATCH_WINDOW_MS", 10)
+    single_calls = []
+
+    def accept(part):
+        if part["echo"] == "bad":
+            raise ValueError("invalid field")
+        return part["echo"].upper()
+
+    async def extract(prompt):
+        async def single_call():
+            single_calls.append(prompt)
+            return "single"
+        return await extract_with_batching(lambda: prompt, single_call, accept=accept)
+
+    async def run():
+        extraction_batcher._batchers[asyncio.get_running_loop()] = ExtractionBatcher(window_ms=10_000, max_size=2)
+        return await asyncio.gather(extract("good"), extract("bad"))
+
+    assert asyncio.run(run()) == ["GOOD", "single"]
+    assert single_calls == ["bad"]
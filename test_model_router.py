@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from model_router import SHORT_INPUT_CHARS, TIERS, RejectedAnswer, first_model, ladder, routed_call
+
+
+@pytest.fixture(autouse=True)
+def default_routes(monkeypatch):
+    monkeypatch.delenv("LLM_ROUTE_EXTRACT", raising=False)
+
+
+class Models:
+    """Answers with `answers[model]` and records which models were called, in order."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.called = []
+
+    async def __call__(self, model):
+        self.called.append(model)
+        answer = self.answers[model]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def accept_json(answer):
+    if not answer.startswith("{"):
+        raise ValueError(f"not JSON: {answer!r}")
+    return answer
+
+
+def test_accepted_answer_stays_on_the_first_tier():
+    models = Models({TIERS["fast"]: "{}"})
+    assert asyncio.run(routed_call("extract", models, accept=accept_json)) == "{}"
+    assert models.called == [TIERS["fast"]]
+
+
+def test_rejected_answer_escalates_a_tier():
+    models = Models({TIERS["fast"]: "sorry", TIERS["standard"]: '{"guests": 2}'})
+    assert asyncio.run(routed_call("extract", models, accept=accept_json)) == '{"guests": 2}'
+    assert models.called == [TIERS["fast"], TIERS["standard"]]
+
+
+def test_last_tier_rejection_raises():
+    models = Models({TIERS["fast"]: "sorry", TIERS["standard"]: "still sorry"})
+    with pytest.raises(RejectedAnswer, match="still sorry"):
+        asyncio.run(routed_call("extract", models, accept=accept_json))
+    assert models.called == [TIERS["fast"], TIERS["standard"]]
+
+
+def test_request_errors_do_not_escalate():
+    models = Models({TIERS["fast"]: ConnectionError("reset"), TIERS["standard"]: "{}"})
+    with pytest.raises(ConnectionError):
+        asyncio.run(routed_call("extract", models, accept=accept_json))
+    assert models.called == [TIERS["fast"]]
+
+
+def test_long_input_starts_one_tier_up():
+    models = Models({TIERS["standard"]: "{}"})
+    asyncio.run(routed_call("extract", models, text="x" * (SHORT_INPUT_CHARS + 1), accept=accept_json))
+    assert models.called == [TIERS["standard"]]
+
+
+def test_accept_transforms_the_answer():
+    models = Models({TIERS["fast"]: "2"})
+    assert asyncio.run(routed_call("extract", models, accept=int)) == 2
+
+
+@pytest.mark.parametrize("override, expected", [
+    (None, ("fast", "standard")),
+    ("standard, large", ("standard", "large")),
+    ("large", ("large",)),
+])
+def test_ladder_override(monkeypatch, override, expected):
+    if override is not None:
+        monkeypatch.setenv("LLM_ROUTE_EXTRACT", override)
+    assert ladder("extract") == expected
+    assert first_model("extract") == TIERS[expected[0]]
+
+
+def test_unknown_tier_is_rejected(monkeypatch):
+    monkeypatch.setenv("LLM_ROUTE_EXTRACT", "fast,huge")
+    with pytest.raises(ValueError, match="huge"):
+        ladder("extract")
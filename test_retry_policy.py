@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+import retry_policy
+from retry_policy import HEDGE_MIN_SAMPLES, _hedged, _tracker, is_transient
+
+
+@pytest.fixture
+def call_site(request):
+    """A call site whose p95 is 10 ms, so a request slower than that gets hedged."""
+    name = f"test:{request.node.name}"
+    for _ in range(HEDGE_MIN_SAMPLES):
+        _tracker(name).record(0.01)
+    yield name
+    retry_policy._latencies.pop(name, None)
+
+
+class Requests:
+    """Request i sleeps delays[i] seconds, then returns i or raises errors[i]; records cancellations."""
+
+    def __init__(self, delays, errors=None):
+        self.delays = delays
+        self.errors = errors or {}
+        self.started = 0
+        self.cancelled = []
+
+    def make_call(self):
+        index = self.started
+        self.started += 1
+        return self._request(index)
+
+    async def _request(self, index):
+        try:
+            await asyncio.sleep(self.delays[index])
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+        if index in self.errors:
+            raise self.errors[index]
+        return index
+
+
+def test_hedge_wins_and_the_slow_request_is_cancelled(call_site):
+    requests = Requests([5.0, 0.01])
+
+    async def run():
+        result = await _hedged(call_site, requests.make_call)
+        await asyncio.sleep(0)  # Let the cancellation reach the loser
+        return result
+
+    assert asyncio.run(run()) == 1
+    assert requests.started == 2
+    assert requests.cancelled == [0]
+
+
+def test_original_wins_and_the_hedge_is_cancelled(call_site):
+    requests = Requests([0.03, 5.0])
+
+    async def run():
+        result = await _hedged(call_site, requests.make_call)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == 0
+    assert requests.cancelled == [1]
+
+
+def test_fast_request_is_not_hedged(call_site):
+    requests = Requests([0.0])
+    assert asyncio.run(_hedged(call_site, requests.make_call)) == 0
+    assert requests.started == 1
+
+
+def test_failed_request_waits_for_the_other(call_site):
+    requests = Requests([0.03, 0.05], errors={0: ConnectionError("reset")})
+    assert asyncio.run(_hedged(call_site, requests.make_call)) == 1
+
+
+def test_both_failing_raise_the_last_error(call_site):
+    requests = Requests([0.02, 0.04], errors={0: ConnectionError("first"), 1: ConnectionError("second")})
+    with pytest.raises(ConnectionError, match="second"):
+        asyncio.run(_hedged(call_site, requests.make_call))
+
+
+def test_no_hedging_without_enough_samples():
+    requests = Requests([0.03])
+    assert asyncio.run(_hedged("test:cold-call-site", requests.make_call)) == 0
+    assert requests.started == 1
+    retry_policy._latencies.pop("test:cold-call-site", None)
+
+
+def test_cancelling_the_caller_cancels_both_requests(call_site):
+    requests = Requests([5.0, 5.0])
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(_hedged(call_site, requests.make_call), 0.05)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert sorted(requests.cancelled) == [0, 1]
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(status_code)
+        self.status_code = status_code
+
+
+class RateLimitError(Exception):
+    pass
+
+
+@pytest.mark.parametrize("error, expected", [
+    (ConnectionError(), True),
+    (asyncio.TimeoutError(), True),
+    (StatusError(429), True),
+    (StatusError(503), True),
+    (StatusError(400), False),
+    (RateLimitError(), True),
+    (ValueError(), False),
+    (retry_policy.DeadlineExceeded(), False),
+    (retry_policy.CircuitOpen(), False),
+])
+def test_is_transient(error, expected):
+    assert is_transient(error) is expected
@@ -0,0 +1,72 @@
+from datetime import date
+
+import pytest
+
+from rule_extractor import detect_change_field, extract_booking_details
+
+TODAY = date(2026, 10, 19)  # A Monday
+
+
+@pytest.mark.parametrize("message, check_in, expecting, expected_in, expected_out", [
+    ("2026-11-02 to 2026-11-05", None, None, "2026-11-02", "2026-11-05"),
+    ("March 5th to March 8th", None, None, "2027-03-05", "2027-03-08"),
+    ("from 5 march for 3 nights", None, None, "2027-03-05", "2027-03-08"),
+    ("tomorrow", None, None, "2026-10-20", None),
+    ("the day after tomorrow", None, None, "2026-10-21", None),
+    ("next friday", None, None, "2026-10-23", None),
+    ("on monday", None, None, "2026-10-26", None),
+    ("in 3 days", None, None, "2026-10-22", None),
+    ("in three days for 2 nights", None, None, "2026-10-22", "2026-10-24"),
+    ("for 5 days", "2026-11-01", None, None, "2026-11-06"),
+    ("a week", "2026-11-01", None, None, "2026-11-08"),
+    ("2 weeks", "2026-11-01", None, None, "2026-11-15"),
+    ("2026-11-04", "2026-11-01", "check_out", None, "2026-11-04"),
+    ("2026-11-04", None, "check_in", "2026-11-04", None),
+    ("sometime soon", None, None, None, None),
+])
+def test_dates(message, check_in, expecting, expected_in, expected_out):
+    result = extract_booking_details(message, TODAY, check_in=check_in, expecting=expecting)
+    assert (result["check_in"], result["check_out"]) == (expected_in, expected_out)
+
+
+@pytest.mark.parametrize("message, expecting, expected", [
+    ("2 people", None, 2),
+    ("three of us", None, 3),
+    ("we are 4", None, 4),
+    ("for 2 please", None, 2),
+    ("for 3 nights", None, None),
+    ("we are 2 adults and a kid", None, 3),
+    ("2 adults and 2 children", None, 4),
+    ("for 3 kids", None, 3),
+    ("just me", None, 1),
+    ("me and my wife", None, 2),
+    ("4", "guests", 4),
+    ("4", "destination", None),
+])
+def test_guests(message, expecting, expected):
+    assert extract_booking_details(message, TODAY, expecting=expecting)["guests"] == expected
+
+
+@pytest.mark.parametrize("message, expecting, expected", [
+    ("I want to go to Paris", None, "Paris"),
+    ("a hotel in New York please", None, "New York"),
+    ("visiting Rome in May", None, "Rome"),
+    ("london", "destination", "London"),
+    ("yes", "destination", None),
+    ("somewhere warm", None, None),
+])
+def test_destination(message, expecting, expected):
+    assert extract_booking_details(message, TODAY, expecting=expecting)["destination"] == expected
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("change the check-in please", "check_in"),
+    ("I need to leave a day later", "check_out"),
+    ("the dates are wrong", "dates"),
+    ("we are more people", "guests"),
+    ("different city", "destination"),
+    ("let's go to Berlin instead", "destination"),
+    ("hmm", "unknown"),
+])
+def test_change_field(message, expected):
+    assert detect_change_field(message) == expected
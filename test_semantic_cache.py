@@ -0,0 +1,46 @@
+from semantic_cache import SemanticCache, normalize
+
+
+def test_paraphrases_hit_within_their_namespace():
+    cache = SemanticCache(capacity=4, threshold=0.75)
+    cache.put("2 people please", {"guests": 2}, namespace="2026-10-19|guests")
+    assert cache.get("2 people please", "2026-10-19|guests") == ({"guests": 2}, "exact")
+    assert cache.get("Two persons!", "2026-10-19|guests") == ({"guests": 2}, "exact")  # Same once normalized
+    assert cache.get("only two persons", "2026-10-19|guests") == ({"guests": 2}, "similar")
+    assert cache.get("only two persons", "2026-10-20|guests") == (None, "miss")
+    assert cache.get("only 3 persons", "2026-10-19|guests") == (None, "miss")
+
+
+def test_evicts_the_least_recently_used_row():
+    cache = SemanticCache(capacity=2)
+    cache.put("2 people", 2)
+    cache.put("3 people", 3)
+    cache.get("2 people")
+    cache.put("4 people", 4)
+    assert len(cache) == 2
+    assert cache.get("3 people") == (None, "miss")
+    assert cache.get("2 people") == (2, "exact")
+
+
+def test_memory_stays_bounded_under_unique_namespaces():
+    cache = SemanticCache(capacity=8)
+    for day in range(1000):
+        cache.put(f"{day} people", day, namespace=f"day-{day}")
+    assert len(cache) == 8
+    assert all(len(state) <= 8 for state in vars(cache).values() if isinstance(state, (dict, list)))
+    assert sorted(key for key, _ in cache._rows) == sorted(f"day-{day}" for day in range(992, 1000))
+    assert cache.get("999 people", "day-999") == (999, "exact")
+    assert cache.get("0 people", "day-0") == (None, "miss")
+
+
+def test_overwritten_row_moves_to_its_new_group():
+    cache = SemanticCache(capacity=1, threshold=0.75)
+    cache.put("2 people", 2, namespace="a")
+    cache.put("2 people", 2, namespace="b")  # Evicts the only row and reuses it
+    assert cache.get("only two persons", "a") == (None, "miss")
+    assert cache.get("only two persons", "b") == (2, "similar")
+
+
+def test_normalize():
+    assert normalize("We're a couple of guests!") == "2 of people"
+    assert normalize("Three nites please") == "3 nights"
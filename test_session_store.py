@@ -0,0 +1,193 @@
+import asyncio
+
+import pytest
+
+from session_store import (SNAPSHOT_VERSION, MemorySessionStore, RedisError, RedisSessionStore, SessionStore,
+                           SqliteSessionStore, _RespConnection, dump_snapshot, load_snapshot)
+
+SNAPSHOT = {"id": "abc", "b": ["Paris", "2026-11-02", None, 2], "h": [[0, "hi"], [1, "Hello! 😊"]], "s": "collecting_info"}
+
+
+class StubRedis:
+    """Just enough of a Redis server for the store: AUTH, SELECT, GET, SET ... EX, DEL.
+
+    `drop_after` closes each connection after that many commands (a restart or idle
+    timeout); `slow` holds the reply to a GET of that key for a while.
+    """
+
+    def __init__(self, drop_after=None, slow=None):
+        self.data = {}
+        self.connections = 0
+        self.drop_after = drop_after
+        self.slow = slow
+        self.server = None
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return f"redis://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/0"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _read_command(self, reader):
+        count = int((await reader.readuntil(b"\r\n"))[1:-2])
+        args = []
+        for _ in range(count):
+            length = int((await reader.readuntil(b"\r\n"))[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        served = 0
+        try:
+            while self.drop_after is None or served < self.drop_after:
+                name, *args = await self._read_command(reader)
+                served += 1
+                if name == b"GET":
+                    if args[0] == self.slow:
+                        await asyncio.sleep(0.2)
+                    value = self.data.get(args[0])
+                    writer.write(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value))
+                elif name == b"SET":
+                    self.data[args[0]] = args[1]
+                    writer.write(b"+OK\r\n")
+                elif name == b"DEL":
+                    writer.write(b":%d\r\n" % (self.data.pop(args[0], None) is not None))
+                elif name in (b"AUTH", b"SELECT"):
+                    writer.write(b"+OK\r\n")
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def test_snapshot_round_trip():
+    blob = dump_snapshot(SNAPSHOT)
+    assert blob[0] == SNAPSHOT_VERSION
+    assert load_snapshot(blob) == SNAPSHOT
+
+
+@pytest.mark.parametrize("blob", [None, b"", bytes([SNAPSHOT_VERSION - 1]) + b'{"id": "abc"}'])
+def test_unusable_snapshots_restart_the_conversation(blob):
+    assert load_snapshot(blob) is None
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+async def _round_trip(store: SessionStore):
+    assert await store.get("missing-session-id") is None
+    await store.set("session-one-0001", dump_snapshot(SNAPSHOT))
+    assert load_snapshot(await store.get("session-one-0001")) == SNAPSHOT
+    await store.set("session-one-0001", dump_snapshot({"id": "abc", "s": "awaiting_confirmation"}))
+    assert load_snapshot(await store.get("session-one-0001"))["s"] == "awaiting_confirmation"
+    await store.delete("session-one-0001")
+    assert await store.get("session-one-0001") is None
+
+
+def test_memory_store_round_trip():
+    asyncio.run(_round_trip(MemorySessionStore()))
+
+
+def test_memory_store_expires_idle_sessions():
+    async def run():
+        store = MemorySessionStore()
+        await store.set("session-one-0001", b"x", ttl=0)
+        assert await store.get("session-one-0001") is None
+    asyncio.run(run())
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    asyncio.run(_round_trip(SqliteSessionStore(str(tmp_path / "sessions.sqlite3"))))
+
+
+def test_sqlite_store_sweeps_expired_rows_on_a_timer(tmp_path):
+    def rows(store):
+        return store._connection().execute("SELECT id FROM sessions ORDER BY id").fetchall()
+
+    async def run():
+        store = SqliteSessionStore(str(tmp_path / "sessions.sqlite3"), sweep_seconds=0.05)
+        await store.set("session-one-0001", b"x")  # First write sweeps
+        await store.set("expired-session-01", b"x", ttl=-1)  # Within the interval: no sweep
+        await store.set("expired-session-02", b"x", ttl=-1)
+        assert [row[0] for row in rows(store)] == ["expired-session-01", "expired-session-02", "session-one-0001"]
+        await asyncio.sleep(0.06)
+        await store.set("session-one-0001", b"y")  # Any session's write sweeps once the interval is up
+        assert [row[0] for row in rows(store)] == ["session-one-0001"]
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("keep_open", [False, True])
+def test_redis_store_round_trip(keep_open):
+    async def run():
+        server = StubRedis()
+        store = RedisSessionStore(await server.start())
+        if keep_open:
+            await store.open_connection()
+        await _round_trip(store)
+        await store.close()
+        await server.stop()
+        assert server.connections == (1 if keep_open else 7)
+    asyncio.run(run())
+
+
+def test_redis_store_reconnects_after_the_connection_drops():
+    async def run():
+        server = StubRedis(drop_after=1)
+        store = RedisSessionStore(await server.start())
+        await store.open_connection()
+        await store.set("session-one-0001", b"first")
+        with pytest.raises((ConnectionError, asyncio.IncompleteReadError)):
+            await store.get("session-one-0001")  # The server closed the kept connection
+        assert await store.get("session-one-0001") == b"first"
+        await store.close()
+        await server.stop()
+    asyncio.run(run())
+
+
+def test_redis_store_cancelled_command_does_not_shift_replies():
+    async def run():
+        server = StubRedis(slow=b"session:slow-session-0001")
+        store = RedisSessionStore(await server.start())
+        await store.open_connection()
+        await store.set("slow-session-0001", b"slow")
+        await store.set("fast-session-0001", b"fast")
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(store.get("slow-session-0001"), 0.05)
+        assert await store.get("fast-session-0001") == b"fast"  # Not the slow key's late reply
+        await store.close()
+        await server.stop()
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("raw, expected", [
+    (b"+OK\r\n", b"OK"),
+    (b":42\r\n", 42),
+    (b"$5\r\nhe\r\no\r\n", b"he\r\no"),
+    (b"$0\r\n\r\n", b""),
+    (b"$-1\r\n", None),
+    (b"*-1\r\n", None),
+    (b"*3\r\n$3\r\nfoo\r\n:1\r\n*1\r\n+nested\r\n", [b"foo", 1, [b"nested"]]),
+])
+def test_resp_replies(raw, expected):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        return await _RespConnection(reader, None)._read_reply()
+    assert asyncio.run(run()) == expected
+
+
+def test_resp_error_reply():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"-WRONGTYPE Operation against a key\r\n")
+        await _RespConnection(reader, None)._read_reply()
+    with pytest.raises(RedisError, match="WRONGTYPE"):
+        asyncio.run(run())
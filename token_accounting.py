@@ -0,0 +1,180 @@
+import contextvars
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+
+# Prompt and completion tokens per LLM call, attributed to the session, turn and call
+# site that made it. The apps open a turn() around each chat turn; every routed LLM
+# call records its reported usage against it. Batched extractions run outside any
+# session's context, so they only show up in the metrics (session "-").
+
+TOKEN_ACCOUNTING_SESSIONS = int(os.getenv("TOKEN_ACCOUNTING_SESSIONS", "10000"))
+TOKEN_ACCOUNTING_TURNS = 20  # Most recent turns kept per session; totals cover every turn
+
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+prompt_tokens = metrics.counter("llm_prompt_tokens_total", "Prompt tokens reported by the LLM provider, by call site and model")
+completion_tokens = metrics.counter("llm_completion_tokens_total", "Completion tokens reported by the LLM provider, by call site and model")
+prompt_sizes = metrics.histogram("llm_prompt_tokens", "Prompt tokens per LLM call, by call site", buckets=TOKEN_BUCKETS)
+# Prompt tokens the provider served from its prefix cache; compare with prompt_prefix_reuse
+# (prompt_builder), the share that could be cached, to see how much of it actually is
+cached_tokens = metrics.counter("llm_cached_prompt_tokens_total",
+                                "Prompt tokens read from the provider's prefix cache, by call site and model")
+cached_shares = metrics.histogram("llm_prompt_cache_share", "Share of each prompt read from the provider's prefix cache, by call site",
+                                  buckets=(0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0))
+
+_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("token_session", default=None)
+_turn: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("token_turn", default=None)
+
+Usage = List[float]  # [calls, prompt tokens, completion tokens, cost in USD]
+
+
+def usage_of(reply: Any) -> Optional[Tuple[int, int]]:
+    """(prompt, completion) tokens of a chat model reply, or None when it reports no usage."""
+    usage = getattr(reply, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    token_usage = (getattr(reply, "response_metadata", None) or {}).get("token_usage")
+    if token_usage:
+        return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+    return None
+
+
+def cached_tokens_of(reply: Any) -> Optional[int]:
+    """Prompt tokens served from the provider's prefix cache, or None when the reply doesn't say."""
+    usage = getattr(reply, "usage_metadata", None)
+    details = (usage or {}).get("input_token_details") or {}
+    if "cache_read" in details:
+        return details["cache_read"]
+    token_usage = (getattr(reply, "response_metadata", None) or {}).get("token_usage") or {}
+    details = token_usage.get("prompt_tokens_details") or {}
+    return details.get("cached_tokens")
+
+
+class SessionUsage:
+    """Totals per call site for one session, plus a per-turn breakdown of its recent turns."""
+    __slots__ = ("turns_started", "totals", "turns")
+
+    def __init__(self):
+        self.turns_started = 0
+        self.totals: Dict[str, Usage] = {}
+        self.turns: "OrderedDict[int, Dict[str, Usage]]" = OrderedDict()
+
+    def add(self, turn: Optional[int], call_site: str, prompt: int, completion: int, cost: float):
+        _accumulate(self.totals, call_site, prompt, completion, cost)
+        if turn is not None:
+            per_turn = self.turns.get(turn)
+            if per_turn is None:
+                per_turn = self.turns[turn] = {}
+                while len(self.turns) > TOKEN_ACCOUNTING_TURNS:
+                    self.turns.popitem(last=False)
+            _accumulate(per_turn, call_site, prompt, completion, cost)
+
+    def report(self) -> Dict:
+        return {
+            "turns": self.turns_started,
+            "totals": _as_report(self.totals),
+            "recent_turns": [{"turn": turn, "call_sites": _as_report(sites)} for turn, sites in self.turns.items()],
+        }
+
+
+def _accumulate(table: Dict[str, Usage], call_site: str, prompt: int, completion: int, cost: float):
+    usage = table.get(call_site)
+    if usage is None:
+        usage = table[call_site] = [0, 0, 0, 0.0]
+    usage[0] += 1
+    usage[1] += prompt
+    usage[2] += completion
+    usage[3] += cost
+
+
+def _as_report(table: Dict[str, Usage]) -> Dict[str, Dict]:
+    return {site: {"calls": int(calls), "prompt_tokens": int(p), "completion_tokens": int(c), "cost_usd": round(cost, 6)}
+            for site, (calls, p, c, cost) in table.items()}
+
+
+class TokenLedger:
+    """In-memory usage per session (least recently active sessions are dropped first)."""
+
+    def __init__(self, max_sessions: int = TOKEN_ACCOUNTING_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, SessionUsage]" = OrderedDict()
+        self._lock = threading.Lock()  # Flask serves requests from several threads
+
+    def _session(self, session_id: str) -> SessionUsage:
+        # Caller holds self._lock
+        usage = self._sessions.get(session_id)
+        if usage is None:
+            usage = self._sessions[session_id] = SessionUsage()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return usage
+
+    def start_turn(self, session_id: str) -> int:
+        with self._lock:
+            usage = self._session(session_id)
+            usage.turns_started += 1
+            return usage.turns_started
+
+    def add(self, session_id: str, turn: Optional[int], call_site: str, prompt: int, completion: int, cost: float):
+        with self._lock:
+            self._session(session_id).add(turn, call_site, prompt, completion, cost)
+
+    def report(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            usage = self._sessions.get(session_id)
+            return usage.report() if usage is not None else None
+
+
+ledger = TokenLedger()
+
+
+@contextmanager
+def turn(session_id: str) -> Iterator[int]:
+    """Attributes the LLM calls made inside the block to one turn of `session_id`."""
+    number = ledger.start_turn(session_id)
+    session_token = _session.set(session_id)
+    turn_token = _turn.set(number)
+    try:
+        yield number
+    finally:
+        _turn.reset(turn_token)
+        _session.reset(session_token)
+
+
+def current_session() -> Optional[str]:
+    """Session of the turn in context, or None outside a turn (e.g. batched extractions)."""
+    return _session.get()
+
+
+def record(call_site: str, model: str, reply: Any, cost_per_million: Optional[Tuple[float, float]] = None) -> float:
+    """Records the usage reported on `reply`; returns its cost in USD (0 without usage or prices)."""
+    usage = usage_of(reply)
+    if usage is None:
+        return 0.0
+    prompt, completion = usage
+    cost = 0.0
+    if cost_per_million is not None:
+        cost = (prompt * cost_per_million[0] + completion * cost_per_million[1]) / 1_000_000
+    prompt_tokens.inc(prompt, call_site=call_site, model=model)
+    completion_tokens.inc(completion, call_site=call_site, model=model)
+    prompt_sizes.observe(prompt, call_site=call_site)
+    cached = cached_tokens_of(reply)
+    if cached is not None and prompt:
+        cached_tokens.inc(cached, call_site=call_site, model=model)
+        cached_shares.observe(cached / prompt, call_site=call_site)
+    session_id = _session.get()
+    if session_id is not None:
+        ledger.add(session_id, _turn.get(), call_site, prompt, completion, cost)
+    return cost
+
+
+def session_usage(session_id: str) -> Optional[Dict]:
+    """Token usage of one session (for the debug endpoints), or None if it has none on record."""
+    return ledger.report(session_id)
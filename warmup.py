@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Send a one-token request to the LLM during warm-up (costs a few tokens per start)
+WARMUP_LLM = os.getenv("WARMUP_LLM", "0") == "1"
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "20"))
+
+WarmupStep = Callable[[], Awaitable[object]]
+
+
+class WarmupState:
+    """Tracks warm-up progress; readiness endpoints report from here."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: Dict[str, str] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def report(self) -> Dict:
+        duration = None
+        if self.started_at is not None:
+            duration = round(((self.finished_at or time.monotonic()) - self.started_at) * 1000, 1)
+        failed = [name for name, result in self.steps.items() if result != "ok"]
+        if not self.ready:
+            status = "warming_up"
+        elif self.started_at is None:
+            status = "skipped"
+        else:
+            status = "degraded" if failed else "ok"
+        return {
+            "ready": self.ready,
+            "status": status,
+            "steps": dict(self.steps),
+            "duration_ms": duration,
+        }
+
+    def skip(self):
+        """Marks the process ready without warming up; everything loads on first use instead."""
+        self._done.set()
+        logger.info("Warm-up skipped")
+
+    async def run(self, steps: Dict[str, WarmupStep], timeout: float = WARMUP_TIMEOUT_SECONDS):
+        """Runs all steps concurrently; a failing or slow step is recorded but never blocks readiness."""
+        self.started_at = time.monotonic()
+        self.steps = {name: "pending" for name in steps}
+
+        async def run_step(name: str, step: WarmupStep):
+            t0 = time.perf_counter()
+            try:
+                await asyncio.wait_for(step(), timeout)
+                self.steps[name] = "ok"
+            except asyncio.TimeoutError:
+                self.steps[name] = f"timed out after {timeout:.0f}s"
+            except Exception as e:
+                self.steps[name] = f"error: {e}"
+            logger.info(f"Warm-up step '{name}': {self.steps[name]} ({(time.perf_counter() - t0) * 1000:.0f} ms)")
+
+        try:
+            await asyncio.gather(*(run_step(name, step) for name, step in steps.items()))
+        finally:
+            self.finished_at = time.monotonic()
+            self._done.set()
+            logger.info(f"Warm-up finished: {self.report()}")
+
+    def start_in_thread(self, steps: Dict[str, WarmupStep]) -> threading.Thread:
+        """Runs warm-up on its own event loop in a background thread (for WSGI servers such as Flask)."""
+        thread = threading.Thread(target=lambda: asyncio.run(self.run(steps)), name="warm-up", daemon=True)
+        thread.start()
+        return thread
+
+
+async def ping_llm():
+    """Opens the TLS connection to the LLM provider with a minimal request.
+
+    Uses the client the chatbot's first extraction call uses, so its connection pool is
+    the one warmed. Only for warm-up on the serving loop (the FastAPI lifespan).
+    """
+    from llm_clients import get_chat_model
+    from model_router import first_model
+    await get_chat_model(first_model("extract"), temperature=0.3).bind(max_tokens=1).ainvoke("Reply with OK.")
+
+
+async def ping_llm_standalone():
+    """The same request through a throwaway client, for warm-up on a loop of its own (Flask).
+
+    That loop closes when warm-up ends, so no pooled connection can outlive it; the ping
+    still loads langchain and checks the API key and model before the first user does.
+    """
+    from llm_clients import ping_with_own_client
+    await ping_with_own_client()
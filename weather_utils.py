@@ -1,7 +1,53 @@
 import os
-import aiohttp
-from langchain_groq import ChatGroq
-from langchain_core.prompts import PromptTemplate
+import asyncio
+import weakref
+from lazy_imports import lazy_import
+from llm_clients import get_chat_model, call_llm
+from model_router import routed_call
+from circuit_breaker import CircuitOpen
+from prompt_builder import PromptLayout
+
+aiohttp = lazy_import("aiohttp")
+
+WEATHER_HOST = "api.openweathermap.org"
+# Keep-alive sessions (with a DNS cache) for long-lived event loops such as the FastAPI
+# server's. aiohttp sessions can't cross loops, so loops without one (e.g. Flask's
+# per-request loops) use a short-lived session per call instead.
+_sessions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def _new_session():
+    connector = aiohttp.TCPConnector(ttl_dns_cache=300, keepalive_timeout=60)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10))
+
+def open_http_session():
+    """Registers a shared keep-alive session for the running event loop (call at app startup)."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = _sessions[loop] = _new_session()
+    return session
+
+async def close_http_session():
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+async def prime_weather_connection():
+    """Resolves the weather host and, if this loop has a shared session, opens a pooled connection."""
+    loop = asyncio.get_running_loop()
+    await loop.getaddrinfo(WEATHER_HOST, 80)
+    session = _sessions.get(loop)
+    if session is not None:
+        # Unauthenticated request: answered with 401 without using API quota
+        async with session.head(f"http://{WEATHER_HOST}/data/2.5/weather") as response:
+            await response.release()
+
+WEATHER_TIP_PROMPT = PromptLayout(
+    "weather_tip",
+    "You are a travel assistant. Provide a concise weather tip (1-2 sentences) for a traveler going to the "
+    "destination below, given its current temperature and weather. Include a relevant emoji at the end.",
+    [("Destination", "destination"), ("Temperature (°C)", "temp"), ("Weather", "weather")],
+)
 
 async def get_weather_tip(destination: str, log_async) -> str:
     api_key = os.getenv("OPENWEATHER_API_KEY")
@@ -11,35 +57,34 @@ async def get_weather_tip(destination: str, log_async) -> str:
 
     try:
         # Fetch weather data from OpenWeatherMap
-        async with aiohttp.ClientSession() as session:
-            url = f"http://api.openweathermap.org/data/2.5/weather?q={destination}&appid={api_key}&units=metric"
-            async with session.get(url) as response:
+        shared_session = _sessions.get(asyncio.get_running_loop())
+        session = shared_session if shared_session is not None and not shared_session.closed else _new_session()
+        url = f"http://{WEATHER_HOST}/data/2.5/weather"
+        params = {"q": destination, "appid": api_key, "units": "metric"}
+        try:
+            async with session.get(url, params=params) as response:
                 if response.status != 200:
                     await log_async("error", f"Weather API returned status {response.status} for {destination}")
                     return "Weather tip unavailable for this destination."
                 data = await response.json()
                 weather = data['weather'][0]['description']
                 temp = data['main']['temp']
+        finally:
+            if session is not shared_session:
+                await session.close()
 
-        # Initialize the LLM (Grok)
-        llm = ChatGroq(
-            groq_api_key=os.getenv("GROQ_API_KEY"),
-            model_name="gemma2-9b-it",
-            temperature=0.7,
-            max_tokens=100
-        )
-
-        # Create a prompt for the LLM to generate a weather tip
-        prompt_template = PromptTemplate(
-            input_variables=["temp", "destination", "weather"],
-            template="You are a travel assistant. Provide a concise weather tip (1-2 sentences) for a traveler going to {destination}, where the current temperature is {temp}°C and the weather is {weather}. Include a relevant emoji at the end."
-        )
-
-        # Format the prompt with the weather data
-        prompt = prompt_template.format(temp=temp, destination=destination, weather=weather)
+        # Static instructions first, then the weather data; the client comes from the weather_tip route
+        prompt = WEATHER_TIP_PROMPT.render(destination=destination, temp=temp, weather=weather)
 
         # Generate the weather tip using the LLM
-        weather_tip = await llm.apredict(prompt)
+        try:
+            weather_tip = await routed_call(
+                "weather_tip",
+                lambda model: call_llm(get_chat_model(model, temperature=0.7, max_tokens=100).ainvoke(prompt)),
+                accept=lambda reply: reply.content
+            )
+        except CircuitOpen:
+            weather_tip = "Have a wonderful stay! 🧳"  # LLM unavailable; the weather data is still useful
         if not weather_tip:
             return "Weather tip unavailable (LLM failed to generate a response)."
 